@@ -0,0 +1,500 @@
+# Ortho CFD batch entry point
+# Computational Fluid Dynamics Lab
+# Dr. Carlos F. Lange
+# Department of Mechanical Engineering
+# University of Alberta
+#
+# cmd = python batch.py <patients_dir> <output_dir> [--flow-rate 15 --flow-rate 30]
+
+# Headless version of the Tab4 workflow for a folder of patients:
+# - Segmentation (AirwaySegmentator: DICOM/NIfTI -> nnUNet -> STL, volume, min CSA)
+# - Geometry (BlenderProcessor: inlet/outlet/wall STLs + assembly image)
+# - CFD (legacy_cfd_runner.run_cfd: Allclean/Allrun with mesh cache)
+# - Post-processing (pvbatch paraview_ortho.py + whitespace cropping)
+# - Report (generate_airway_report)
+#
+# Patients:
+#     Every sub-folder of <patients_dir> is one patient. A folder with a
+#     .nii/.nii.gz file is a NIfTI patient, any other folder a DICOM series.
+#     A .nii/.nii.gz file directly in <patients_dir> is a patient too.
+#     Optional patient.json (or <file stem>.json next to a NIfTI file) with
+#     "name", "dob", "physician", "scan_date" and "analysis_type" is used
+#     for the report.
+#
+# Concurrency:
+#     Patients move through the stages independently on a PipelineScheduler
+#     (gui/utils/pipeline_scheduler.py); --<stage>-jobs limits how many
+#     patients can be in a stage at once (defaults in
+#     BATCH_SETTINGS["STAGE_LIMITS"]) and --gpus/--blender-slots/--cores set
+#     the shared resource tokens. Concurrent CFD runs hold disjoint cores.
+#     A summary is written to <output_dir>/batch_summary.json.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from gui.config.settings import ANALYSIS_SETTINGS, APP_SETTINGS, BATCH_SETTINGS, PATH_SETTINGS
+from gui.utils.basic_utils import AppLogger
+from gui.utils.blender_processor import BlenderProcessor
+from gui.utils.cfd_sweep import cfd_case_dirname, copy_geometry, template_for_flow_rate
+from gui.utils.decomposition import available_cores
+from gui.utils.generate_airway_report import generate_airway_report
+from gui.utils.image_processing import autocrop_whitespace
+from gui.utils.inference_config import inference_config
+from gui.utils.legacy_cfd_runner import run_cfd
+from gui.utils.pipeline_scheduler import PipelineScheduler
+from gui.utils.segmentation import AirwaySegmentator
+from gui.utils.stl_assem_image_render import render_assembly
+
+STAGES = ("segmentation", "geometry", "cfd", "paraview", "report")
+
+
+class BatchStageError(RuntimeError):
+    """A stage failed for one patient; the other patients continue."""
+
+
+class BatchPatient:
+    """One input scan and the information printed on its report."""
+
+    def __init__(self, patient_id, input_path, input_type, info=None):
+        self.patient_id = patient_id
+        self.input_path = Path(input_path)
+        self.input_type = input_type
+        self.info = info or {}
+        self.timings = {}
+        self.status = {}
+        self.segmentation = None
+
+    @property
+    def name(self):
+        return self.info.get("name") or self.patient_id
+
+
+def _is_nifti(path: Path) -> bool:
+    return path.is_file() and (path.name.endswith(".nii.gz") or path.suffix == ".nii")
+
+
+def _nifti_stem(path: Path) -> str:
+    name = path.name
+    for suffix in (".gz", ".nii"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+
+def _read_info(path: Path) -> dict:
+    if not path.is_file():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except ValueError as e:
+        print(f"WARNING: ignoring invalid {path}: {e}")
+        return {}
+
+
+def discover_patients(input_dir):
+    """Patients found in a folder (see the header of this file for the layout)."""
+    patients = []
+    for entry in sorted(Path(input_dir).iterdir()):
+        if entry.name.startswith("."):
+            continue
+        if _is_nifti(entry):
+            stem = _nifti_stem(entry)
+            patients.append(BatchPatient(stem, entry, "nifti",
+                                         _read_info(entry.with_name(f"{stem}.json"))))
+        elif entry.is_dir():
+            info = _read_info(entry / BATCH_SETTINGS["PATIENT_INFO_FILE"])
+            niftis = sorted(p for p in entry.iterdir() if _is_nifti(p))
+            if niftis:
+                patients.append(BatchPatient(entry.name, niftis[0], "nifti", info))
+            elif any(p.is_file() for p in entry.iterdir()):
+                patients.append(BatchPatient(entry.name, entry, "dicom", info))
+    return patients
+
+
+def patient_initials(name):
+    """Initials used in the assembly image name (same rules as Tab4)."""
+    if name == "Anonymous":
+        return "ANON"
+    initials = "".join(part[0].upper() for part in name.split() if part)
+    return initials or "XX"
+
+
+class BatchJob:
+    """A patient, or one flow rate of a patient once the geometry exists."""
+
+    def __init__(self, patient, flow_rate=None, case_dir=None):
+        self.patient = patient
+        self.flow_rate = flow_rate
+        self.case_dir = case_dir
+
+    @property
+    def key(self):
+        return "segmentation" if self.flow_rate is None else cfd_case_dirname(self.flow_rate)
+
+    def __repr__(self):
+        return f"{self.patient.patient_id}/{self.key}"
+
+
+class BatchRunner:
+    """
+    Runs every patient through the pipeline on a PipelineScheduler.
+
+    Each stage has its own worker pool (--<stage>-jobs) and takes tokens from
+    a shared resource pool: "gpu" for nnUNet on CUDA (cores on CPU nodes),
+    "blender" for Blender and "cores" for the OpenFOAM runs, which are
+    pinned to the core ids they hold.
+    """
+
+    def __init__(self, patients, output_dir, flow_rates, stage_limits=None, logger=None,
+                 segmentation_only=False, make_report=True, skip_existing=False,
+                 resources=None):
+        self.patients = patients
+        self.output_dir = Path(output_dir)
+        self.flow_rates = sorted({round(float(f), 1) for f in flow_rates})
+        self.stage_limits = dict(BATCH_SETTINGS["STAGE_LIMITS"], **(stage_limits or {}))
+        self.logger = logger
+        self.segmentation_only = segmentation_only
+        self.make_report = make_report
+        self.skip_existing = skip_existing
+
+        resource_settings = dict(BATCH_SETTINGS["RESOURCES"], **(resources or {}))
+        self.cores = available_cores()[:resource_settings["CORES"] or None]
+        self.resources = {
+            "gpu": resource_settings["GPUS"],
+            "blender": resource_settings["BLENDER_SLOTS"],
+            "cores": self.cores,
+        }
+        self.cores_per_cfd_run = resource_settings["CORES_PER_CFD_RUN"] or max(
+            ANALYSIS_SETTINGS["CFD"]["SWEEP"]["MIN_RANKS_PER_RUN"],
+            len(self.cores) // max(1, self.stage_limits["cfd"]),
+        )
+        self.scheduler = None
+
+    def _log_info(self, message):
+        """Helper method to log info messages"""
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _log_error(self, message):
+        """Helper method to log error messages"""
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            print(f"ERROR: {message}")
+
+    def request_cancel(self):
+        """Let running stages finish but do not start new ones."""
+        if self.scheduler:
+            self.scheduler.cancel()
+
+    def _is_cancelled(self):
+        return bool(self.scheduler and self.scheduler.cancel_event.is_set())
+
+    def _timed(self, stage, job, fn, *args):
+        """Run a stage function and add its duration to the patient's timings."""
+        self._log_info(f"[{job}] {stage} started")
+        started = time.time()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.time() - started
+            patient = job.patient
+            patient.timings[stage] = patient.timings.get(stage, 0.0) + elapsed
+            self._log_info(f"[{job}] {stage} finished after {elapsed:.1f} s")
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    def _segmentation_needs(self, job):
+        """
+        The GPU for CUDA inference, a share of the cores otherwise.
+
+        CPU inference gets at most the cores a CFD run leaves free (at least
+        one), so a segmentation can run next to a simulation.
+        """
+        config = inference_config()
+        if config["device"] == "cpu":
+            spare = len(self.cores) - self.cores_per_cfd_run
+            return {"cores": max(1, min(config["threads"] or len(self.cores), spare))}
+        return {"gpu": 1}
+
+    def _segment(self, job, allocation):
+        patient = job.patient
+        out_dir = self.output_dir / patient.patient_id
+        out_dir.mkdir(parents=True, exist_ok=True)
+        segmentation = self._existing_segmentation(out_dir) if self.skip_existing else None
+        if segmentation is None:
+            # CPU inference uses no more threads than the cores it holds
+            max_threads = len(allocation["cores"]) if allocation.get("cores") else None
+            segmentation = self._timed("segmentation", job, self._run_segmentator, patient, out_dir, max_threads)
+        patient.segmentation = segmentation
+        patient.status["segmentation"] = "done"
+
+    def _run_segmentator(self, patient, out_dir, max_threads=None):
+        if patient.input_type == "nifti":
+            processor = AirwaySegmentator(input_file=patient.input_path, output_folder=out_dir,
+                                          input_type="nifti", max_threads=max_threads)
+        else:
+            processor = AirwaySegmentator(input_folder=patient.input_path, output_folder=out_dir,
+                                          input_type="dicom", max_threads=max_threads)
+        results = processor.process()
+        return {
+            "stl_path": results["stl_path"]["stl_path"],
+            "volume": results["volume"],
+            "min_csa": results["stl_path"]["min_csa"],
+        }
+
+    def _render_assembly(self, patient, inlet_path, outlet_path, wall_path, output_dir):
+        """Assembly image named like Tab4's (<initials>_<scan date>_assem.png)."""
+        render_assembly(str(inlet_path), str(outlet_path), str(wall_path), offscreen=True)
+        tri_dir = Path(inlet_path).parent
+        original_png = tri_dir / "assembly.png"
+        if not original_png.exists():
+            return None
+        scan_date = patient.info.get("scan_date") or "NoDate"
+        target_png = tri_dir / f"{patient_initials(patient.name)}_{scan_date}_assem.png"
+        os.replace(original_png, target_png)
+        (Path(output_dir) / target_png.name).write_bytes(target_png.read_bytes())
+        return str(target_png)
+
+    def _report_path(self, case_dir, flow_rate):
+        flow_str = f"{flow_rate:.1f}".replace(".", "_")
+        return Path(case_dir) / f"airway_analysis_flow_{flow_str}.pdf"
+
+    def _geometry(self, job, allocation):
+        """Blender once per patient; fans out into one job per flow rate."""
+        patient = job.patient
+        out_dir = self.output_dir / patient.patient_id
+        flow_jobs = []
+        for flow_rate in self.flow_rates:
+            case_dir = out_dir / cfd_case_dirname(flow_rate)
+            if self.skip_existing and self._report_path(case_dir, flow_rate).exists():
+                patient.status[cfd_case_dirname(flow_rate)] = "skipped (report exists)"
+                continue
+            flow_jobs.append(BatchJob(patient, flow_rate, case_dir))
+        if not flow_jobs:
+            return []
+
+        geometry_case = flow_jobs[0].case_dir
+        self._timed("geometry", job, self._run_blender, patient, geometry_case,
+                    flow_jobs[0].flow_rate)
+        for flow_job in flow_jobs[1:]:
+            copy_geometry(geometry_case, flow_job.case_dir, template_for_flow_rate(flow_job.flow_rate))
+        return flow_jobs
+
+    def _run_blender(self, patient, case_dir, flow_rate):
+        # The paths go to Blender on its command line, so runs of several patients do not interfere
+        processor = BlenderProcessor(
+            logger=self.logger,
+            progress_callback=lambda *args: None,
+            cancel_check_callback=self._is_cancelled,
+        )
+        result = processor.process_geometry(
+            patient.segmentation["stl_path"],
+            str(case_dir),
+            render_callback=lambda *paths: self._render_assembly(patient, *paths),
+            template_case=template_for_flow_rate(flow_rate),
+        )
+        if not result["success"]:
+            raise BatchStageError(f"Blender: {result['error_message']}")
+
+    def _cfd(self, job, allocation):
+        cpu_set = allocation.get("cores")
+        self._log_info(f"[{job}] CFD on cores {cpu_set}")
+        ok, msg = self._timed("cfd", job, lambda: run_cfd(
+            str(job.case_dir), job.flow_rate, logger=self.logger, cpu_set=cpu_set
+        ))
+        if not ok:
+            raise BatchStageError(f"CFD: {msg}")
+
+    def _paraview(self, job, allocation):
+        self._timed("paraview", job, self._run_paraview, job.case_dir)
+
+    def _run_paraview(self, case_dir):
+        if not (Path(case_dir) / "case.foam").exists():
+            raise BatchStageError(f"case.foam not found in {case_dir}")
+        script_path = PATH_SETTINGS["BASE_DIR"] / "paraview_ortho.py"
+        process = subprocess.run(["pvbatch", str(script_path), "--case", str(case_dir)], cwd=str(case_dir),
+                                 capture_output=True, text=True)
+        if process.stdout:
+            self._log_info(f"ParaView output: {process.stdout.strip()}")
+        if process.returncode != 0:
+            raise BatchStageError(f"pvbatch failed ({process.returncode}): {process.stderr.strip()}")
+        autocrop_whitespace(str(case_dir))
+
+    def _report(self, job, allocation):
+        self._timed("report", job, self._write_report, job)
+
+    def _write_report(self, job):
+        patient, case_dir = job.patient, job.case_dir
+        pdf_path = self._report_path(case_dir, job.flow_rate)
+        assembly = sorted((Path(case_dir) / "constant" / "triSurface").glob("*_assem.png"))
+        success = generate_airway_report(
+            pdf_path=str(pdf_path),
+            cfd_dir=str(case_dir),
+            patient_name=patient.name,
+            patient_dob=patient.info.get("dob", ""),
+            physician=patient.info.get("physician", ""),
+            analysis_type=patient.info.get("analysis_type", BATCH_SETTINGS["ANALYSIS_TYPE"]),
+            airway_volume=patient.segmentation["volume"],
+            flow_rate_val=job.flow_rate,
+            postprocessed_image_path=str(assembly[0]) if assembly else None,
+            add_preview_elements=False,
+            min_csa=patient.segmentation["min_csa"],
+        )
+        if not success:
+            raise BatchStageError("Report generation failed")
+
+    # ------------------------------------------------------------------
+    # Driver
+    # ------------------------------------------------------------------
+
+    def _existing_segmentation(self, out_dir):
+        """Results of an earlier run in out_dir, or None."""
+        stls = sorted((out_dir / "stl").glob("*_geo.stl"))
+        volume_file = out_dir / "volume_calculation.txt"
+        min_csa_file = out_dir / "min_csa.txt"
+        if not stls or not volume_file.exists() or not min_csa_file.exists():
+            return None
+
+        def number(text):
+            # "Airway Volume: 1234.56 mm³" -> 1234.56
+            return float(text.split(":")[1].split()[0])
+
+        try:
+            return {
+                "stl_path": str(stls[0]),
+                "volume": number(volume_file.read_text()),
+                "min_csa": number(min_csa_file.read_text()),
+            }
+        except (IndexError, ValueError):
+            return None
+
+    def _on_error(self, job, stage, error):
+        self._log_error(f"[{job}] {stage} failed: {error}")
+        key = stage if job.flow_rate is None else job.key
+        job.patient.status[key] = f"failed: {error}"
+
+    def _on_done(self, job):
+        if job.flow_rate is not None:
+            job.patient.status[job.key] = "done"
+
+    def build_scheduler(self):
+        """Scheduler with the stages this run needs."""
+        scheduler = PipelineScheduler(self.resources, logger=self.logger,
+                                      on_error=self._on_error, on_done=self._on_done)
+        limits = self.stage_limits
+        scheduler.add_stage("segmentation", self._segment, limits["segmentation"],
+                            needs=self._segmentation_needs)
+        if not self.segmentation_only:
+            scheduler.add_stage("geometry", self._geometry, limits["geometry"], needs={"blender": 1})
+            scheduler.add_stage("cfd", self._cfd, limits["cfd"],
+                                needs={"cores": self.cores_per_cfd_run})
+            scheduler.add_stage("paraview", self._paraview, limits["paraview"])
+            if self.make_report:
+                scheduler.add_stage("report", self._report, limits["report"])
+        return scheduler
+
+    def run(self):
+        """Process all patients and write batch_summary.json."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.scheduler = self.build_scheduler()
+        stage_stats = self.scheduler.run([BatchJob(p) for p in self.patients])
+
+        summary = {
+            patient.patient_id: {
+                "input": str(patient.input_path),
+                "status": patient.status,
+                "timings_s": {k: round(v, 1) for k, v in patient.timings.items()},
+            }
+            for patient in self.patients
+        }
+        (self.output_dir / "batch_summary.json").write_text(json.dumps(
+            {"patients": summary, "stages": stage_stats}, indent=2
+        ))
+        return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run segmentation, CFD and reports for a folder of patients without the GUI."
+    )
+    parser.add_argument("input_dir", help="Folder with one sub-folder (or NIfTI file) per patient")
+    parser.add_argument("output_dir", help="Results folder, one sub-folder per patient")
+    parser.add_argument("--flow-rate", type=float, action="append", dest="flow_rates",
+                        help="Flow rate in LPM (repeat for several)")
+    parser.add_argument("--patient", action="append", dest="only",
+                        help="Only process this patient id (repeatable)")
+    parser.add_argument("--segmentation-only", action="store_true",
+                        help="Stop after segmentation")
+    parser.add_argument("--no-report", action="store_true", help="Do not write PDF reports")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Reuse segmentations and skip flow rates that already have a report")
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}-jobs", type=int,
+                            default=BATCH_SETTINGS["STAGE_LIMITS"][stage],
+                            help=f"Patients in the {stage} stage at the same time")
+    resources = BATCH_SETTINGS["RESOURCES"]
+    parser.add_argument("--gpus", type=int, default=resources["GPUS"],
+                        help="GPU tokens for nnUNet")
+    parser.add_argument("--blender-slots", type=int, default=resources["BLENDER_SLOTS"],
+                        help="Blender runs at the same time")
+    parser.add_argument("--cores", type=int, default=resources["CORES"],
+                        help="Cores shared by the CFD runs (default: all available)")
+    parser.add_argument("--cores-per-cfd-run", type=int, default=resources["CORES_PER_CFD_RUN"],
+                        help="MPI ranks per CFD run (default: cores / --cfd-jobs)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger = AppLogger()
+    logger.log_info("=" * 50)
+    logger.log_info(f"{APP_SETTINGS['TITLE']} batch run - {datetime.now()}")
+    logger.log_info("=" * 50)
+
+    patients = discover_patients(args.input_dir)
+    if args.only:
+        patients = [p for p in patients if p.patient_id in set(args.only)]
+    if not patients:
+        logger.log_error(f"No patients found in {args.input_dir}")
+        return 1
+
+    runner = BatchRunner(
+        patients,
+        args.output_dir,
+        args.flow_rates or [BATCH_SETTINGS["DEFAULT_FLOW_RATE"]],
+        stage_limits={stage: getattr(args, f"{stage}_jobs") for stage in STAGES},
+        logger=logger,
+        segmentation_only=args.segmentation_only,
+        make_report=not args.no_report,
+        skip_existing=args.skip_existing,
+        resources={
+            "GPUS": args.gpus,
+            "BLENDER_SLOTS": args.blender_slots,
+            "CORES": args.cores,
+            "CORES_PER_CFD_RUN": args.cores_per_cfd_run,
+        },
+    )
+    logger.log_info(f"Processing {len(patients)} patient(s), stage limits {runner.stage_limits}, "
+                    f"{len(runner.cores)} cores, {runner.cores_per_cfd_run} per CFD run")
+    summary = runner.run()
+
+    failed = [pid for pid, entry in summary.items()
+              if any(str(s).startswith("failed") for s in entry["status"].values())]
+    for pid, entry in summary.items():
+        print(f"{pid}: {entry['status']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
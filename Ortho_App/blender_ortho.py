@@ -6,16 +6,28 @@
 # University of Alberta
 #
 # Date 2025-09-27
-# cmd = blender --background --python blender_ortho.py
+# cmd = blender --background --python blender_ortho.py -- --stl <airway.stl> --case <CFD case folder> [--manifest <file>]
+# (without arguments the paths are read from sdir.txt and geo_in.txt in the working directory)
 
+import argparse
+import json
+import sys
 import bpy
 import math
 import mathutils
 import time
 import os
-import bmesh
+import numpy as np
 
 start_time = time.time()
+timings = {}
+_lap_start = [start_time]
+
+def lap(name):
+    """Record the time since the previous lap under name."""
+    now = time.time()
+    timings[name] = now - _lap_start[0]
+    _lap_start[0] = now
 
 # delete all existing objects
 bpy.ops.object.mode_set(mode='OBJECT')
@@ -26,27 +38,57 @@ bpy.ops.object.delete()
 def _expand_path(raw_path):
     return os.path.expandvars(os.path.expanduser(raw_path.strip()))
 
-file0 = open("sdir.txt", "r")
+def _read_path_file(name):
+    with open(name, "r") as f:
+        return f.readline()
+
+def triangle_count(obj):
+    """Number of triangles the STL exporter writes for a mesh object."""
+    obj.data.calc_loop_triangles()
+    return len(obj.data.loop_triangles)
+
+def write_manifest(path, manifest):
+    """Write the JSON manifest through a temporary file, so it is complete whenever it exists."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def world_faces(obj):
+    """Face centers (mean of the face vertices) and normals of a mesh object in world space."""
+    mesh = obj.data
+    centers = np.empty(len(mesh.polygons) * 3, dtype=np.float32)
+    normals = np.empty(len(mesh.polygons) * 3, dtype=np.float32)
+    mesh.polygons.foreach_get("center", centers)
+    mesh.polygons.foreach_get("normal", normals)
+    matrix = np.array(obj.matrix_world, dtype=np.float32)
+    centers = centers.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+    normals = normals.reshape(-1, 3) @ matrix[:3, :3].T
+    return centers.astype(np.float64), normals.astype(np.float64)
+
+# Per-job paths after Blender's own arguments ("--"), so several cases can run at once
+parser = argparse.ArgumentParser(prog="blender_ortho.py")
+parser.add_argument("--stl", help="airway STL to cut")
+parser.add_argument("--case", help="CFD case folder receiving the cut surfaces")
+parser.add_argument("--manifest", help="JSON manifest written as the last step (default: <case>/blender_manifest.json)")
+args = parser.parse_args(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else [])
+
+path0 = _expand_path(args.case if args.case else _read_path_file("sdir.txt"))
 #file0 = open("/home/uday/Desktop/msc_ortho/Automation/Ortho_App_0.2/sdir.txt", "r")
-path0 = _expand_path(file0.readline())
-file0.close()
-file = open("geo_in.txt", "r")
+path1 = _expand_path(args.stl if args.stl else _read_path_file("geo_in.txt"))
 #file = open("/home/uday/Desktop/msc_ortho/Automation/Ortho_App_0.2/geo_in.txt", "r")
-path1 = _expand_path(file.readline())
 bpy.ops.import_mesh.stl(filepath= path1)
 
 # Align xyz
 bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN', center='MEDIAN')
 active_obj = bpy.context.active_object
 active_object_verts = active_obj.data.vertices
-xValues = []
-yValues = []
-zValues = []
-for v in active_object_verts:
-    if v.select == True:
-        xValues.append(v.co[0])
-        yValues.append(v.co[1])
-        zValues.append(v.co[2])
+# Bounds of the selected vertices, read in one call instead of a Python loop
+coords = np.empty(len(active_object_verts) * 3, dtype=np.float32)
+active_object_verts.foreach_get("co", coords)
+selected = np.empty(len(active_object_verts), dtype=bool)
+active_object_verts.foreach_get("select", selected)
+coords = coords.reshape(-1, 3)[selected]
 
 
 # ROTATION OF MODEL
@@ -55,12 +97,8 @@ bpy.context.object.rotation_euler[2] = 0
 
 # Removing artifacts and grab the bounds
 # Move to +ve co-ordinates
-minx =  min(xValues)
-maxx =  max(xValues)
-miny =  min(yValues)
-maxy =  max(yValues)
-minz =  min(zValues)
-maxz =  max(zValues)
+minx, miny, minz = (float(v) for v in coords.min(axis=0))
+maxx, maxy, maxz = (float(v) for v in coords.max(axis=0))
 bpy.context.object.location[0] = abs(minx)
 bpy.context.object.location[1] = abs(miny)
 bpy.context.object.location[2] = abs(minz)
@@ -82,25 +120,30 @@ for obj in bpy.context.selected_objects:
 
 bpy.ops.object.select_all(action='DESELECT')
 ob = bpy.data.objects["wall"]
+lap("import")
 
-# Make preliminary Inlet
+# Make preliminary Inlet on a copy of the wall (same result as importing the STL again)
+kept_objects = set(bpy.context.view_layer.objects)
+ob_ini = ob.copy()
+ob_ini.data = ob.data.copy()
+bpy.context.collection.objects.link(ob_ini)
 bpy.ops.mesh.primitive_cube_add(size=2, enter_editmode=False, location=(0, 0, 0))
 cube= bpy.context.active_object
 bpy.context.view_layer.objects.active = cube
 bpy.context.object.scale[0] = 100
 bpy.context.object.scale[1] = 3
 bpy.context.object.scale[2] = 120
-bpy.context.view_layer.objects.active = ob
+bpy.context.view_layer.objects.active = ob_ini
 bpy.ops.object.modifier_add(type='BOOLEAN')
 bpy.context.object.modifiers["Boolean"].operation = 'DIFFERENCE'
 bpy.context.object.modifiers["Boolean"].object = cube
 bpy.context.object.modifiers["Boolean"].double_threshold = 1e-07
-bpy.ops.object.modifier_apply({"object": ob}, modifier="Boolean")
+bpy.ops.object.modifier_apply({"object": ob_ini}, modifier="Boolean")
 bpy.ops.object.select_all(action='DESELECT')
 bpy.context.view_layer.objects.active = cube
 bpy.context.active_object.select_set(True)
 bpy.ops.object.delete()
-bpy.context.view_layer.objects.active = ob
+bpy.context.view_layer.objects.active = ob_ini
 bpy.ops.object.mode_set(mode='EDIT')
 bpy.ops.mesh.select_mode(type="FACE")
 bpy.ops.mesh.separate(type='SELECTED')
@@ -120,72 +163,25 @@ if inny:
 bpy.context.view_layer.objects.active = inny
 filepath = os.path.join(path0, "system/face_centers_i.txt")
 #filepath = bpy.path.abspath("/home/uday/Desktop/msc_ortho/Automation/Ortho_App_0.2/face_centers_i.txt")
-bm = bmesh.new()
 # Open file for writing
 with open(filepath, 'w') as file:
     for o in bpy.context.selected_objects:
-        bm.clear()
-        bm.from_mesh(o.data)
+        centers, _ = world_faces(o)
         file.write(f"Object: {o.name}\n")
-        for f in bm.faces:
-            p = o.matrix_world @ f.calc_center_median()
-            file.write(f"({p.x * 0.001} {p.y * 0.001} {p.z * 0.001})\n")
-            op_z0 = (p.z - 20) * 0.001
-
-
-
-bm.free()
+        file.write("".join(f"({x} {y} {z})\n" for x, y, z in (centers * 0.001).tolist()))
+        if len(centers):
+            p = centers[-1]
+            op_z0 = (p[2] - 20) * 0.001
 #
 
-bpy.ops.object.mode_set(mode='OBJECT')
-bpy.ops.object.select_all(action='SELECT')
-bpy.ops.object.delete()
-bpy.ops.import_mesh.stl(filepath= path1)
-
-# Align xyz
-bpy.ops.object.origin_set(type='GEOMETRY_ORIGIN', center='MEDIAN')
-active_obj = bpy.context.active_object
-active_object_verts = active_obj.data.vertices
-xValues = []
-yValues = []
-zValues = []
-for v in active_object_verts:
-    if v.select == True:
-        xValues.append(v.co[0])
-        yValues.append(v.co[1])
-        zValues.append(v.co[2])
-
-
-# ROTATION OF MODEL
-bpy.context.object.rotation_euler[1] = 0
-bpy.context.object.rotation_euler[2] = 0
-
-# Removing artifacts and grab the bounds
-# Move to +ve co-ordinates
-minx =  min(xValues)
-maxx =  max(xValues)
-miny =  min(yValues)
-maxy =  max(yValues)
-minz =  min(zValues)
-maxz =  max(zValues)
-bpy.context.object.location[0] = abs(minx)
-bpy.context.object.location[1] = abs(miny)
-bpy.context.object.location[2] = abs(minz)
-bpy.ops.object.mode_set(mode='EDIT')
-bpy.ops.mesh.select_all(action='SELECT')
-bpy.ops.mesh.bisect(plane_co=(0, 0, 0.5), plane_no=(0, 0, 1), use_fill=True, clear_inner=False, xstart=1000, xend=0, ystart=0, yend=0)
-bpy.ops.mesh.loop_to_region(select_bigger=True)
-bpy.ops.mesh.separate(type='SELECTED')
+# Remove the copy and everything cut from it; the wall is left
 bpy.ops.object.mode_set(mode='OBJECT')
 bpy.ops.object.select_all(action='DESELECT')
-model = bpy.context.active_object
-bpy.context.active_object.select_set(True)
+for obj in bpy.context.view_layer.objects:
+    if obj not in kept_objects:
+        obj.select_set(True)
 bpy.ops.object.delete()
-bpy.ops.object.select_all(action='SELECT')
-for obj in bpy.context.selected_objects:
-    obj.name = "wall"
-    obj.data.name = "wall"
-
+lap("preliminary_inlet")
 
 bpy.ops.object.select_all(action='DESELECT')
 ob = bpy.data.objects["wall"]
@@ -198,7 +194,7 @@ bpy.context.object.scale[0] = 100
 bpy.context.object.scale[1] = 8
 bpy.context.object.scale[2] = 10
 bpy.context.object.rotation_euler[0] = 1.021018 #31.5 deg
-bpy.context.object.location[2] = p.z-10
+bpy.context.object.location[2] = p[2]-10
 bpy.context.view_layer.objects.active = ob
 bpy.ops.object.modifier_add(type='BOOLEAN')
 bpy.context.object.modifiers["Boolean"].operation = 'DIFFERENCE'
@@ -262,43 +258,31 @@ if out:
 bpy.context.view_layer.objects.active = out
 filepath = os.path.join(path0, "system/face_centers.txt")
 #filepath = bpy.path.abspath("/home/uday/Desktop/msc_ortho/Automation/Ortho_App_0.2/face_centers.txt")
-bm = bmesh.new()
 # Open file for writing
 with open(filepath, 'w') as file:
     points = []
     normals = []
     for o in bpy.context.selected_objects:
-        bm.clear()
-        bm.from_mesh(o.data)
-        normal_matrix = o.matrix_world.to_3x3()
-        for f in bm.faces:
-            p = o.matrix_world @ f.calc_center_median()
-            points.append((p.x * 0.001, p.y * 0.001, (p.z + 5) * 0.001))
-            n = normal_matrix @ f.normal
-            if n.length:
-                n.normalize()
-            normals.append((n.x, n.y, n.z))
-    if points:
-        avg_x = sum(p[0] for p in points) / len(points)
-        avg_y = sum(p[1] for p in points) / len(points)
-        avg_z = sum(p[2] for p in points) / len(points)
-        avg_nx = sum(n[0] for n in normals) / len(normals) if normals else 0.0
-        avg_ny = sum(n[1] for n in normals) / len(normals) if normals else 0.0
-        avg_nz = sum(n[2] for n in normals) / len(normals) if normals else 0.0
-        n_len = (avg_nx ** 2 + avg_ny ** 2 + avg_nz ** 2) ** 0.5
+        centers, face_normals = world_faces(o)
+        if len(centers):
+            p = centers[-1].copy()
+        centers[:, 2] += 5
+        points.append(centers * 0.001)
+        lengths = np.linalg.norm(face_normals, axis=1, keepdims=True)
+        normals.append(np.divide(face_normals, lengths, out=face_normals, where=lengths > 0))
+    points = np.concatenate(points) if points else np.empty((0, 3))
+    normals = np.concatenate(normals) if normals else np.empty((0, 3))
+    if len(points):
+        avg = points.mean(axis=0)
+        avg_n = normals.mean(axis=0)
+        n_len = np.linalg.norm(avg_n)
         if n_len:
             # Nudge inward along the negative average normal.
             offset = 0.002
-            avg_x -= (avg_nx / n_len) * offset
-            avg_y -= (avg_ny / n_len) * offset
-            avg_z -= (avg_nz / n_len) * offset
-        file.write(f"({avg_x:.6f} {avg_y:.6f} {avg_z:.6f})\n")
-
-
-
-
-bm.free()
+            avg -= (avg_n / n_len) * offset
+        file.write(f"({avg[0]:.6f} {avg[1]:.6f} {avg[2]:.6f})\n")
 #
+lap("inlet_outlet")
 
 # Export bounding co-ordinates
 obj = bpy.context.view_layer.objects.get('wall')
@@ -333,7 +317,7 @@ bound_max_ys1 = (max_y + pad) * 0.001
 bound_max_zs1 = (max_z + pad) * 0.001
 
 n_ip = 5
-ip_y0 = (p.y - 13) * 0.001
+ip_y0 = (p[1] - 13) * 0.001
 ip_y4 = (min_y + 2) * 0.001
 ip_y1 = ip_y0 - ((ip_y0 - ip_y4) * 1 / (n_ip-1))
 ip_y2 = ip_y0 - ((ip_y0 - ip_y4) * 2 / (n_ip-1))
@@ -393,6 +377,7 @@ with open(output_path, "w") as file:
 # Export as STL
 path2 = os.path.join(path0, "constant/triSurface/")
 bpy.ops.export_mesh.stl(filepath=path2, check_existing=True, filter_glob='*.stl', use_selection=False, global_scale=1.0, use_scene_unit=False, ascii=True, use_mesh_modifiers=True, batch_mode='OBJECT', axis_forward='Y', axis_up='Z')
+lap("export")
 
 # Export IMAGE
 # create color
@@ -461,6 +446,28 @@ bpy.context.scene.view_settings.exposure = 2.25
 path3 = os.path.join(path0,"blendout.jpg")
 bpy.context.scene.render.filepath = path3
 bpy.ops.render.render('INVOKE_DEFAULT', write_still=True)
+lap("render")
+timings["total"] = time.time() - start_time
+
+# Manifest of the outputs, written last: its presence tells the caller that everything is in place
+patches = ("inlet", "outlet", "wall")
+files = {name: os.path.join(path2, f"{name}.stl") for name in patches}
+files["face_centers_i"] = os.path.join(path0, "system/face_centers_i.txt")
+files["face_centers"] = os.path.join(path0, "system/face_centers.txt")
+files["bb_min_max"] = os.path.join(path0, "system/bb_min_max.txt")
+if os.path.exists(path3):
+    files["image"] = path3
+write_manifest(
+    _expand_path(args.manifest) if args.manifest else os.path.join(path0, "blender_manifest.json"),
+    {
+        "engine": "blender",
+        "stl": path1,
+        "case": path0,
+        "files": files,
+        "triangles": {name: triangle_count(bpy.data.objects[name]) for name in patches},
+        "timings": timings,
+    },
+)
 
 # Quit Blender
 print("Finished running preprocessing of model in Blenderv2.82")
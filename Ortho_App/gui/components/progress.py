@@ -1,6 +1,7 @@
 import customtkinter as ctk
 from tkinter import ttk
 from gui.config.settings import UI_SETTINGS
+from gui.utils.progress_bus import ProgressBus
 import tkinter.messagebox as messagebox
 
 class ProgressSection(ctk.CTkFrame):
@@ -28,6 +29,10 @@ class ProgressSection(ctk.CTkFrame):
             maximum=100
         )
         self.progress_bar.pack(fill="x", expand=True)
+
+        # Live plot (e.g. CFD residuals); only packed while there is an image
+        self.plot_label = ctk.CTkLabel(self, text="")
+        self._plot_image = None
         
         # Output text display
         self.output_frame = ctk.CTkFrame(self)
@@ -62,6 +67,10 @@ class ProgressSection(ctk.CTkFrame):
         # Add a set to track shown messages
         self._shown_messages = set()
 
+        # Worker threads post progress here; it is applied at a fixed frame rate
+        self.bus = ProgressBus(self, self.apply_updates)
+        self.bus.start()
+
     def _safe_update(self, func):
         """Safely update GUI from any thread"""
         if self.winfo_exists():
@@ -110,6 +119,10 @@ class ProgressSection(ctk.CTkFrame):
             
     def start(self, message="Processing...", indeterminate=False):
         """Start the progress bar with a message"""
+        # Drop updates of the previous run still queued; done here rather than in
+        # _start so that updates the new run posts before _start runs are kept
+        self.bus.clear()
+
         def _start():
             # Reset cancellation flag and message tracking
             self.cancellation_in_progress = False
@@ -122,6 +135,7 @@ class ProgressSection(ctk.CTkFrame):
                 text_color=UI_SETTINGS["COLORS"]["TEXT_LIGHT"]
             )
             self.output_text.delete("1.0", "end")
+            self._hide_plot()
             
             if indeterminate:
                 self.progress_bar.configure(mode='indeterminate')
@@ -137,6 +151,8 @@ class ProgressSection(ctk.CTkFrame):
     def stop(self, message="Complete"):
         """Stop the progress bar and update message"""
         def _stop():
+            # Show the remaining output, but not stale progress values
+            self.bus.flush(include_status=False)
             # Explicitly stop the progress bar animation
             self.progress_bar.stop()
             # Reset the value to 0 for consistency
@@ -169,28 +185,61 @@ class ProgressSection(ctk.CTkFrame):
         
         self._safe_update(_stop)
         
+    def post(self, message=None, value=None, output_line=None):
+        """Queue a progress update; safe to call from any thread"""
+        self.bus.post(message=message, percentage=value, output_line=output_line)
+
     def update_progress(self, value, message=None, output_line=None):
-        """Update progress bar value and optionally add output line"""
-        def _update():
-            # Always update the message if provided, even during cancellation
-            if message:
-                self.progress_label.configure(text=message)
-                
-            # Only update progress bar value if not cancelling
-            if not self.cancellation_in_progress and self.progress_bar['mode'] == 'determinate':
-                self.progress_bar['value'] = value
-            
-            # Always show output lines even during cancellation
-            if output_line:
-                self.output_text.insert("end", output_line + "\n")
-                self.output_text.see("end")  # Auto-scroll to bottom
-        
-        self._safe_update(_update)
-            
+        """Update progress bar value and optionally add output line (thread-safe, coalesced)"""
+        self.post(message, value, output_line)
+
+    def apply_updates(self, value, message=None, output_lines=None, dropped=0):
+        """Apply a batch of updates to the widgets (Tk thread only, called by the bus)"""
+        # Always update the message if provided, even during cancellation
+        if message:
+            self.progress_label.configure(text=message)
+
+        # Only update progress bar value if not cancelling
+        if (value is not None and not self.cancellation_in_progress
+                and self.progress_bar['mode'] == 'determinate'):
+            self.progress_bar['value'] = value
+
+        # Always show output lines even during cancellation
+        if output_lines:
+            text = "\n".join(output_lines) + "\n"
+            if dropped:
+                text = f"... {dropped} lines not shown (see log) ...\n" + text
+            self.output_text.insert("end", text)
+            # Keep the text box bounded so inserts stay cheap on long runs
+            max_lines = UI_SETTINGS["PROGRESS"]["MAX_OUTPUT_LINES"]
+            line_count = int(self.output_text.index("end-1c").split(".")[0])
+            if line_count > max_lines:
+                self.output_text.delete("1.0", f"{line_count - max_lines}.0")
+            self.output_text.see("end")  # Auto-scroll to bottom
+
+    def show_plot(self, image, max_width=480):
+        """Show a PIL image above the output text; safe to call from any thread"""
+        width, height = image.size
+        scale = min(1.0, max_width / width)
+        size = (int(width * scale), int(height * scale))
+
+        def _show():
+            self._plot_image = ctk.CTkImage(light_image=image, dark_image=image, size=size)
+            self.plot_label.configure(image=self._plot_image)
+            if not self.plot_label.winfo_manager():
+                self.plot_label.pack(before=self.output_frame, pady=(0, 5))
+
+        self._safe_update(_show)
+
+    def _hide_plot(self):
+        self.plot_label.pack_forget()
+        self.plot_label.configure(image=None)
+        self._plot_image = None
+
     def clear_output(self):
         """Clear the output text"""
         self._safe_update(lambda: self.output_text.delete("1.0", "end"))
-        
+
     def is_cancellation_in_progress(self):
         """Check if cancellation is in progress"""
         return self.cancellation_in_progress
\ No newline at end of file
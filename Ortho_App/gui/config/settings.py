@@ -25,6 +25,8 @@ PATH_SETTINGS: Dict[str, Path] = {
     "TEMP_DIR": "temp",
     "OUTPUT_DIR": "output",
     "CONTRIB_DIR": Path(__file__).resolve().parents[2] / "contributors.json",
+    # Results shared between patients and users (e.g. segmentation cache)
+    "CACHE_DIR": Path.home() / "Desktop" / "CFD_GUI" / "Cache",
 }
 
 # UI settings
@@ -94,6 +96,12 @@ UI_SETTINGS: Dict[str, Any] = {
     },
     "PLACEHOLDERS": {
         "ANALYSIS_MENU": "Select Analysis Type"
+    },
+    # Progress output from worker threads (gui/utils/progress_bus.py)
+    "PROGRESS": {
+        "FPS": 10,                  # progress widget redraws per second
+        "MAX_BUFFERED_LINES": 500,  # lines kept between two redraws
+        "MAX_OUTPUT_LINES": 2000,   # lines kept in the output box
     }
 }
 
@@ -105,7 +113,16 @@ FILE_SETTINGS: Dict[str, Any] = {
         "RESULTS": [".vtk", ".vtu", ".csv"]
     },
     "MAX_FILE_SIZE":  500* 1024 * 1024,  # 500MB
-    "TEMP_FILE_EXPIRY": 24 * 60 * 60 * 30  # 24 hours in seconds
+    "TEMP_FILE_EXPIRY": 24 * 60 * 60 * 30,  # 24 hours in seconds
+    # Header-only index of the DICOM series of a scan folder (gui/utils/dicom_index.py)
+    "DICOM_INDEX": {
+        "WORKERS": 8,                         # threads reading headers
+        "FILE": ".orthocfd_dicom_index.json",  # saved in the scan folder
+    },
+    # Scan previews of Tab3 (gui/utils/slice_provider.py)
+    "SLICE_PREVIEW": {
+        "CACHE_SCANS": 8,   # scans whose rendered previews are kept in memory
+    },
 }
 
 # Analysis settings
@@ -113,7 +130,101 @@ ANALYSIS_SETTINGS: Dict[str, Any] = {
     "SEGMENTATION": {
         "DEFAULT_THRESHOLD": -400,  # HU value
         "MARGIN": 1.0,  # mm
-        "MIN_REGION_SIZE": 100  # voxels
+        "MIN_REGION_SIZE": 100,  # voxels
+        # nnUNetv2_predict model and inference options
+        "NNUNET": {
+            "DATASET": "Dataset014_Airways",
+            "CONFIGURATION": "3d_fullres_bs4",
+            "FOLDS": "all",
+            "STEP_SIZE": 0.7,      # default 0.5
+            "DISABLE_TTA": False,  # True is ~5x faster but slightly less accurate
+            "NPP": 8,              # preprocessing workers (default 2)
+            "NPS": 8,              # segmentation export workers (default 2)
+            "TRAINER": "nnUNetTrainer",
+            "PLANS": "nnUNetPlans",
+            "CHECKPOINT": "checkpoint_final.pth",
+            # "auto" = CUDA if a usable GPU is found, else CPU (gui/utils/inference_config.py)
+            "DEVICE": "auto",
+            # Used instead of NPP/NPS/DISABLE_TTA when running on the CPU
+            "CPU": {
+                "THREADS": None,         # torch intra-op threads, None = all available cores
+                "DISABLE_TTA": True,     # mirroring costs up to 8x on the CPU
+                "RAM_PER_WORKER_GB": 4,  # memory held by one preprocessing/export worker
+                "MAX_WORKERS": 8,
+            },
+            # Keep the model loaded in a background process between cases
+            # (gui/utils/nnunet_worker.py); falls back to nnUNetv2_predict
+            "WORKER": {
+                "ENABLED": True,
+                "START_TIMEOUT": 600,  # s, import torch + load all fold weights
+            },
+            # Quick first pass shown while the full prediction runs (same model,
+            # no mirroring and no tile overlap; coarse surface preset)
+            "PREVIEW": {
+                "ENABLED": True,
+                "STEP_SIZE": 1.0,
+                "DISABLE_TTA": True,
+                "SURFACE_PRESET": "preview",
+                "DIR_NAME": "preview",   # inside the patient output folder
+            },
+        },
+        # Reuse predictions of scans that were already segmented
+        # (gui/utils/segmentation_cache.py)
+        "CACHE": {
+            "ENABLED": True,
+            "DIR_NAME": "segmentation",            # inside PATH_SETTINGS["CACHE_DIR"]
+            "MAX_BYTES": 20 * 1024 * 1024 * 1024,  # least recently used entries are evicted above this
+        },
+        # Cross-sectional area profile of the airway surface (gui/utils/cross_section.py)
+        "CSA": {
+            "STATIONS": 300,        # section planes along the axis
+            "AXIS": "principal",    # "principal" (long axis of the airway) or "z"
+            "END_MARGIN": 0.05,     # fraction of the length ignored at each end for the minimum
+            "PROFILE_FILE": "csa_profile.csv",  # written next to min_csa.txt
+        },
+        # Volume and voxel statistics of the predicted label map (gui/utils/label_stats.py)
+        "LABEL_STATS": {
+            "AIRWAY_LABEL": 1,
+            "SLAB_SLICES": 64,      # slices read at once; bounds the temporary mask size
+            "FILE": "label_stats.json",
+        },
+        # Airway region of interest cut out of the prediction (gui/utils/roi.py)
+        "ROI": {
+            "ENABLED": True,
+            "MARGIN_MM": 5.0,       # kept around the airway bounding box
+            "FILE": "roi.json",
+        },
+        # Label map -> STL surface (gui/utils/surface_pipeline.py)
+        "SURFACE": {
+            "PRESET": "standard",
+            "CROP_MARGIN": 2,       # voxels kept around the airway bounding box
+            "PRESETS": {
+                # Quick look: every 2nd voxel, light smoothing
+                "preview": {
+                    "SAMPLE_RATE": 2,
+                    "CLEAN": False,
+                    "LAPLACIAN_ITERATIONS": 0,
+                    "SINC_ITERATIONS": 10,
+                    "PASS_BAND": 0.2,
+                },
+                # The surface the CFD and the report use
+                "standard": {
+                    "SAMPLE_RATE": 1,
+                    "CLEAN": True,
+                    "LAPLACIAN_ITERATIONS": 25,
+                    "SINC_ITERATIONS": 20,
+                    "PASS_BAND": 0.2,
+                },
+                # Smoother surface, slower
+                "high": {
+                    "SAMPLE_RATE": 1,
+                    "CLEAN": True,
+                    "LAPLACIAN_ITERATIONS": 40,
+                    "SINC_ITERATIONS": 30,
+                    "PASS_BAND": 0.1,
+                },
+            },
+        },
     },
     "CFD": {
         "MESH_SIZE": {
@@ -124,10 +235,98 @@ ANALYSIS_SETTINGS: Dict[str, Any] = {
         "INLET_PRESSURE": 0,      # Pa
         "OUTLET_PRESSURE": -10,    # Pa
         "MAX_ITERATIONS": 1000,
-        "CONVERGENCE_CRITERIA": 1e-6
+        "CONVERGENCE_CRITERIA": 1e-6,
+        # Below this flow rate (LPM) the laminar template is used
+        "LAMINAR_MAX_LPM": 15,
+        # Multi flow-rate sweeps (gui/utils/cfd_sweep.py)
+        "SWEEP": {
+            "MIN_RANKS_PER_RUN": 4,       # MPI ranks per simpleFoam run
+            "MAX_CONCURRENT_RUNS": None,  # None = as many as the cores allow
+        },
+        # numberOfSubdomains chosen per phase (gui/utils/decomposition.py)
+        "DECOMPOSITION": {
+            "AUTO": True,           # False keeps the template's decomposeParDict
+            "CELLS_PER_RANK": {
+                "snappy1": 100000,  # background (blockMesh) cells per rank
+                "snappy2": 50000,   # cells after the first snappy pass
+                "solve": 50000,     # final mesh cells per simpleFoam rank
+                "pipeline": 50000,  # estimated final mesh cells per rank, pipeline mode
+            },
+            "MIN_SUBDOMAINS": 2,    # Allrun always runs in parallel; lower values are raised to 2
+            "MAX_SUBDOMAINS": None,  # None = all cores available to the run
+        },
+        # Decompose once and keep the decomposed mesh from snappyHexMesh through
+        # simpleFoam (Allrun pipeline); used whenever the mesh is not cached
+        "PIPELINE_MODE": True,
+        # How the inlet, outlet and wall surfaces are cut from the airway STL
+        "GEOMETRY": {
+            # "blender": blender_ortho.py in a Blender process
+            # "vtk": the same cuts in-process (gui/utils/geometry_engine.py)
+            "ENGINE": "blender",
+            # Written by either engine as its last step (paths, triangle counts, timings)
+            "MANIFEST_FILE": "blender_manifest.json",
+            # constant/triSurface/combined.stl for surfaceFeatureExtract (gui/utils/surface_assembly.py)
+            "COMBINED": {
+                "FILE": "combined.stl",
+                "FORMAT": "ascii",  # one named solid per patch; "binary" has a single solid
+                "STAMP_FILE": ".combined_stl.json",  # sizes, times and hashes of the parts
+            },
+        },
+        # Reuse constant/polyMesh between flow rates of the same geometry
+        "MESH_CACHE": {
+            "ENABLED": True,
+            "DIR_NAME": "mesh_cache",  # created inside the patient folder
+        },
+        # Live residual plot while simpleFoam runs (gui/utils/residual_monitor.py)
+        "RESIDUALS": {
+            "POLL_INTERVAL": 2.0,   # seconds between reads of solverInfo.dat
+            "FIELDS": ["Ux", "Uy", "Uz", "p", "k", "omega"],
+            "PLOT_SIZE": (800, 600),
+            "PLOT_FILE": "residual_plot.png",  # written to the case folder
+        },
+        # Stop simpleFoam once the pressure drop has settled (gui/utils/convergence.py)
+        "CONVERGENCE": {
+            "ENABLED": True,
+            "MIN_ITERATIONS": 200,       # never stop before this iteration
+            "WINDOW": 100,               # iterations the pressure drop must stay flat over
+            "RELATIVE_TOLERANCE": 0.005,  # (max - min) / |mean| of the pressure drop in the window
+            "ABSOLUTE_TOLERANCE": 0.01,  # Pa; used instead when the pressure drop is close to 0
+            "MAX_RESIDUAL": 1e-3,        # every initial residual must be below this as well
+            "MARKER_FILE": "converged.json",  # written to the case folder on an early stop
+        },
+        # Start simpleFoam from the nearest finished flow rate on the same mesh
+        # (gui/utils/warm_start.py); only used when the mesh comes from the cache
+        "WARM_START": {
+            "ENABLED": True,
+            # field -> exponent of the flow-rate ratio the mapped values are scaled by
+            "SCALING": {"U": 1, "p": 2, "k": 2, "omega": 1, "nut": 1},
+            "ORIGINAL_DIR": "0.orig",  # untouched template fields, restored before every run
+        },
     }
 }
 
+# Headless batch runs (batch.py)
+BATCH_SETTINGS: Dict[str, Any] = {
+    # How many patients may be in each stage at the same time
+    "STAGE_LIMITS": {
+        "segmentation": 1,  # one GPU / nnUNet worker
+        "geometry": 1,      # Blender
+        "cfd": 1,           # OpenFOAM; each run holds CORES_PER_CFD_RUN cores
+        "paraview": 1,      # pvbatch
+        "report": 2,
+    },
+    # Resource tokens shared by the stages (gui/utils/pipeline_scheduler.py)
+    "RESOURCES": {
+        "GPUS": 1,
+        "BLENDER_SLOTS": 1,
+        "CORES": None,              # None = all cores available to the process
+        "CORES_PER_CFD_RUN": None,  # None = CORES / STAGE_LIMITS["cfd"]
+    },
+    "DEFAULT_FLOW_RATE": 15.0,       # LPM
+    "PATIENT_INFO_FILE": "patient.json",  # optional name/dob/physician/scan_date per patient
+    "ANALYSIS_TYPE": "Segmentation + Airflow Simulation",
+}
+
 # External applications
 EXTERNAL_APPS: Dict[str, Dict[str, Any]] = {
     "BLENDER": {
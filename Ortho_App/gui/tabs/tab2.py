@@ -14,6 +14,7 @@ from ..components.forms import FormSection, LabeledEntry
 from ..components.navigation import NavigationFrame
 from ..utils.tooltips import ToolTip
 from gui.utils.basic_utils import AppLogger
+from gui.utils.dicom_index import dicom_index, main_series
 from gui.config.settings import UI_SETTINGS, PATH_SETTINGS,TAB2_SETTINGS
 
 
@@ -344,19 +345,17 @@ class Tab2Manager:
 
     def _process_files(self, files, folder_path):
         """Process selected files, auto-detect DICOM series, and update UI."""
-        dicom_files, nifti_files = [], []
-        for file_path in files:
-            if self._is_dicom_file(file_path):
-                dicom_files.append(file_path)
-            elif file_path.lower().endswith(('.nii', '.nii.gz')):
-                nifti_files.append(file_path)
-
-        # If a single DICOM file was selected, load the whole series from its folder
-        if len(dicom_files) == 1:
-            parent_folder = os.path.dirname(dicom_files[0])
-            dicom_files = [os.path.join(parent_folder, f) 
-                            for f in os.listdir(parent_folder) 
-                            if self._is_dicom_file(os.path.join(parent_folder, f))]
+        nifti_files = [f for f in files if f.lower().endswith(('.nii', '.nii.gz'))]
+        dicom_files = []
+        series_info = {}
+        other_files = [f for f in files if f not in nifti_files]
+        if other_files:
+            # The whole series of the folder, from the header index (scanned once per folder)
+            try:
+                series = main_series(dicom_index(os.path.dirname(other_files[0])))
+                dicom_files, series_info = series["files"], series["info"]
+            except (OSError, ValueError) as e:
+                self.logger.log_debug(f"No DICOM series next to {other_files[0]}: {e}")
 
         file_type_str = "DICOM" if dicom_files else "NIfTI"
         file_count = len(dicom_files) if dicom_files else len(nifti_files)
@@ -370,7 +369,7 @@ class Tab2Manager:
 
         # Process patient info if needed
         if dicom_files:
-            self._extract_patient_info_from_dicom(dicom_files[0])
+            self._extract_patient_info_from_dicom(series_info)
         else:
             self._clear_patient_fields()
             
@@ -749,11 +748,10 @@ static unsigned char file_bits[] = {
             if not os.path.isdir(folder_path):
                 messagebox.showwarning("Invalid Selection", "Please select a folder (not a file).", parent=dlg)
                 return
-            files = []
-            for file in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, file)
-                if os.path.isfile(file_path) and self._is_dicom_file(file_path):
-                    files.append(file_path)
+            try:
+                files = main_series(dicom_index(folder_path))["files"]
+            except (OSError, ValueError):
+                files = []
             if not files:
                 messagebox.showwarning("No DICOM Files", "No DICOM files found in current folder.", parent=dlg)
                 return
@@ -833,81 +831,17 @@ static unsigned char file_bits[] = {
         self.app.wait_window(dlg)
 
 
-    def _is_dicom_file(self, file_path):
-        """
-        Check if a file is a DICOM file without relying on file extension.
-        This method handles the PyDICOM issue of appending .dcm to files without extensions,
-        and is more tolerant of VR variations.
-        
-        Args:
-            file_path (str): Path to the file to check
-        Returns:
-            bool: True if the file is a valid DICOM file, False otherwise
-        """
+    def _extract_patient_info_from_dicom(self, series_info):
+        """Fill the patient fields from the header values of the DICOM index, ensuring missing dates are replaced with a placeholder."""
         try:
-            # Skip directories and specifically CASEDATA
-            path_obj = Path(file_path)
-            if path_obj.is_dir():
-                return False
-            # Skip files within directories named CASEDATA
-            if "CASEDATA" in path_obj.parts:
-                return False
-                
-            # Open file in binary mode to check for DICOM magic number
-            with open(file_path, 'rb') as f:
-                # Skip the 128-byte preamble
-                f.seek(128)
-                # Check for DICM magic number
-                magic = f.read(4)
-                if magic == b'DICM':
-                    # It's a standard DICOM file with proper header
-                    return True
-                    
-            # If no magic number, try to read it with PyDICOM directly
-            # This is a workaround for the extension issue
-            import pydicom
-            import warnings
-            
-            # Temporarily suppress the VR warnings during file validation
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", category=UserWarning, module="pydicom")
-                
-                # Force read without assuming an extension, and be more tolerant
-                # stop_before_pixels=True speeds up validation by not reading pixel data
-                # specific_tags helps target just the key tags we need to validate
-                dataset = pydicom.dcmread(
-                    file_path, 
-                    force=True,
-                    stop_before_pixels=True,
-                    specific_tags=['SOPClassUID', 'Modality', 'PatientID', 'StudyInstanceUID']
-                )
-                
-                # Check for some basic DICOM attributes to confirm it's a valid file
-                # This helps filter out files that PyDICOM reads but aren't actually DICOM
-                return (hasattr(dataset, 'SOPClassUID') or 
-                        hasattr(dataset, 'Modality') or 
-                        hasattr(dataset, 'PatientID') or
-                        hasattr(dataset, 'StudyInstanceUID'))
-                        
-        except Exception as e:
-            # Change this to debug level since it's expected for non-DICOM files
-            if "CASEDATA" not in file_path:  # Only log if not CASEDATA
-                self.logger.log_debug(f"Not DICOM: {os.path.basename(file_path)}, reason: {str(e)}")
-            return False
-
-    def _extract_patient_info_from_dicom(self, dicom_path):
-        """Extract patient information from a DICOM file, ensuring missing dates are replaced with a placeholder."""
-        try:
-            dicom_data = pydicom.dcmread(str(dicom_path), force=True)
-
             # Extract Name
-            self.app.patient_name.set(str(dicom_data.PatientName) if hasattr(dicom_data, "PatientName") else "")
+            self.app.patient_name.set(str(pydicom.valuerep.PersonName(series_info.get("PatientName", ""))))
 
             # Extract Referring Physician
-            if hasattr(dicom_data, "ReferringPhysicianName"):
-                doctor = dicom_data.ReferringPhysicianName
+            if series_info.get("ReferringPhysicianName"):
+                doctor = pydicom.valuerep.PersonName(series_info["ReferringPhysicianName"])
                 self.app.patient_doctor_var.set(
-                    f"{doctor.family_name}, {doctor.given_name}" if hasattr(doctor, "family_name") else str(doctor)
+                    f"{doctor.family_name}, {doctor.given_name}" if doctor.given_name else str(doctor)
                 )
             else:
                 self.app.patient_doctor_var.set("")
@@ -915,13 +849,10 @@ static unsigned char file_bits[] = {
             # Extract Dates (Birthdate and Scan Date)
             default_date = "1900-01-01"
             for date_attr, var in [("PatientBirthDate", self.app.dob), ("StudyDate", self.app.scandate)]:
-                if hasattr(dicom_data, date_attr):
-                    date_str = getattr(dicom_data, date_attr)
-                    if len(date_str) == 8:  # Ensure valid format
-                        formatted_date = datetime.strptime(date_str, "%Y%m%d").strftime("%Y-%m-%d")
-                        var.set(formatted_date)
-                    else:
-                        var.set(default_date)
+                date_str = str(series_info.get(date_attr, ""))
+                if len(date_str) == 8:  # Ensure valid format
+                    formatted_date = datetime.strptime(date_str, "%Y%m%d").strftime("%Y-%m-%d")
+                    var.set(formatted_date)
                 else:
                     var.set(default_date)
 
@@ -2,9 +2,8 @@
 import os
 import customtkinter as ctk
 import tkinter as tk
-from PIL import Image, ImageTk, ImageDraw, ImageFont, ImageChops
+from PIL import Image, ImageTk, ImageFont
 from tkinter import ttk, messagebox, filedialog
-import time
 from pathlib import Path
 import threading
 import sys
@@ -22,7 +21,6 @@ import vtk
 import tempfile
 import fitz
 import getpass
-import glob
 import re
 import signal
 
@@ -39,9 +37,17 @@ from ..utils.icons import create_icon, load_ctk_icon
 from ..utils.open3d_viewer import Open3DViewer
 from ..utils.blender_processor import BlenderProcessor
 from ..utils.stl_assem_image_render import render_assembly
-from ..utils.legacy_cfd_runner import run_cfd as run_legacy_cfd
+from ..utils.image_processing import autocrop_whitespace
+from ..utils.legacy_cfd_runner import run_cfd as run_legacy_cfd, has_second_snappy_pass
+from ..utils.surface_assembly import assemble_surfaces
+from ..utils.decomposition import decompose_for_phase
+from ..utils.mesh_cache import MeshCache, compute_mesh_key
+from ..utils.cfd_sweep import FlowRateSweep, cfd_case_dirname, flow_rate_from_dirname, template_for_flow_rate
+from ..utils.residual_monitor import ResidualMonitor
+from ..utils.convergence import ConvergenceMonitor, converged_time, reset_convergence
+from ..utils.warm_start import restore_initial_fields, warm_start
 
-from gui.config.settings import UI_SETTINGS, TAB4_UI, TAB4_SETTINGS, PATH_SETTINGS
+from gui.config.settings import UI_SETTINGS, TAB4_UI, TAB4_SETTINGS, PATH_SETTINGS, ANALYSIS_SETTINGS
 
 
 class Tab4Manager:
@@ -348,6 +354,45 @@ class Tab4Manager:
         )
         lpm_info_button.pack(side="left",padx=2)
 
+        # Flow-rate sweep: several flow rates on one mesh (initially hidden)
+        self.sweep_frame = ctk.CTkFrame(analysis_section.content, fg_color="transparent")
+
+        sweep_title = ctk.CTkLabel(
+            self.sweep_frame,
+            text="Flow Rate Sweep:",
+            font=UI_SETTINGS["FONTS"]["NORMAL"],
+            anchor="w"
+        )
+        sweep_title.pack(side="left", padx=(0, 10))
+
+        self.sweep_entry = ctk.CTkEntry(
+            self.sweep_frame,
+            width=220,
+            height=30,
+            placeholder_text="e.g. 10, 15, 30",
+            font=UI_SETTINGS["FONTS"]["NORMAL"]
+        )
+        self.sweep_entry.pack(side="left", padx=(0, 5))
+
+        sweep_unit_label = ctk.CTkLabel(self.sweep_frame, text="LPM", font=UI_SETTINGS["FONTS"]["NORMAL"])
+        sweep_unit_label.pack(side="left", padx=(0, 10))
+
+        self.sweep_button = ctk.CTkButton(
+            self.sweep_frame,
+            text="Run Sweep",
+            command=self._validate_and_start_sweep,
+            width=140,
+            height=30,
+            font=UI_SETTINGS["FONTS"]["BUTTON_LABEL"]
+        )
+        self.sweep_button.pack(side="left", padx=(0, 5))
+
+        sweep_info_button = _create_info_button(
+            self.sweep_frame,
+            "Runs several flow rates on the existing segmentation.\nThe geometry is prepared and meshed once, then the simulations run side by side on the available CPU cores."
+        )
+        sweep_info_button.pack(side="left", padx=2)
+
         self._update_processing_details(self.analysis_option.get())
 
     def _update_flow_rate_label(self, value=None):
@@ -751,9 +796,13 @@ class Tab4Manager:
         if choice == "Segmentation + Airflow Simulation":
             if not self.flow_rate_frame.winfo_ismapped():
                 self.flow_rate_frame.pack(fill="x", pady=(5, 10))
+            if not self.sweep_frame.winfo_ismapped():
+                self.sweep_frame.pack(fill="x", pady=(0, 10))
         else:
             if self.flow_rate_frame.winfo_ismapped():
                 self.flow_rate_frame.pack_forget()
+            if self.sweep_frame.winfo_ismapped():
+                self.sweep_frame.pack_forget()
 
     def _validate_and_start_processing(self):
         """Validate selection and start processing, skipping segmentation if STL already exists"""
@@ -987,12 +1036,12 @@ class Tab4Manager:
             
             def progress_callback(message, percentage, output_line=None):
                 """Update progress bar and message"""
-                # Use after() to ensure thread safety when updating GUI
-                self.app.after(0, lambda: self.progress_section.update_progress(
-                    percentage,
-                    message=message,
-                    output_line=output_line
-                ))
+                # The progress bus is thread-safe and redraws at a fixed rate
+                self.progress_section.post(message, percentage, output_line)
+
+            def preview_callback(image_path):
+                """Show the quick segmentation preview until the full result replaces it"""
+                self.app.after(0, lambda: self._update_render_display("segmentation", image_path))
             
             # Initialize processor with the appropriate input
             if has_nifti and nifti_file:
@@ -1001,6 +1050,7 @@ class Tab4Manager:
                     input_file=nifti_file,  # Pass the file path instead of folder
                     output_folder=self.app.full_folder_path,
                     callback=progress_callback,
+                    preview_callback=preview_callback,
                     input_type="nifti"  # Specify input type
                 )
             elif has_dicom:
@@ -1009,6 +1059,7 @@ class Tab4Manager:
                     input_folder=self.app.selected_dicom_folder,
                     output_folder=self.app.full_folder_path,
                     callback=progress_callback,
+                    preview_callback=preview_callback,
                     input_type="dicom"  # Specify input type
                 )
             else:
@@ -1818,7 +1869,7 @@ class Tab4Manager:
             
             # Start async processing with render callback
             flow = self.flow_rate.get()
-            template_case = "Master_cfd_file_laminar" if flow < 15 else "Master_cfd_file"
+            template_case = template_for_flow_rate(flow)
 
 
             self.blender_processor.process_geometry_async(
@@ -1883,14 +1934,10 @@ class Tab4Manager:
         """
         
         if flow_rate is None:
-            flow_rate_read = self.flow_rate.get()
+            flow_rate = self.flow_rate.get()
         
-        # Format with exactly one decimal place
-        flow_rate_str = f"{flow_rate_read:.1f}"
-        # Replace decimal point with underscore
-        flow_dir = flow_rate_str.replace('.', '_')
-        # Add CFD_ suffix
-        cfd_dir = f"CFD_{flow_dir}"
+        # e.g. 12.5 LPM -> CFD_12_5
+        cfd_dir = cfd_case_dirname(flow_rate)
         
         # Get base path from the application's current patient folder
         if hasattr(self.app, 'full_folder_path') and self.app.full_folder_path:
@@ -1901,6 +1948,120 @@ class Tab4Manager:
         
         return os.path.join(base_path, cfd_dir)
 
+    def _parse_sweep_flow_rates(self):
+        """Parse the comma/space separated sweep entry into a sorted list of flow rates."""
+        text = self.sweep_entry.get().replace(";", ",")
+        rates = []
+        for token in re.split(r"[,\s]+", text.strip()):
+            if not token:
+                continue
+            value = round(float(token) * 10) / 10
+            if value < 1.0 or value > 150.0:
+                raise ValueError(f"{value:.1f} LPM is outside 1.0 - 150.0 LPM")
+            rates.append(value)
+        return sorted(set(rates))
+
+    def _validate_and_start_sweep(self):
+        """Validate the sweep entry and run all flow rates on the existing segmentation."""
+        if self.processing_active:
+            return
+
+        try:
+            flow_rates = self._parse_sweep_flow_rates()
+        except ValueError as e:
+            messagebox.showwarning("Invalid Flow Rates", f"Please enter flow rates separated by commas.\n{e}")
+            return
+        if len(flow_rates) < 2:
+            messagebox.showwarning("Invalid Flow Rates", "Please enter at least two flow rates for a sweep.")
+            return
+
+        if not hasattr(self.app, 'full_folder_path') or not self._segmentation_results_exist():
+            messagebox.showerror("Error", "A sweep runs on an existing segmentation. Please run the segmentation first.")
+            return
+
+        stl_path = str(next((Path(self.app.full_folder_path) / "stl").glob("*_geo.stl")))
+        rates_str = ", ".join(f"{rate:.1f}" for rate in flow_rates)
+        if not self._show_custom_dialog(
+            title="Confirm Flow Rate Sweep",
+            message=f"Run CFD simulations at {rates_str} LPM?\n\n"
+                    f"The inlet/outlet geometry and mesh are created once and the "
+                    f"simulations run side by side. Existing results for these flow rates are replaced.",
+            icon="question"
+        ):
+            return
+
+        self.cancel_requested = False
+        self.processing_active = True
+        self.current_stl_path = stl_path
+        self.process_button.configure(state="disabled")
+        self.sweep_button.configure(state="disabled")
+        self._activate_results_section()
+        self.progress_section.start("Starting flow rate sweep…", indeterminate=True)
+        self.progress_section.set_cancel_callback(self._request_cancel)
+
+        threading.Thread(
+            target=self._sweep_worker,
+            args=(stl_path, flow_rates),
+            daemon=True
+        ).start()
+
+    def _sweep_worker(self, stl_path, flow_rates):
+        """Run a FlowRateSweep and the ParaView post-processing of every finished case."""
+        try:
+            sweep = FlowRateSweep(
+                stl_path=stl_path,
+                patient_dir=self.app.full_folder_path,
+                flow_rates=flow_rates,
+                logger=self.logger,
+                progress_callback=self.update_progress,
+                cancel_check_callback=lambda: self.cancel_requested,
+                render_callback=self._render_assembly_image
+            )
+            results = sweep.run()
+
+            for flow_rate, entry in results.items():
+                if self.cancel_requested or not entry["success"]:
+                    continue
+                self.update_progress(f"Generating images for {flow_rate:.1f} LPM…", 95)
+                if self._run_paraview(entry["case_dir"]):
+                    self.autocrop_whitespace(entry["case_dir"])
+
+            if self.cancel_requested:
+                self.app.after(0, self._on_sim_cancelled)
+            else:
+                self.app.after(0, lambda: self._on_sweep_done(results, sweep.assembly_image_path))
+
+        except Exception as e:
+            if not self.cancel_requested:
+                msg = f"{type(e).__name__}: {e}"
+                self.logger.log_error(msg)
+                self.app.after(0, lambda: self._on_worker_error("Flow Rate Sweep", msg))
+        finally:
+            self.app.after(0, lambda: self.sweep_button.configure(state="normal"))
+
+    def _on_sweep_done(self, results, assembly_image_path=None):
+        """Summarise a sweep and show the lowest successful flow rate."""
+        succeeded = [rate for rate, entry in results.items() if entry["success"]]
+        lines = [
+            f"{rate:.1f} LPM: {'done' if entry['success'] else entry['message']}"
+            for rate, entry in sorted(results.items())
+        ]
+        self.logger.log_info("Flow rate sweep finished:\n" + "\n".join(lines))
+
+        if not succeeded:
+            self._on_worker_error("Flow Rate Sweep", "No simulation finished:\n" + "\n".join(lines))
+            return
+
+        if assembly_image_path:
+            self._update_render_display("postprocessing", assembly_image_path)
+
+        # Display the first finished case through the regular loader
+        self.flow_rate.set(succeeded[0])
+        self._update_flow_rate_label()
+        if len(succeeded) < len(results):
+            messagebox.showwarning("Flow Rate Sweep", "Some simulations did not finish:\n" + "\n".join(lines))
+        self._load_existing_cfd()
+
     def _cfd_worker_legacy(self, cfd_dir):
         """
         Simplified CFD runner that mirrors the GUI_ortho workflow.
@@ -1984,6 +2145,9 @@ class Tab4Manager:
             if self.cancel_requested:
                 return
 
+            # Undo a warm start of an earlier run (the mesh may not be the same)
+            restore_initial_fields(dirs)
+
             # ----------------------------
             # 2) Write flow rate file AFTER Allclean
             # ----------------------------
@@ -2002,20 +2166,11 @@ class Tab4Manager:
             if not os.path.isdir(surf_dir):
                 raise FileNotFoundError(f"triSurface directory not found: {surf_dir}")
 
-            # Safety: ensure there are STL files to combine
-            stls = [fn for fn in os.listdir(surf_dir) if fn.lower().endswith(".stl") and fn != "combined.stl"]
-            if not stls:
-                raise FileNotFoundError(f"No .stl files found in {surf_dir} to build combined.stl")
-
-            # Overwrite (>) not append (>>), so you never accidentally grow the file
-            combined_path = os.path.join(surf_dir, "combined.stl")
-            subprocess.run(["rm", "-f", "combined.stl"], cwd=surf_dir, check=True)
-
-            # Use a shell pipeline only for globbing; keep it explicit and overwrite
-            subprocess.run("cat *.stl > combined.stl", cwd=surf_dir, shell=True, check=True)
-
-            if (not os.path.exists(combined_path)) or os.path.getsize(combined_path) == 0:
-                raise FileNotFoundError("combined.stl was not created or is empty")
+            # Named solids for inlet, outlet and wall; kept as is when the parts are unchanged
+            combined = assemble_surfaces(surf_dir)
+            self.logger.log_info(
+                f"{'Kept' if combined['skipped'] else 'Rebuilt'} {combined['path']} ({combined['triangles']})"
+            )
 
             if self.cancel_requested:
                 return
@@ -2023,9 +2178,11 @@ class Tab4Manager:
             # ----------------------------
             # 4) Start residual monitoring AFTER inputs are ready
             # ----------------------------
+            reset_convergence(dirs)
+            self.residual_monitor_stop = threading.Event()
             self.residual_monitor_thread = threading.Thread(
                 target=self._monitor_residuals,
-                args=(dirs,),
+                args=(dirs, self.residual_monitor_stop),
                 daemon=True
             )
             self.residual_monitor_thread.start()
@@ -2034,21 +2191,43 @@ class Tab4Manager:
                 return
 
             # ----------------------------
-            # 5) Run Allrun
+            # 5) Run the Allrun stages (solver only when the mesh is cached)
             # ----------------------------
-            self.logger.log_info(f"Running Allrun in {dirs}")
-            self.current_process = subprocess.Popen(
-                ["./Allrun"],
-                cwd=dirs,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
-            )
-            self._stream_subprocess_output(self.current_process, "CFD Allrun", 85)
-
-            if self.current_process.returncode != 0:
-                raise subprocess.CalledProcessError(self.current_process.returncode, "Allrun")
+            mesh_key = None
+            if ANALYSIS_SETTINGS["CFD"]["MESH_CACHE"]["ENABLED"]:
+                mesh_cache = MeshCache.for_case(dirs, logger=self.logger)
+                mesh_key = compute_mesh_key(dirs)
+            if mesh_key and mesh_cache.restore(mesh_key, dirs):
+                self.update_progress("Reusing cached mesh…", 86)
+                flow_rate = self.flow_rate.get()
+                source_rate = warm_start(dirs, flow_rate, mesh_key, logger=self.logger,
+                                         candidates=self._warm_start_candidates(flow_rate))
+                if source_rate is not None:
+                    self.update_progress(f"Starting from the {source_rate:g} LPM solution…", 86)
+                decompose_for_phase(dirs, "solve", logger=self.logger)
+                self._run_allrun_stage(dirs, "solve")
+            elif ANALYSIS_SETTINGS["CFD"]["PIPELINE_MODE"]:
+                self._run_allrun_stage(dirs, "pre")
+                if self.cancel_requested:
+                    return
+                decompose_for_phase(dirs, "pipeline", logger=self.logger)
+                self._run_allrun_stage(dirs, "pipeline")
+                if mesh_key and not self.cancel_requested:
+                    mesh_cache.store(mesh_key, dirs)
+            else:
+                self._run_allrun_stage(dirs, "pre")
+                snappy_stages = ["snappy1", "snappy2"] if has_second_snappy_pass(dirs) else ["snappy1"]
+                for stage in snappy_stages:
+                    if self.cancel_requested:
+                        return
+                    decompose_for_phase(dirs, stage, logger=self.logger)
+                    self._run_allrun_stage(dirs, stage)
+                if self.cancel_requested:
+                    return
+                if mesh_key:
+                    mesh_cache.store(mesh_key, dirs)
+                decompose_for_phase(dirs, "solve", logger=self.logger)
+                self._run_allrun_stage(dirs, "solve")
 
             # ----------------------------
             # 6) Done
@@ -2070,6 +2249,29 @@ class Tab4Manager:
                 self.logger.log_error(msg)
                 self.app.after(0, lambda: self._on_worker_error("Simulation", msg))
 
+        finally:
+            # The solver has exited one way or another; let the monitor read the last iterations
+            if getattr(self, "residual_monitor_stop", None) is not None:
+                self.residual_monitor_stop.set()
+
+
+    def _run_allrun_stage(self, dirs, stage):
+        """Run Allrun (or one of its stages) and stream the output to the progress section."""
+        cmd = ["./Allrun"] if stage is None else ["./Allrun", stage]
+        label = "Allrun" if stage is None else f"Allrun {stage}"
+        self.logger.log_info(f"Running {label} in {dirs}")
+        self.current_process = subprocess.Popen(
+            cmd,
+            cwd=dirs,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1
+        )
+        self._stream_subprocess_output(self.current_process, f"CFD {label}", 85)
+
+        if self.current_process.returncode != 0:
+            raise subprocess.CalledProcessError(self.current_process.returncode, label)
 
     def _on_sim_done(self, cfd_dir):
         """Process and visualize CFD results after simulation completes."""
@@ -2150,7 +2352,7 @@ class Tab4Manager:
             script_path = os.path.join(main_dir, "paraview_ortho.py")
             
             # Run the command
-            cmd = ["pvbatch", script_path]
+            cmd = ["pvbatch", script_path, "--case", str(cfd_dir)]
             self.logger.log_info(f"Command: {' '.join(cmd)}")
             
             process = subprocess.Popen(
@@ -2182,25 +2384,7 @@ class Tab4Manager:
     
     def autocrop_whitespace(self, folder, pattern="*.png", ignore_axes=True):
         # Crops out the white space in the images. Did this to not modify the paraview script provided by Uday
-        for fname in glob.glob(os.path.join(folder, pattern)):
-            with Image.open(fname) as img:
-                work_img = img
-                if ignore_axes:
-                    work_img = img.copy()
-                    width, height = work_img.size
-                    corner = int(min(width, height) * 0.12)
-                    corner = max(40, min(corner, 120))
-                    draw = ImageDraw.Draw(work_img)
-                    draw.rectangle([0, height - corner, corner, height], fill=(255, 255, 255))
-                # create a white background image the same size
-                bg = Image.new(work_img.mode, work_img.size, (255, 255, 255))
-                # find the bounding box of the non-white area
-                diff = ImageChops.difference(work_img, bg)
-                bbox = diff.getbbox()
-                if bbox:
-                    cropped = img.crop(bbox)
-                    cropped.save(fname)  # overwrite
-                    print(f"Cropped whitespace from {os.path.basename(fname)}")
+        autocrop_whitespace(folder, pattern=pattern, ignore_axes=ignore_axes)
 
     def _on_sim_cancelled(self):
         """Handle cancellation completion cleanly"""
@@ -2214,11 +2398,11 @@ class Tab4Manager:
         self.logger.log_info("Simulation cancelled by user")
 
         # Update progress section with cancellation message
-        self.app.after(0, lambda: self.progress_section.update_progress(
-            None,  # No percentage change
+        self.progress_section.post(
             "Processing cancelled by user",  # Message
+            None,  # No percentage change
             "Cancellation complete - processing stopped"  # Output line
-        ))
+        )
 
         # Clean up files - wait a sec for processes to end
         self.app.after(10000, self._delete_cancelled_files)
@@ -2226,6 +2410,17 @@ class Tab4Manager:
         # Reset the processing state through the "central" method
         self._reset_processing_state()
 
+    def _warm_start_candidates(self, flow_rate):
+        """(flow rate, case folder) of the other flow rates of this patient with results."""
+        candidates = []
+        for entry in Path(self.app.full_folder_path).iterdir():
+            other_rate = flow_rate_from_dirname(entry.name)
+            if other_rate is None or other_rate == round(flow_rate, 1):
+                continue
+            if self._cfd_results_exist(other_rate):
+                candidates.append((other_rate, Path(self._get_full_cfd_path(other_rate))))
+        return candidates
+
     def _cfd_results_exist(self, flow_rate=None):
         """Check if CFD results already exist (case.foam + postProcessing + .stl)."""
         cfd_path = self._get_full_cfd_path(flow_rate)
@@ -2287,64 +2482,39 @@ class Tab4Manager:
         return max_time, max_dir
 
     def _get_completed_time_dir(self, case_dir):
-        """Return the latest time dir if it reaches endTime; otherwise None."""
+        """Return the latest time dir if it reaches endTime (or the early-stop iteration); otherwise None."""
         end_time = self._get_control_dict_end_time(case_dir)
         max_time, max_dir = self._get_max_time_dir(case_dir)
         if end_time is None or max_time is None or max_dir is None:
             return None
+        # A converged run is stopped before endTime (gui/utils/convergence.py)
+        stopped_at = converged_time(case_dir)
+        if stopped_at is not None:
+            end_time = min(end_time, stopped_at)
         if max_time + 1e-6 < end_time:
             return None
         return max_dir
     
-    def _monitor_residuals(self, dirs):
-        """Monitor and update residual plots during simulation"""
-        gnuplot_dir = os.path.join(dirs, "gnuplot")
-        
-        # Check if the directory exists
-        if not os.path.exists(gnuplot_dir):
-            self.logger.log_warning(f"Gnuplot directory not found at {gnuplot_dir}")
-            return
-            
-        # Keep checking while the simulation is running and not cancelled
-        while not self.cancel_requested:
-            try:
-                # Run the gnuplot script if it exists (same as GUI_ortho approach)
-                if os.path.exists(os.path.join(gnuplot_dir, "gnuplot_residuals")):
-                    # Only run if log file exists to prevent errors
-                    log_file = os.path.join(gnuplot_dir, "log.simpleFoam")
-                    if os.path.exists(log_file) and os.path.getsize(log_file) > 0:
-                        subprocess.run(
-                            ['/bin/bash', '-c', "bash ./gnuplot_residuals"], 
-                            cwd=gnuplot_dir, 
-                            check=False,
-                            stdout=subprocess.DEVNULL,  # Suppress stdout
-                            stderr=subprocess.DEVNULL   # Suppress stderr
-                        )
-                
-                # Check if the plot was generated
-                if os.path.exists(os.path.join(gnuplot_dir, "residual_plot.png")):
-                    self.residual_plot_path = os.path.join(gnuplot_dir, "residual_plot.png")
-                
-                # Sleep before checking again
-                time.sleep(2)
-                
-                # Check if simulation is complete - use same condition as GUI_ortho
-                completed_dir = self._get_completed_time_dir(dirs)
-                if completed_dir and os.path.exists(os.path.join(dirs, completed_dir, "U")):
-                    break
-                    
-                # Also check for cancellation flag
-                if self.cancel_requested:
-                    self.logger.log_info("Residual monitoring cancelled")
-                    break
-                    
-            except Exception as e:
-                self.logger.log_error(f"Error monitoring residuals: {str(e)}")
-                time.sleep(10)
-                
-                # Check for cancellation after error
-                if self.cancel_requested:
-                    break
+    def _monitor_residuals(self, dirs, stop_event):
+        """Follow the solver residuals and show the live plot until stop_event is set"""
+        def on_update(image, history):
+            self.residual_plot_path = monitor.plot_path
+            if not self.cancel_requested:
+                self.progress_section.show_plot(image)
+
+        monitor = ResidualMonitor(dirs, logger=self.logger, on_update=on_update)
+        if ANALYSIS_SETTINGS["CFD"]["CONVERGENCE"]["ENABLED"]:
+            # Also stops simpleFoam early once the pressure drop has settled
+            ConvergenceMonitor(dirs, logger=self.logger, residuals=monitor).run(stop_event)
+        else:
+            monitor.run(stop_event)
+        if self.cancel_requested:
+            self.logger.log_info("Residual monitoring cancelled")
+        elif len(monitor.history):
+            self.logger.log_info(
+                f"Residuals after {len(monitor.history)} iterations: "
+                + ", ".join(f"{field}={value:.2e}" for field, value in monitor.history.latest().items())
+            )
 
     def _load_existing_cfd(self):
         """Load existing CFD results for the current flow rate."""
@@ -3137,7 +3307,7 @@ class Tab4Manager:
                     # 2. endTime exists and highest time is less than endTime
                     end_time = self._get_control_dict_end_time(cfd_path)
                     if end_time is not None and has_time_dirs:
-                        incomplete = not case_foam_exists or (max_time_step < end_time)
+                        incomplete = not case_foam_exists or self._get_completed_time_dir(cfd_path) is None
                     else:
                         incomplete = not case_foam_exists
                     
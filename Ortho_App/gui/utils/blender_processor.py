@@ -7,20 +7,27 @@ This module handles all Blender-related operations including:
 - Creating inlet and outlet geometries
 - Generating assembly preview images
 - Managing Blender process lifecycle and cancellation
+- Or making the same cuts in-process with VTK (geometry_engine.py, GEOMETRY["ENGINE"] = "vtk")
 - This script also manages choosing between Master_cfd_file and Master_cfd_file_laminar according to flow rate
 
 Author: Alejandro Matos Camarillo
 Based on OrthoCFD Application by Uday Tummala
 """
 
+import json
 import os
+import queue
 import shutil
 import subprocess
 import threading
-import time
 from pathlib import Path
 from tkinter import messagebox
 
+from gui.config.settings import ANALYSIS_SETTINGS
+from .mesh_cache import clear_template_managed_files
+
+GEOMETRY_SETTINGS = ANALYSIS_SETTINGS["CFD"]["GEOMETRY"]
+
 
 class BlenderProcessor:
     """
@@ -95,18 +102,12 @@ class BlenderProcessor:
         trisurf_dir = os.path.join(cfd_output_dir, "constant", "triSurface")
         os.makedirs(trisurf_dir, exist_ok=True)
         
-        # Write the input files for Blender
-        with open("sdir.txt", "w") as f:
-            f.write(cfd_output_dir)
-        
-        with open("geo_in.txt", "w") as f:
-            f.write(stl_path)
-
         # Get the root dir of the project
         project_root = Path(__file__).resolve().parents[2]
         source_dir = project_root / "data" / template_case
         
-        # Copy CFD template files
+        # Copy CFD template files (over a clean set of snappyHexMeshDicts)
+        clear_template_managed_files(cfd_output_dir)
         shutil.copytree(source_dir, cfd_output_dir, symlinks=False, ignore=None, 
                             ignore_dangling_symlinks=False, dirs_exist_ok=True)
         
@@ -114,86 +115,145 @@ class BlenderProcessor:
         
         return trisurf_dir, project_root, blender_script_path
     
-    def _run_blender_process(self, blender_script_path):
+    def _manifest_path(self, cfd_output_dir):
+        """Manifest written by the geometry engine as its last step."""
+        return os.path.join(cfd_output_dir, GEOMETRY_SETTINGS["MANIFEST_FILE"])
+    
+    def _pump_stream(self, stream, name, lines):
+        """Reader thread: pass every line of one process stream to lines (a queue)."""
+        try:
+            for line in iter(stream.readline, ""):
+                lines.put((name, line))
+        finally:
+            stream.close()
+            lines.put((name, None))
+    
+    def _run_blender_process(self, blender_script_path, stl_path, cfd_output_dir):
         """
         Run the Blender process and monitor its output.
         
+        stdout and stderr are read by one thread each, so neither pipe can
+        fill up and block Blender, and cancellation is checked while Blender
+        is silent.
+        
         Args:
             blender_script_path: Path to the Blender script to execute
+            stl_path: Input STL, passed to the script after "--"
+            cfd_output_dir: Case folder, passed to the script after "--"
             
         Returns:
             tuple: (returncode, stdout, stderr)
         """
         try:
-            # Store the process reference for cancellation
+            # Store the process reference for cancellation; a Python error in the script
+            # makes Blender exit with 1 instead of 0
             self.current_process = subprocess.Popen(
-                ["blender", "--background", "--python", str(blender_script_path)],
+                ["blender", "--background", "--python-exit-code", "1", "--python", str(blender_script_path),
+                 "--", "--stl", str(stl_path), "--case", str(cfd_output_dir),
+                 "--manifest", self._manifest_path(cfd_output_dir)],
                 stdout=subprocess.PIPE, 
                 stderr=subprocess.PIPE,
-                universal_newlines=True
+                universal_newlines=True,
+                bufsize=1
             )
             
-            # Process output in real-time
-            while self.current_process.poll() is None:
+            lines = queue.Queue()
+            output = {"stdout": [], "stderr": []}
+            for name in output:
+                threading.Thread(
+                    target=self._pump_stream,
+                    args=(getattr(self.current_process, name), name, lines),
+                    daemon=True
+                ).start()
+            
+            # Process output in real-time, until both streams are closed
+            open_streams = len(output)
+            while open_streams:
                 # Check if cancellation was requested
                 if self._is_cancelled():
                     self.current_process.terminate()
                     self._update_progress("Blender processing cancelled")
                     return -1, "", "Process cancelled by user"
-                    
-                line = self.current_process.stdout.readline()
-                if line:
-                    line_stripped = line.strip()
+                
+                try:
+                    name, line = lines.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    open_streams -= 1
+                    continue
+                output[name].append(line)
+                line_stripped = line.strip()
+                if not line_stripped:
+                    continue
+                if name == "stdout":
                     self._log_info(f"Blender: {line_stripped}")
                     self._update_progress("Processing geometry in Blender...", None, line_stripped)
+                else:
+                    self._log_info(f"Blender (stderr): {line_stripped}")
             
-            stdout, stderr = self.current_process.communicate()
-            returncode = self.current_process.returncode
-            
-            return returncode, stdout, stderr
+            returncode = self.current_process.wait()
+            return returncode, "".join(output["stdout"]), "".join(output["stderr"])
             
         except Exception as e:
             self._log_error(f"Error running Blender process: {e}")
             return -1, "", str(e)
     
-    def _check_output_files(self, cfd_output_dir, max_attempts=10, check_interval=0.5):
+    def _read_manifest(self, cfd_output_dir):
         """
-        Check if Blender has generated the required output files.
+        Read the manifest the geometry engine wrote after its last output file.
+        
+        The manifest is written atomically once the process is done, so it is
+        read once after the process has exited; there is nothing to wait for.
         
         Args:
             cfd_output_dir: CFD output directory
-            max_attempts: Maximum number of attempts to check
-            check_interval: Time between checks in seconds
             
         Returns:
-            tuple: (files_exist, inlet_path, outlet_path, wall_path)
+            tuple: (manifest or None, error message or None)
         """
-        inlet_path = os.path.join(cfd_output_dir, "constant", "triSurface", "inlet.stl")
-        outlet_path = os.path.join(cfd_output_dir, "constant", "triSurface", "outlet.stl")
-        wall_path = os.path.join(cfd_output_dir, "constant", "triSurface", "wall.stl")
+        manifest_path = self._manifest_path(cfd_output_dir)
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None, f"The geometry engine finished without writing {manifest_path}"
+        except (OSError, ValueError) as e:
+            return None, f"Could not read {manifest_path}: {e}"
         
-        self._log_info(f"Checking for STL files: {inlet_path}, {outlet_path}, {wall_path}")
+        for name in ("inlet", "outlet", "wall"):
+            path = manifest.get("files", {}).get(name)
+            if not path or not os.path.exists(path):
+                return None, f"{name}.stl listed in the manifest was not found"
+            if not manifest.get("triangles", {}).get(name):
+                return None, f"{name}.stl has no triangles"
         
-        for attempt in range(max_attempts):
-            if self._is_cancelled():
-                return False, None, None, None
-                
-            files_exist = (os.path.exists(inlet_path) and 
-                          os.path.exists(outlet_path) and 
-                          os.path.exists(wall_path))
-            
-            if files_exist:
-                self._log_info("All STL files found")
-                return True, inlet_path, outlet_path, wall_path
-            
-            if attempt < max_attempts - 1:  # Don't sleep on the last attempt
-                self._log_info(f"STL files not ready yet, checking again in {check_interval}s (attempt {attempt + 1}/{max_attempts})")
-                time.sleep(check_interval)
+        counts = ", ".join(f"{name} {count}" for name, count in manifest["triangles"].items())
+        timings = manifest.get("timings", {})
+        total = timings.get("total", sum(timings.values()))
+        self._log_info(f"Geometry manifest ({manifest.get('engine')}): {counts} triangles, {total:.2f} s")
+        return manifest, None
+    
+    def _run_geometry_engine(self, stl_path, cfd_output_dir):
+        """
+        Make the cuts of blender_ortho.py in-process (gui/utils/geometry_engine.py).
         
-        self._log_error("STL files were not created within the expected time")
-        return False, None, None, None
+        Returns:
+            tuple: (returncode, stdout, stderr), as _run_blender_process
+        """
+        from .geometry_engine import GeometryEngine
+
+        try:
+            GeometryEngine(logger=self.logger).process(
+                stl_path, cfd_output_dir, manifest_path=self._manifest_path(cfd_output_dir)
+            )
+            return 0, "", ""
+        except Exception as e:
+            self._log_error(f"Error cutting the geometry: {e}")
+            return -1, "", str(e)
     
-    def process_geometry(self, stl_path, cfd_output_dir, render_callback=None, template_case="Master_cfd_file"):
+    def process_geometry(self, stl_path, cfd_output_dir, render_callback=None, template_case="Master_cfd_file",
+                         engine=None):
         """
         Main method to process geometry using Blender.
         
@@ -201,6 +261,7 @@ class BlenderProcessor:
             stl_path: Path to the input STL file
             cfd_output_dir: Output directory for CFD files
             render_callback: Optional callback to handle assembly image rendering
+            engine: "blender" or "vtk"; defaults to GEOMETRY["ENGINE"]
             
         Returns:
             dict: Processing results with keys:
@@ -213,6 +274,9 @@ class BlenderProcessor:
         """
         try:
             self.cancel_requested = False
+            engine = (engine or GEOMETRY_SETTINGS["ENGINE"]).lower()
+            if engine not in ("blender", "vtk"):
+                raise ValueError(f"Unknown geometry engine '{engine}', expected 'blender' or 'vtk'")
             
             # Check if cancellation was requested before starting
             if self._is_cancelled():
@@ -225,16 +289,23 @@ class BlenderProcessor:
                 stl_path, cfd_output_dir, template_case=template_case
             )
             
+            # A manifest left by an earlier run must not be taken for this one's
+            manifest_path = self._manifest_path(cfd_output_dir)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            
             self._log_info(f"Starting Blender with STL path: {stl_path}")
             self._log_info(f"Output directory: {trisurf_dir}")
             
             if self._is_cancelled():
                 return {"success": False, "error_message": "Processing cancelled during setup"}
             
-            self._update_progress("Running Blender script...", 60)
-            
-            # Run Blender process
-            returncode, stdout, stderr = self._run_blender_process(blender_script_path)
+            if engine == "vtk":
+                self._update_progress("Cutting inlet and outlet...", 60)
+                returncode, stdout, stderr = self._run_geometry_engine(stl_path, cfd_output_dir)
+            else:
+                self._update_progress("Running Blender script...", 60)
+                returncode, stdout, stderr = self._run_blender_process(blender_script_path, stl_path, cfd_output_dir)
             
             if self._is_cancelled():
                 return {"success": False, "error_message": "Processing cancelled during Blender execution"}
@@ -242,22 +313,26 @@ class BlenderProcessor:
             # Check for Blender errors
             if returncode != 0:
                 error_msg = stderr if stderr else "Unknown Blender error occurred"
-                self._log_error(f"Blender process failed with return code {returncode}: {error_msg}")
+                self._log_error(f"Geometry processing ({engine}) failed with return code {returncode}: {error_msg}")
                 return {"success": False, "error_message": error_msg}
             
             self._update_progress("Checking output files...", 70)
             
-            # Check if output files were created
-            files_exist, inlet_path, outlet_path, wall_path = self._check_output_files(cfd_output_dir)
-            
-            if not files_exist:
-                return {"success": False, "error_message": "Required STL files were not generated"}
+            # Check that the engine got to its last step
+            manifest, manifest_error = self._read_manifest(cfd_output_dir)
+            if manifest is None:
+                self._log_error(manifest_error)
+                return {"success": False, "error_message": manifest_error}
             
+            inlet_path = manifest["files"]["inlet"]
+            outlet_path = manifest["files"]["outlet"]
+            wall_path = manifest["files"]["wall"]
             result = {
                 "success": True,
                 "inlet_path": inlet_path,
                 "outlet_path": outlet_path,
-                "wall_path": wall_path
+                "wall_path": wall_path,
+                "manifest": manifest
             }
             
             # Generate assembly image if render callback is provided
@@ -280,7 +355,8 @@ class BlenderProcessor:
             self._log_error(f"Blender processing error: {e}")
             return {"success": False, "error_message": str(e)}
     
-    def process_geometry_async(self, stl_path, cfd_output_dir, completion_callback, render_callback=None, template_case="Master_cfd_file"):
+    def process_geometry_async(self, stl_path, cfd_output_dir, completion_callback, render_callback=None, template_case="Master_cfd_file",
+                               engine=None):
         """
         Process geometry asynchronously in a separate thread.
         
@@ -289,13 +365,15 @@ class BlenderProcessor:
             cfd_output_dir: Output directory for CFD files
             completion_callback: Function to call when processing completes (result)
         render_callback: Optional callback to handle assembly image rendering
+            engine: "blender" or "vtk"; defaults to GEOMETRY["ENGINE"]
         """
         def worker():
             result = self.process_geometry(
                 stl_path,
                 cfd_output_dir,
                 render_callback,
-                template_case=template_case
+                template_case=template_case,
+                engine=engine
             )
             completion_callback(result)
         
@@ -0,0 +1,294 @@
+# gui/utils/cfd_sweep.py
+"""
+Multi flow-rate sweep for one patient.
+
+A sweep takes a list of flow rates and:
+- runs Blender once and copies its geometry outputs into every CFD_<rate> case
+  (each case starts from the laminar or turbulent template, as in Tab4)
+- meshes once per template through the MeshCache
+- runs the simpleFoam cases side by side, splitting the available cores
+  between them; each case's numberOfSubdomains is capped by its core set
+"""
+
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from queue import Queue
+from typing import Dict, List, Optional, Sequence
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from .blender_processor import BlenderProcessor
+from .decomposition import available_cores, write_number_of_subdomains
+from .legacy_cfd_runner import prepare_case, build_mesh, run_cfd
+from .mesh_cache import clear_template_managed_files
+
+SWEEP_SETTINGS = ANALYSIS_SETTINGS["CFD"]["SWEEP"]
+
+# Files written by blender_ortho.py, relative to the case directory
+GEOMETRY_FILES = (
+    "constant/triSurface/inlet.stl",
+    "constant/triSurface/outlet.stl",
+    "constant/triSurface/wall.stl",
+    "system/face_centers_i.txt",
+    "system/face_centers.txt",
+    "system/bb_min_max.txt",
+    "blendout.jpg",
+)
+
+
+def cfd_case_dirname(flow_rate: float) -> str:
+    """Folder name used for a flow rate, e.g. 12.5 -> CFD_12_5."""
+    return f"CFD_{flow_rate:.1f}".replace(".", "_")
+
+
+def flow_rate_from_dirname(name: str) -> Optional[float]:
+    """Inverse of cfd_case_dirname, e.g. CFD_12_5 -> 12.5 (None for other names)."""
+    match = re.fullmatch(r"CFD_(\d+)_(\d+)", name)
+    if not match:
+        return None
+    return float(f"{match.group(1)}.{match.group(2)}")
+
+
+def template_for_flow_rate(flow_rate: float) -> str:
+    """Laminar template below the turbulence threshold, k-omega template above."""
+    if flow_rate < ANALYSIS_SETTINGS["CFD"]["LAMINAR_MAX_LPM"]:
+        return "Master_cfd_file_laminar"
+    return "Master_cfd_file"
+
+
+def template_dir(template_case: str) -> Path:
+    """Location of a CFD template case shipped with the application."""
+    return Path(__file__).resolve().parents[2] / "data" / template_case
+
+
+def copy_geometry(geometry_case, case_dir, template_case: str):
+    """Set up case_dir from its template plus the Blender outputs of geometry_case."""
+    geometry_case, case_dir = Path(geometry_case), Path(case_dir)
+    clear_template_managed_files(case_dir)
+    shutil.copytree(template_dir(template_case), case_dir, dirs_exist_ok=True)
+    for rel_path in GEOMETRY_FILES:
+        src = geometry_case / rel_path
+        if src.exists():
+            dst = case_dir / rel_path
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dst)
+
+
+def split_cores(n_runs: int, cores: Sequence[int], min_ranks: int) -> List[List[int]]:
+    """
+    Split the cores into disjoint sets, one per concurrently running case.
+
+    At most n_runs sets are returned and each set has at least min_ranks
+    cores (unless the machine has fewer cores than that).
+    """
+    cores = list(cores)
+    if n_runs <= 0 or not cores:
+        return []
+    n_slots = max(1, min(n_runs, len(cores) // max(1, min_ranks)))
+    per_slot = len(cores) // n_slots
+    return [cores[i * per_slot:(i + 1) * per_slot] for i in range(n_slots)]
+
+
+class FlowRateSweep:
+    """
+    Runs several flow rates of the same patient geometry.
+    """
+
+    def __init__(self, stl_path, patient_dir, flow_rates, logger=None,
+                 progress_callback=None, cancel_check_callback=None,
+                 render_callback=None, cores=None):
+        """
+        Args:
+            stl_path: Segmented airway STL (stl/<name>_geo.stl)
+            patient_dir: Patient output folder holding the CFD_<rate> cases
+            flow_rates: Iterable of flow rates in LPM
+            logger: Optional logger instance
+            progress_callback: Function for progress updates (message, percentage, output_line)
+            cancel_check_callback: Function to check if cancellation was requested
+            render_callback: Optional assembly image callback passed to BlenderProcessor
+            cores: Core ids to use, defaults to the process affinity
+        """
+        self.stl_path = str(stl_path)
+        self.patient_dir = Path(patient_dir)
+        self.flow_rates = sorted({round(float(f), 1) for f in flow_rates})
+        self.logger = logger
+        self.progress_callback = progress_callback
+        self.cancel_check_callback = cancel_check_callback
+        self.render_callback = render_callback
+        self.cores = list(cores) if cores else available_cores()
+        self.cancel_requested = False
+        self.blender_processor = BlenderProcessor(
+            logger=logger,
+            progress_callback=progress_callback,
+            cancel_check_callback=self._is_cancelled
+        )
+        self.assembly_image_path = None
+        # Flow rates whose case prepare_case already cleaned (the mesh leaders)
+        self._prepared = set()
+
+    def _log_info(self, message):
+        """Helper method to log info messages"""
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _log_error(self, message):
+        """Helper method to log error messages"""
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            print(f"ERROR: {message}")
+
+    def _update_progress(self, message, percentage=None, output_line=None):
+        """Helper method to update progress"""
+        if self.progress_callback:
+            self.progress_callback(message, percentage, output_line)
+        else:
+            print(f"Progress: {message} ({percentage}%)")
+
+    def _is_cancelled(self):
+        """Check if cancellation was requested"""
+        if self.cancel_check_callback and self.cancel_check_callback():
+            return True
+        return self.cancel_requested
+
+    def request_cancel(self):
+        """Stop after the runs that are already executing (pending runs are skipped)."""
+        self.cancel_requested = True
+        self.blender_processor.request_cancel()
+
+    def case_dir(self, flow_rate: float) -> Path:
+        return self.patient_dir / cfd_case_dirname(flow_rate)
+
+    def _prepare_case_dirs(self, geometry_case: Path):
+        """Copy the templates and the Blender geometry into every case folder."""
+        for flow_rate in self.flow_rates:
+            case_dir = self.case_dir(flow_rate)
+            if case_dir == geometry_case:
+                continue
+            copy_geometry(geometry_case, case_dir, template_for_flow_rate(flow_rate))
+
+    def _run_parallel(self, jobs, slots, job_fn):
+        """
+        Run job_fn(job, cpu_set) for every job, at most len(slots) at a time.
+
+        Each running job holds one core set from the slot queue.
+        """
+        slot_queue = Queue()
+        for slot in slots:
+            slot_queue.put(slot)
+
+        def worker(job):
+            if self._is_cancelled():
+                return job, False, "Cancelled"
+            cpu_set = slot_queue.get()
+            try:
+                ok, msg = job_fn(job, cpu_set)
+                return job, ok, msg
+            except Exception as e:
+                return job, False, f"{type(e).__name__}: {e}"
+            finally:
+                slot_queue.put(cpu_set)
+
+        results = []
+        if not jobs or not slots:
+            return results
+        with ThreadPoolExecutor(max_workers=len(slots)) as executor:
+            futures = [executor.submit(worker, job) for job in jobs]
+            for future in as_completed(futures):
+                results.append(future.result())
+        return results
+
+    def _mesh_job(self, flow_rate, cpu_set):
+        case_dir = str(self.case_dir(flow_rate))
+        write_number_of_subdomains(case_dir, len(cpu_set))
+        ok, msg = prepare_case(case_dir, flow_rate, self.logger)
+        if not ok:
+            return ok, msg
+        self._prepared.add(flow_rate)
+        return build_mesh(case_dir, self.logger, cpu_set=cpu_set)
+
+    def _solve_job(self, flow_rate, cpu_set):
+        case_dir = str(self.case_dir(flow_rate))
+        write_number_of_subdomains(case_dir, len(cpu_set))
+        self._log_info(f"Sweep: {cfd_case_dirname(flow_rate)} on cores {cpu_set}")
+        return run_cfd(case_dir, flow_rate, logger=self.logger,
+                       use_mesh_cache=True, cpu_set=cpu_set,
+                       prepared=flow_rate in self._prepared)
+
+    def run(self) -> Dict[float, Dict[str, object]]:
+        """
+        Run the sweep.
+
+        Returns:
+            dict: flow rate -> {"case_dir", "success", "message"}
+        """
+        results = {
+            flow_rate: {"case_dir": str(self.case_dir(flow_rate)), "success": False,
+                        "message": "Not run"}
+            for flow_rate in self.flow_rates
+        }
+        if not self.flow_rates:
+            return results
+
+        # 1) Blender once, in the first case
+        geometry_case = self.case_dir(self.flow_rates[0])
+        self._update_progress("Creating inlet and outlet in Blender…", 50)
+        blender_result = self.blender_processor.process_geometry(
+            self.stl_path,
+            str(geometry_case),
+            render_callback=self.render_callback,
+            template_case=template_for_flow_rate(self.flow_rates[0])
+        )
+        if not blender_result["success"]:
+            for entry in results.values():
+                entry["message"] = blender_result["error_message"]
+            return results
+        self.assembly_image_path = blender_result.get("assembly_image_path")
+
+        self._prepare_case_dirs(geometry_case)
+        if self._is_cancelled():
+            return results
+
+        # 2) Mesh once per template (cases sharing a template share the mesh)
+        leaders = {}
+        for flow_rate in self.flow_rates:
+            leaders.setdefault(template_for_flow_rate(flow_rate), flow_rate)
+        min_ranks = SWEEP_SETTINGS["MIN_RANKS_PER_RUN"]
+        self._update_progress(f"Meshing {len(leaders)} geometry variant(s)…", 60)
+        mesh_slots = split_cores(len(leaders), self.cores, min_ranks)
+        failed_templates = {}
+        for flow_rate, ok, msg in self._run_parallel(list(leaders.values()), mesh_slots, self._mesh_job):
+            if not ok:
+                self._log_error(f"Meshing for {cfd_case_dirname(flow_rate)} failed: {msg}")
+                failed_templates[template_for_flow_rate(flow_rate)] = msg
+
+        # 3) Solvers side by side
+        pending = []
+        for flow_rate in self.flow_rates:
+            template = template_for_flow_rate(flow_rate)
+            if template in failed_templates:
+                results[flow_rate]["message"] = failed_templates[template]
+            else:
+                pending.append(flow_rate)
+
+        max_runs = SWEEP_SETTINGS["MAX_CONCURRENT_RUNS"] or len(pending)
+        solve_slots = split_cores(min(len(pending), max_runs), self.cores, min_ranks)
+        self._update_progress(
+            f"Running {len(pending)} simulation(s), {len(solve_slots)} at a time…", 70
+        )
+
+        done = 0
+        for flow_rate, ok, msg in self._run_parallel(pending, solve_slots, self._solve_job):
+            results[flow_rate]["success"] = ok
+            results[flow_rate]["message"] = msg
+            done += 1
+            self._update_progress(
+                f"Finished {done}/{len(pending)} simulations",
+                70 + 20 * done / max(1, len(pending)),
+                f"{cfd_case_dirname(flow_rate)}: {msg}"
+            )
+
+        return results
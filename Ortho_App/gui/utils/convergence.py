@@ -0,0 +1,237 @@
+# gui/utils/convergence.py
+"""
+Early stop of simpleFoam once the solution has converged.
+
+controlDict runs 1000 iterations and residualControl (1e-5) is rarely met,
+while the pressure drop between avgsurf1 (inlet) and avgsurf11 (outlet),
+the quantity the report uses, usually settles after a few hundred.
+ConvergenceMonitor follows both surfaceFieldValue.dat files and the solver
+residuals. The run counts as converged when, after MIN_ITERATIONS,
+
+- the pressure drop varies by less than RELATIVE_TOLERANCE (or
+  ABSOLUTE_TOLERANCE Pa) over the last WINDOW iterations, and
+- every initial residual is below MAX_RESIDUAL.
+
+The monitor then sets "stopAt writeNow;" in system/controlDict. The case
+has runTimeModifiable on, so simpleFoam re-reads the file, writes the
+current iteration and exits normally (Allrun still reconstructs the fields).
+A marker file (MARKER_FILE) records the iteration, so the completion checks
+accept a last time directory below endTime.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import numpy as np
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from .residual_monitor import FileTail, ResidualMonitor
+
+CONVERGENCE_SETTINGS = ANALYSIS_SETTINGS["CFD"]["CONVERGENCE"]
+RESIDUAL_SETTINGS = ANALYSIS_SETTINGS["CFD"]["RESIDUALS"]
+
+INLET_FUNCTION = "avgsurf1"
+OUTLET_FUNCTION = "avgsurf11"
+
+_STOP_AT = re.compile(r"^(\s*stopAt\s+)\w+(\s*;)", re.MULTILINE)
+
+
+def _control_dict(case_dir) -> str:
+    return os.path.join(str(case_dir), "system", "controlDict")
+
+
+def _set_stop_at(case_dir, value: str) -> bool:
+    """Rewrite the stopAt entry of controlDict in place (simpleFoam watches this file)."""
+    path = _control_dict(case_dir)
+    try:
+        with open(path, "r") as f:
+            text = f.read()
+    except OSError:
+        return False
+    new_text, count = _STOP_AT.subn(rf"\g<1>{value}\g<2>", text, count=1)
+    if not count:
+        return False
+    if new_text != text:
+        with open(path, "w") as f:
+            f.write(new_text)
+    return True
+
+
+def reset_convergence(case_dir):
+    """Undo an earlier early stop before the solver runs again in case_dir."""
+    _set_stop_at(case_dir, "endTime")
+    marker = os.path.join(str(case_dir), CONVERGENCE_SETTINGS["MARKER_FILE"])
+    if os.path.exists(marker):
+        os.remove(marker)
+
+
+def converged_time(case_dir) -> Optional[float]:
+    """Iteration at which the run in case_dir was stopped as converged, or None."""
+    marker = os.path.join(str(case_dir), CONVERGENCE_SETTINGS["MARKER_FILE"])
+    try:
+        with open(marker, "r") as f:
+            return float(json.load(f)["time"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+class _PressureSeries:
+    """areaAverage(p) over time from one surfaceFieldValue.dat, read incrementally."""
+
+    def __init__(self, path):
+        self.tail = FileTail(path)
+        self.column = 1
+        self.values = {}
+
+    def poll(self):
+        for line in self.tail.read_lines():
+            # Columns are tab separated; vectors such as areaAverage(U) contain spaces
+            parts = [part.strip() for part in line.split("\t")]
+            if line.startswith("#"):
+                names = [part.lstrip("#").strip() for part in parts]
+                if names and names[0] == "Time" and "areaAverage(p)" in names:
+                    self.column = names.index("areaAverage(p)")
+                continue
+            if len(parts) <= self.column:
+                continue
+            try:
+                self.values[float(parts[0])] = float(parts[self.column])
+            except ValueError:
+                continue
+
+
+class ConvergenceMonitor:
+    """Watches one running case and stops the solver once it has converged."""
+
+    def __init__(self, case_dir, logger=None, residuals: Optional[ResidualMonitor] = None):
+        """
+        Args:
+            case_dir: OpenFOAM case folder
+            logger: Optional logger instance
+            residuals: ResidualMonitor already following this case (e.g. the
+                GUI's live plot); a non-plotting one is created otherwise
+        """
+        self.case_dir = str(case_dir)
+        self.logger = logger
+        self.residuals = residuals or ResidualMonitor(self.case_dir, logger=logger, plot=False)
+        self.inlet = _PressureSeries(self._surface_file(INLET_FUNCTION))
+        self.outlet = _PressureSeries(self._surface_file(OUTLET_FUNCTION))
+        self.stopped_at = None
+
+    def _log_info(self, message):
+        """Helper method to log info messages"""
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _log_error(self, message):
+        """Helper method to log error messages"""
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            print(f"ERROR: {message}")
+
+    def _surface_file(self, function_name):
+        return os.path.join(self.case_dir, "postProcessing", function_name, "0", "surfaceFieldValue.dat")
+
+    def pressure_drop(self):
+        """(times, inlet - outlet) for the iterations both files have reached."""
+        times = sorted(self.inlet.values.keys() & self.outlet.values.keys())
+        drop = np.array([self.inlet.values[t] - self.outlet.values[t] for t in times])
+        return np.array(times), drop
+
+    def is_converged(self) -> bool:
+        """Apply the plateau and residual criteria to what has been read so far."""
+        settings = CONVERGENCE_SETTINGS
+        history = self.residuals.history
+        if not len(history) or history.times[-1] < settings["MIN_ITERATIONS"]:
+            return False
+
+        latest = [value for value in history.latest().values() if np.isfinite(value)]
+        if not latest or max(latest) > settings["MAX_RESIDUAL"]:
+            return False
+
+        times, drop = self.pressure_drop()
+        if len(times) < 2 or times[-1] - times[0] < settings["WINDOW"]:
+            return False
+        window = drop[times >= times[-1] - settings["WINDOW"]]
+        spread = float(window.max() - window.min())
+        scale = abs(float(window.mean()))
+        if spread > settings["ABSOLUTE_TOLERANCE"] and spread > settings["RELATIVE_TOLERANCE"] * scale:
+            return False
+        return True
+
+    def request_stop(self):
+        """Make simpleFoam write the current iteration and exit."""
+        iteration = float(self.residuals.history.times[-1])
+        if not _set_stop_at(self.case_dir, "writeNow"):
+            self._log_error(f"No stopAt entry in {_control_dict(self.case_dir)}, cannot stop early")
+            return
+        self.stopped_at = iteration
+        times, drop = self.pressure_drop()
+        marker = {
+            "time": iteration,
+            "pressure_drop": float(drop[-1]),
+            "residuals": self.residuals.history.latest(),
+            "written": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(os.path.join(self.case_dir, CONVERGENCE_SETTINGS["MARKER_FILE"]), "w") as f:
+            json.dump(marker, f, indent=2)
+        self._log_info(
+            f"Converged at iteration {iteration:g} (pressure drop {drop[-1]:.4g} Pa), stopping simpleFoam"
+        )
+
+    def poll(self):
+        """Read new solver output and stop the run once it has converged."""
+        self.residuals.poll()
+        self.inlet.poll()
+        self.outlet.poll()
+        if self.stopped_at is None and self.is_converged():
+            self.request_stop()
+
+    def run(self, stop_event: threading.Event, interval: Optional[float] = None):
+        """Poll until stop_event is set."""
+        interval = interval or RESIDUAL_SETTINGS["POLL_INTERVAL"]
+        while not stop_event.wait(interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self._log_error(f"Error checking convergence: {e}")
+        try:
+            self.residuals.poll()
+        except Exception as e:
+            self._log_error(f"Error checking convergence: {e}")
+
+
+@contextmanager
+def watch_convergence(case_dir, logger=None, enabled: Optional[bool] = None):
+    """
+    Run a ConvergenceMonitor in a thread for the duration of the with block.
+
+    Wrap the command that runs the solver:
+
+        with watch_convergence(case_dir, logger):
+            subprocess.run(["./Allrun", "solve"], cwd=case_dir)
+    """
+    if enabled is None:
+        enabled = CONVERGENCE_SETTINGS["ENABLED"]
+    if not enabled:
+        yield None
+        return
+
+    reset_convergence(case_dir)
+    monitor = ConvergenceMonitor(case_dir, logger=logger)
+    stop_event = threading.Event()
+    thread = threading.Thread(target=monitor.run, args=(stop_event,), daemon=True)
+    thread.start()
+    try:
+        yield monitor
+    finally:
+        stop_event.set()
+        thread.join()
@@ -0,0 +1,231 @@
+# gui/utils/cross_section.py
+"""
+Cross-sectional area (CSA) of the airway surface along its axis.
+
+The old estimate copied every vertex through polydata.GetPoint(i), binned
+the vertices into 50 Z slabs and took the bounding box of each slab, which
+was slow on million-vertex meshes and overestimated every section.
+
+Here the points and triangles are taken from VTK as NumPy views
+(vtk.util.numpy_support) and the surface is cut by a few hundred parallel
+planes at once:
+
+- every triangle is assigned to the planes between its lowest and highest
+  vertex (sorted stations, so this is two searchsorted calls)
+- each (triangle, plane) pair gives one intersection segment, oriented with
+  the triangle normal so that the segments of a section form closed loops
+  running counter-clockwise around the lumen
+- the area of each section is the shoelace sum of its segments
+  (np.bincount over the plane index)
+
+The result is the exact area of the polygonal sections, holes and several
+separate lumens at the same level included. The surface must be closed and
+consistently oriented (create_stl computes normals with ConsistencyOn and
+AutoOrientNormalsOn).
+
+The planes are normal to the Z axis or to the principal (long) axis of the
+airway, a straight-line approximation of its centerline (CSA["AXIS"]).
+"""
+
+import csv
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+from gui.config.settings import ANALYSIS_SETTINGS
+
+CSA_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["CSA"]
+
+# (triangle, plane) pairs processed at once; bounds the temporary arrays to ~100 MB
+_CHUNK = 500000
+
+
+def polydata_arrays(polydata) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Points (N x 3) and triangles (M x 3 point ids) of a vtkPolyData, without per-point Python calls.
+
+    Polygons that are not triangles are triangulated first.
+    """
+    polys = polydata.GetPolys()
+    if polys.GetNumberOfCells() and polys.GetMaxCellSize() != 3:
+        triangles = vtk.vtkTriangleFilter()
+        triangles.SetInputData(polydata)
+        triangles.PassLinesOff()
+        triangles.PassVertsOff()
+        triangles.Update()
+        polydata = triangles.GetOutput()
+        polys = polydata.GetPolys()
+
+    if polydata.GetNumberOfPoints() == 0 or polys.GetNumberOfCells() == 0:
+        return np.empty((0, 3)), np.empty((0, 3), dtype=np.int64)
+
+    points = numpy_support.vtk_to_numpy(polydata.GetPoints().GetData()).astype(float, copy=False)
+    if hasattr(polys, "GetConnectivityArray"):
+        # VTK >= 9: offsets/connectivity storage
+        cells = numpy_support.vtk_to_numpy(polys.GetConnectivityArray())
+    else:
+        # Legacy storage: (3, id0, id1, id2) per cell
+        cells = numpy_support.vtk_to_numpy(polys.GetData()).reshape(-1, 4)[:, 1:]
+    return points, cells.reshape(-1, 3)
+
+
+def principal_axis(points: np.ndarray) -> np.ndarray:
+    """Unit vector along the largest extent of the point cloud, pointing up (+Z)."""
+    centered = points - points.mean(axis=0)
+    # Covariance of a subsample is plenty for the direction
+    step = max(1, len(centered) // 200000)
+    _, vectors = np.linalg.eigh(np.cov(centered[::step].T))
+    axis = vectors[:, -1]
+    return axis if axis[2] >= 0 else -axis
+
+
+def _plane_basis(axis: np.ndarray) -> np.ndarray:
+    """Rotation whose third row is axis (section planes become z = const)."""
+    axis = axis / np.linalg.norm(axis)
+    helper = np.array([1.0, 0.0, 0.0]) if abs(axis[0]) < 0.9 else np.array([0.0, 1.0, 0.0])
+    u = np.cross(axis, helper)
+    u /= np.linalg.norm(u)
+    v = np.cross(axis, u)
+    return np.vstack([u, v, axis])
+
+
+def section_areas(points: np.ndarray, triangles: np.ndarray, axis, stations: np.ndarray) -> np.ndarray:
+    """
+    Exact area of the sections of a closed surface by the planes axis . x = station.
+
+    Args:
+        points: N x 3 vertex coordinates
+        triangles: M x 3 vertex ids (consistent orientation)
+        axis: Plane normal
+        stations: Plane positions along axis, ascending
+
+    Returns:
+        Area of every section (same length as stations)
+    """
+    stations = np.asarray(stations, dtype=float)
+    areas = np.zeros(len(stations))
+    if len(triangles) == 0 or len(stations) == 0:
+        return areas
+
+    local = points @ _plane_basis(np.asarray(axis, dtype=float)).T
+    tri = local[triangles]                      # M x 3 vertices x 3 coords
+    heights = tri[:, :, 2]
+
+    # Planes cut a triangle when min < h <= max (a vertex at h counts as above)
+    first = np.searchsorted(stations, heights.min(axis=1), side="right")
+    last = np.searchsorted(stations, heights.max(axis=1), side="right")
+    counts = last - first
+    cut = counts > 0
+    if not cut.any():
+        return areas
+    tri_index = np.repeat(np.nonzero(cut)[0], counts[cut])
+    station_index = np.repeat(first[cut], counts[cut]) + (
+        np.arange(counts[cut].sum()) - np.repeat(np.cumsum(counts[cut]) - counts[cut], counts[cut])
+    )
+
+    for chunk in range(0, len(tri_index), _CHUNK):
+        pairs = slice(chunk, chunk + _CHUNK)
+        areas += _segment_cross_terms(tri[tri_index[pairs]], stations[station_index[pairs]],
+                                      station_index[pairs], len(stations))
+    return 0.5 * np.abs(areas)
+
+
+def _segment_cross_terms(v: np.ndarray, h: np.ndarray, station_index: np.ndarray, n_stations: int) -> np.ndarray:
+    """Shoelace terms of the (triangle, plane) segments, summed per plane."""
+    h = h[:, None]
+    z = v[:, :, 2]
+    start, end = v, np.roll(v, -1, axis=1)      # edges 0-1, 1-2, 2-0
+    z_start, z_end = z, np.roll(z, -1, axis=1)
+    crosses = (z_start >= h) != (z_end >= h)    # exactly two edges per pair
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(crosses, (h - z_start) / (z_end - z_start), 0.0)
+    hits = start[:, :, :2] + t[:, :, None] * (end[:, :, :2] - start[:, :, :2])
+
+    order = np.argsort(~crosses, axis=1, kind="stable")[:, :2]
+    segments = hits[np.arange(len(v))[:, None], order]
+    a, b = segments[:, 0], segments[:, 1]
+
+    # Orient every segment counter-clockwise around the lumen: along axis x n
+    normal = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    direction = np.stack([-normal[:, 1], normal[:, 0]], axis=1)
+    flip = np.einsum("ij,ij->i", b - a, direction) < 0
+    a[flip], b[flip] = b[flip], a[flip].copy()
+
+    cross = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    return np.bincount(station_index, weights=cross, minlength=n_stations)
+
+
+def csa_profile(polydata, n_stations: Optional[int] = None, axis: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    CSA at evenly spaced stations along the airway.
+
+    Args:
+        polydata: Closed airway surface (mm)
+        n_stations: Number of section planes (CSA["STATIONS"])
+        axis: "principal" or "z" (CSA["AXIS"])
+
+    Returns:
+        dict with "position" (mm along the axis), "area" (mm²) and "axis"
+    """
+    n_stations = n_stations or CSA_SETTINGS["STATIONS"]
+    axis = (axis or CSA_SETTINGS["AXIS"]).lower()
+    points, triangles = polydata_arrays(polydata)
+    if len(triangles) == 0:
+        return {"position": np.empty(0), "area": np.empty(0), "axis": np.array([0.0, 0.0, 1.0])}
+
+    direction = principal_axis(points) if axis == "principal" else np.array([0.0, 0.0, 1.0])
+    extent = points @ direction
+    low, high = extent.min(), extent.max()
+    # Stations at the centres of n equal intervals (never exactly on the end caps)
+    stations = low + (np.arange(n_stations) + 0.5) * (high - low) / n_stations
+    return {
+        "position": stations,
+        "area": section_areas(points, triangles, direction, stations),
+        "axis": direction,
+    }
+
+
+def minimum_csa(profile: Dict[str, np.ndarray], end_margin: Optional[float] = None) -> Tuple[float, float]:
+    """
+    Smallest section away from the ends of the surface.
+
+    The first and last END_MARGIN of the length are skipped: there the
+    sections shrink to zero where the segmentation was cut off.
+
+    Returns:
+        (area mm², position mm), (0.0, nan) without sections
+    """
+    end_margin = CSA_SETTINGS["END_MARGIN"] if end_margin is None else end_margin
+    area, position = profile["area"], profile["position"]
+    n = len(area)
+    skip = int(n * end_margin)
+    inner = np.arange(skip, n - skip)
+    inner = inner[area[inner] > 0]
+    if len(inner) == 0:
+        return 0.0, float("nan")
+    best = inner[np.argmin(area[inner])]
+    return float(area[best]), float(position[best])
+
+
+def write_csa_outputs(profile: Dict[str, np.ndarray], output_folder) -> float:
+    """
+    Write min_csa.txt and the profile (CSA["PROFILE_FILE"]) into output_folder.
+
+    Returns:
+        The minimum CSA in mm²
+    """
+    output_folder = Path(output_folder)
+    min_area, position = minimum_csa(profile)
+    axis = ", ".join(f"{c:.3f}" for c in profile["axis"])
+    with open(output_folder / "min_csa.txt", "w") as f:
+        f.write(f"Min CSA: {min_area:.2f} mm²\n")
+        f.write(f"Position: {position:.2f} mm along ({axis})\n")
+    with open(output_folder / CSA_SETTINGS["PROFILE_FILE"], "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["position_mm", "area_mm2"])
+        for pos, area in zip(profile["position"], profile["area"]):
+            writer.writerow([f"{pos:.3f}", f"{area:.3f}"])
+    return min_area
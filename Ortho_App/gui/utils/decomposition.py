@@ -0,0 +1,204 @@
+# gui/utils/decomposition.py
+"""
+Sizing of system/decomposeParDict for each parallel phase of a case.
+
+The templates ship with numberOfSubdomains 4. Before every decomposePar the
+runner asks choose_subdomains() for a count based on the cell count known at
+that point and the cores available to the run:
+
+- snappy1: cells of the background mesh (log.blockMesh)
+- snappy2: cells after the first snappyHexMesh pass (log.snappyHexMesh)
+- solve:   cells of the final mesh (constant/polyMesh/owner header), which
+           also works for meshes restored from the MeshCache
+- pipeline: one decomposition for both snappy passes and the solver, so
+           it is sized for the final mesh, estimated before snappyHexMesh
+           runs: background cells (log.blockMesh) x 8^level for the highest
+           refinement level of the system/snappyHexMeshDict* files, capped
+           by their maxGlobalCells
+"""
+
+import math
+import os
+import re
+from pathlib import Path
+from typing import List, Optional
+
+from gui.config.settings import ANALYSIS_SETTINGS
+
+DECOMPOSITION_SETTINGS = ANALYSIS_SETTINGS["CFD"]["DECOMPOSITION"]
+
+PHASES = ("snappy1", "snappy2", "solve", "pipeline")
+
+# Allrun runs every phase through decomposePar and runParallel, which need at
+# least two subdomains; there is no serial path
+MIN_PARALLEL_SUBDOMAINS = 2
+
+_BLOCKMESH_CELLS = re.compile(r"nCells:\s*(\d+)")
+_SNAPPY_CELLS = re.compile(r"mesh\s*:\s*cells:(\d+)", re.IGNORECASE)
+_OWNER_CELLS = re.compile(r"nCells:\s*(\d+)")
+
+# Refinement levels of a snappyHexMeshDict: "level 2;", "level (1 2);" and
+# the distance/level pairs of "levels ((1.0 2) ...);"
+_LEVEL = re.compile(r"\blevel\s+(\d+)\s*;")
+_LEVEL_RANGE = re.compile(r"\blevel\s*\(\s*\d+\s+(\d+)\s*\)")
+_LEVELS = re.compile(r"\blevels\s*\((.*?)\)\s*;", re.DOTALL)
+_LEVELS_PAIR = re.compile(r"\(\s*[-+.\deE]+\s+(\d+)\s*\)")
+_MAX_GLOBAL_CELLS = re.compile(r"\bmaxGlobalCells\s+(\d+)\s*;")
+_COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def available_cores() -> List[int]:
+    """Core ids this process may run on (respects taskset/cgroup affinity)."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def _last_match(path: Path, pattern) -> Optional[int]:
+    """Last integer captured by pattern in a text file, or None."""
+    if not path.is_file():
+        return None
+    matches = pattern.findall(path.read_text(errors="replace"))
+    return int(matches[-1]) if matches else None
+
+
+def blockmesh_cell_count(case_dir) -> Optional[int]:
+    """Background mesh size reported by blockMesh."""
+    return _last_match(Path(case_dir) / "log.blockMesh", _BLOCKMESH_CELLS)
+
+
+def snappy_cell_count(case_dir) -> Optional[int]:
+    """Cell count of the last mesh reported in the snappyHexMesh logs."""
+    logs = sorted(Path(case_dir).glob("log.snappyHexMesh*"), key=lambda p: p.stat().st_mtime)
+    for log_path in reversed(logs):
+        cells = _last_match(log_path, _SNAPPY_CELLS)
+        if cells:
+            return cells
+    return None
+
+
+def polymesh_cell_count(case_dir) -> Optional[int]:
+    """
+    Cell count of constant/polyMesh.
+
+    OpenFOAM writes 'note "nPoints:.. nCells:.. ..."' into the header of the
+    owner file, which is plain text even for binary meshes.
+    """
+    owner = Path(case_dir) / "constant" / "polyMesh" / "owner"
+    if not owner.is_file():
+        return None
+    with open(owner, "rb") as f:
+        header = f.read(2048).decode("ascii", errors="replace")
+    match = _OWNER_CELLS.search(header)
+    return int(match.group(1)) if match else None
+
+
+def _snappy_dicts(case_dir) -> List[Path]:
+    return [path for path in sorted((Path(case_dir) / "system").glob("snappyHexMeshDict*"))
+            if path.is_file() and not path.name.endswith("~")]
+
+
+def estimated_final_cell_count(case_dir) -> Optional[int]:
+    """
+    Upper estimate of the final mesh size before snappyHexMesh has run.
+
+    Every background cell split to the highest refinement level gives
+    8^level cells; snappyHexMesh stops refining at maxGlobalCells, so the
+    estimate is capped there. Cells removed outside the airway and added by
+    the layers are not counted.
+    """
+    cells = blockmesh_cell_count(case_dir)
+    if not cells:
+        return None
+    level, cap = 0, None
+    for dict_path in _snappy_dicts(case_dir):
+        text = _COMMENT.sub("", dict_path.read_text(errors="replace"))
+        levels = [int(v) for v in _LEVEL.findall(text) + _LEVEL_RANGE.findall(text)]
+        for pairs in _LEVELS.findall(text):
+            levels += [int(v) for v in _LEVELS_PAIR.findall(pairs)]
+        level = max([level] + levels)
+        caps = [int(v) for v in _MAX_GLOBAL_CELLS.findall(text)]
+        if caps:
+            cap = max([cap or 0] + caps)
+    estimate = cells * 8 ** level
+    return min(estimate, cap) if cap else estimate
+
+
+def cell_count_for_phase(case_dir, phase: str) -> Optional[int]:
+    """Best known cell count before the given phase runs."""
+    if phase == "pipeline":
+        return estimated_final_cell_count(case_dir)
+    if phase == "snappy1":
+        return blockmesh_cell_count(case_dir)
+    if phase == "snappy2":
+        return snappy_cell_count(case_dir)
+    return polymesh_cell_count(case_dir) or snappy_cell_count(case_dir)
+
+
+def choose_subdomains(case_dir, phase: str, max_ranks: Optional[int] = None) -> int:
+    """
+    Number of subdomains for a phase.
+
+    Args:
+        case_dir: OpenFOAM case directory
+        phase: One of PHASES
+        max_ranks: Upper bound (e.g. the cores assigned to this run)
+
+    Returns:
+        int: ceil(cells / CELLS_PER_RANK[phase]) clamped to [MIN_SUBDOMAINS, max_ranks],
+        and never below MIN_PARALLEL_SUBDOMAINS (even on a single core).
+        Without a cell count all allowed cores are used.
+    """
+    if phase not in PHASES:
+        raise ValueError(f"Unknown decomposition phase: {phase}")
+
+    limit = max_ranks or len(available_cores())
+    if DECOMPOSITION_SETTINGS["MAX_SUBDOMAINS"]:
+        limit = min(limit, DECOMPOSITION_SETTINGS["MAX_SUBDOMAINS"])
+    limit = max(MIN_PARALLEL_SUBDOMAINS, limit)
+    minimum = max(MIN_PARALLEL_SUBDOMAINS, min(DECOMPOSITION_SETTINGS["MIN_SUBDOMAINS"], limit))
+
+    cells = cell_count_for_phase(case_dir, phase)
+    if not cells:
+        return limit
+
+    wanted = math.ceil(cells / DECOMPOSITION_SETTINGS["CELLS_PER_RANK"][phase])
+    return max(minimum, min(wanted, limit))
+
+
+def write_number_of_subdomains(case_dir, n_subdomains: int):
+    """Rewrite numberOfSubdomains in system/decomposeParDict."""
+    dict_path = Path(case_dir) / "system" / "decomposeParDict"
+    text = dict_path.read_text()
+    text, count = re.subn(
+        r"^(\s*numberOfSubdomains\s+)\d+(\s*;)",
+        rf"\g<1>{int(n_subdomains)}\g<2>",
+        text,
+        flags=re.MULTILINE,
+    )
+    if count == 0:
+        raise ValueError(f"numberOfSubdomains not found in {dict_path}")
+    dict_path.write_text(text)
+
+
+def decompose_for_phase(case_dir, phase: str, max_ranks: Optional[int] = None, logger=None) -> Optional[int]:
+    """
+    Write the chosen subdomain count before a phase's decomposePar.
+
+    Does nothing (and returns None) when DECOMPOSITION["AUTO"] is off, so the
+    value in the case's decomposeParDict is used.
+    """
+    if not DECOMPOSITION_SETTINGS["AUTO"]:
+        return None
+
+    n_subdomains = choose_subdomains(case_dir, phase, max_ranks)
+    write_number_of_subdomains(case_dir, n_subdomains)
+    estimated = "estimated " if phase == "pipeline" else ""
+    message = (f"{phase}: {n_subdomains} subdomain(s) "
+               f"for {cell_count_for_phase(case_dir, phase) or 'unknown'} {estimated}cells")
+    if logger:
+        logger.log_info(message)
+    else:
+        print(f"INFO: {message}")
+    return n_subdomains
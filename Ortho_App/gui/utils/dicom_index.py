@@ -0,0 +1,284 @@
+# gui/utils/dicom_index.py
+"""
+Index of the DICOM series in a folder, read from the file headers only.
+
+Selecting a CBCT folder used to parse every file up to three times:
+Tab2Manager._is_dicom_file while listing the folder, load_dicom_series
+(full pixel data, only to sort the slices) for the previews, and SimpleITK's
+GetGDCMSeriesFileNames before the NIfTI conversion. Here every file is
+looked at once:
+
+- files that cannot be DICOM images are skipped by name and size
+- the 'DICM' magic after the 128-byte preamble is checked before parsing;
+  files without it are still tried (some scanners omit the preamble)
+- the header is read with stop_before_pixels, in a thread pool
+  (DICOM_INDEX["WORKERS"]), since the time goes into file I/O
+
+The files are grouped by SeriesInstanceUID and each series is sorted by
+the position of its slices along the slice normal (ImagePositionPatient .
+normal of ImageOrientationPatient), then InstanceNumber, then file name.
+
+The index is saved as DICOM_INDEX["FILE"] in the scan folder together with
+a fingerprint of the folder (names, sizes and modification times), so
+opening the same patient again does not read the headers at all. It is
+kept next to the scan rather than in the patient output folder because it
+is read when the folder is picked, before the patient fields (filled from
+these headers) name the output folder, and because the same scan can be
+opened for several users and patients. The saved file lists the slices by
+file name only; they are joined with the folder it is read from, so a
+copied, moved or remounted folder does not point at the old location. When
+the folder is read-only (e.g. a CD), the index is kept in memory for the
+session instead.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pydicom
+
+from gui.config.settings import FILE_SETTINGS
+
+INDEX_SETTINGS = FILE_SETTINGS["DICOM_INDEX"]
+
+# Format of the saved index; older files are rebuilt
+INDEX_VERSION = 2
+
+# Files that cannot be DICOM images
+_SKIP_NAMES = {"DICOMDIR"}
+_SKIP_FOLDERS = {"CASEDATA"}
+_SKIP_EXTENSIONS = (".ini", ".txt", ".xml", ".json", ".log", ".dat", ".exe", ".dll",
+                    ".nii", ".nii.gz", ".png", ".jpg", ".pdf")
+_MIN_SIZE = 1024  # bytes; smaller files hold no image
+
+# Header values kept per series (taken from its first slice)
+_SERIES_TAGS = ("StudyInstanceUID", "Modality", "SeriesDescription", "Rows", "Columns",
+                "PixelSpacing", "SliceThickness", "RescaleSlope", "RescaleIntercept",
+                "ImageOrientationPatient", "PatientName", "PatientID", "PatientBirthDate",
+                "StudyDate", "ReferringPhysicianName")
+
+_memory_cache: Dict[str, Dict[str, Any]] = {}
+_memory_lock = threading.Lock()
+
+
+def _skipped(entry: os.DirEntry) -> bool:
+    name = entry.name.upper()
+    if name in _SKIP_NAMES or name.startswith("."):
+        return True
+    if os.path.basename(os.path.dirname(entry.path)).upper() in _SKIP_FOLDERS:
+        return True
+    return entry.name.lower().endswith(_SKIP_EXTENSIONS)
+
+
+def _candidate_files(folder) -> List[os.DirEntry]:
+    """Regular files of the folder that may be DICOM images, sorted by name."""
+    with os.scandir(folder) as entries:
+        files = [entry for entry in entries if entry.is_file() and not _skipped(entry)]
+    return sorted(files, key=lambda entry: entry.name)
+
+
+def fingerprint(entries: List[os.DirEntry]) -> str:
+    """Hash of the names, sizes and modification times of the files."""
+    digest = hashlib.sha256()
+    for entry in entries:
+        stat = entry.stat()
+        digest.update(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def has_dicom_magic(path) -> bool:
+    """True if the file has the 'DICM' marker after its 128-byte preamble."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(128)
+            return f.read(4) == b"DICM"
+    except OSError:
+        return False
+
+
+def _json_value(value):
+    """Header value as plain JSON (numbers, strings and lists of numbers)."""
+    if isinstance(value, (list, tuple, pydicom.multival.MultiValue)):
+        return [_json_value(v) for v in value]
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    return str(value)
+
+
+def read_header(path) -> Optional[Dict[str, Any]]:
+    """
+    Header of one file without its pixel data, or None if it is not a DICOM image.
+
+    Returns:
+        dict with path, series_uid, instance, position, and the _SERIES_TAGS present
+    """
+    magic = has_dicom_magic(path)
+    try:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=UserWarning, module="pydicom")
+            ds = pydicom.dcmread(str(path), force=True, stop_before_pixels=True)
+    except Exception:
+        return None
+    # Without the marker, accept only files that clearly are DICOM images
+    if "Rows" not in ds or "Columns" not in ds:
+        return None
+    if not magic and "SOPClassUID" not in ds and "Modality" not in ds:
+        return None
+
+    header = {
+        "path": str(path),
+        "series_uid": str(ds.get("SeriesInstanceUID", "")),
+        "instance": int(ds.InstanceNumber) if ds.get("InstanceNumber") not in (None, "") else None,
+        "position": [float(v) for v in ds.ImagePositionPatient] if "ImagePositionPatient" in ds else None,
+    }
+    for tag in _SERIES_TAGS:
+        if tag in ds and ds.get(tag) not in (None, ""):
+            header[tag] = _json_value(ds.get(tag))
+    return header
+
+
+def _slice_normal(header) -> Optional[np.ndarray]:
+    orientation = header.get("ImageOrientationPatient")
+    if not orientation or len(orientation) != 6:
+        return None
+    return np.cross(orientation[:3], orientation[3:])
+
+
+def _sort_series(headers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Slices in order along the normal, else by InstanceNumber, else by name."""
+    normal = _slice_normal(headers[0])
+    if normal is not None and all(h["position"] is not None for h in headers):
+        return sorted(headers, key=lambda h: (float(np.dot(normal, h["position"])), h["path"]))
+    if all(h["instance"] is not None for h in headers):
+        return sorted(headers, key=lambda h: (h["instance"], h["path"]))
+    return sorted(headers, key=lambda h: h["path"])
+
+
+def _group_series(headers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One entry per SeriesInstanceUID, largest series first."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for header in headers:
+        groups.setdefault(header["series_uid"], []).append(header)
+
+    series = []
+    for uid, members in groups.items():
+        members = _sort_series(members)
+        first = members[0]
+        info = {tag: first[tag] for tag in _SERIES_TAGS if tag in first}
+        normal = _slice_normal(first)
+        positions = [h["position"] for h in members]
+        if normal is not None and all(p is not None for p in positions):
+            distances = np.diff([float(np.dot(normal, p)) for p in positions])
+            info["SliceSpacing"] = float(np.median(distances)) if len(distances) else None
+        series.append({
+            "uid": uid,
+            "files": [h["path"] for h in members],
+            "positions": positions,
+            "instances": [h["instance"] for h in members],
+            "info": info,
+        })
+    series.sort(key=lambda s: len(s["files"]), reverse=True)
+    return series
+
+
+def scan_folder(folder, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Read the headers of every file in folder and build the index (no caching)."""
+    folder = os.path.abspath(str(folder))
+    entries = _candidate_files(folder)
+    candidates = [entry.path for entry in entries if entry.stat().st_size >= _MIN_SIZE]
+    workers = workers or INDEX_SETTINGS["WORKERS"]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(candidates) or 1))) as pool:
+        headers = [header for header in pool.map(read_header, candidates) if header]
+    return {
+        "version": INDEX_VERSION,
+        "folder": folder,
+        "fingerprint": fingerprint(entries),
+        "series": _group_series(headers),
+    }
+
+
+def _index_path(folder) -> str:
+    return os.path.join(str(folder), INDEX_SETTINGS["FILE"])
+
+
+def _load_saved(folder, expected_fingerprint) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_index_path(folder), "r") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("fingerprint") != expected_fingerprint:
+        return None
+    # Slices are saved by name; resolve them in the folder being opened
+    index["folder"] = folder
+    for series in index["series"]:
+        names = series["files"]
+        if any(os.path.basename(name) != name for name in names):
+            return None
+        series["files"] = [os.path.join(folder, name) for name in names]
+    return index
+
+
+def _save(index: Dict[str, Any]) -> bool:
+    path = _index_path(index["folder"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    saved = {key: value for key, value in index.items() if key != "folder"}
+    saved["series"] = [dict(series, files=[os.path.basename(f) for f in series["files"]])
+                       for series in index["series"]]
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def dicom_index(folder, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Index of the DICOM series in folder, read from disk or memory when the folder is unchanged.
+
+    Returns:
+        dict with folder, fingerprint and series (largest first); each series
+        has uid, files (sorted slices), positions, instances and info (header
+        values of its first slice)
+    """
+    folder = os.path.abspath(str(folder))
+    current = fingerprint(_candidate_files(folder))
+    if not refresh:
+        with _memory_lock:
+            cached = _memory_cache.get(folder)
+        if cached and cached["fingerprint"] == current:
+            return cached
+        saved = _load_saved(folder, current)
+        if saved:
+            with _memory_lock:
+                _memory_cache[folder] = saved
+            return saved
+
+    index = scan_folder(folder)
+    _save(index)
+    with _memory_lock:
+        _memory_cache[folder] = index
+    return index
+
+
+def main_series(index: Dict[str, Any]) -> Dict[str, Any]:
+    """The series with the most slices (the CBCT volume)."""
+    if not index["series"]:
+        raise ValueError(f"No DICOM image files found in {index['folder']}")
+    return index["series"][0]
+
+
+def series_files(folder) -> List[str]:
+    """Sorted slice files of the main series in folder."""
+    return main_series(dicom_index(folder))["files"]
@@ -0,0 +1,451 @@
+# gui/utils/geometry_engine.py
+"""
+Inlet, outlet and wall surfaces of a CFD case, cut in-process with VTK.
+
+blender_ortho.py starts Blender, imports the airway STL twice and cuts it
+with boolean DIFFERENCE modifiers against scaled cubes, only to write the
+three patch surfaces and three text files of the case. This module makes the
+same cuts on the surface directly, in the same order:
+
+1. the STL is placed like Blender places it: origin at the mean of its
+   vertices, then moved by |min| so that every coordinate is positive
+2. bisect at z = 0.5 mm, keeping the part above and closing the cut (fill)
+3. preliminary inlet: cube (100, 3, 120); the faces of its section go to
+   system/face_centers_i.txt
+4. inlet: cube (100, 8, 10) rotated by 1.021 rad about x, centered 10 mm
+   below the last preliminary inlet face; its section is inlet.stl
+5. outlet: cube (100, 120, 11); its section is outlet.stl, the mean of its
+   faces is system/face_centers.txt
+6. what is left outside the inlet and outlet cubes is wall.stl, and its
+   bounds give system/bb_min_max.txt
+
+A boolean difference with a cube keeps the part of the surface outside the
+cube (vtkClipPolyData with the six planes of the cube) and adds the part of
+the cube's surface that lies inside the airway: for every cube face, the
+section of the airway by the face plane (vtkCutter + vtkContourTriangulator),
+cut to the face rectangle. Each connected piece of a section stands for one
+Blender face; its center is the mean of its boundary vertices, as
+calc_center_median gives for the n-gon Blender creates there.
+
+The text files have the content and number format of blender_ortho.py. The
+STL files are ASCII in the layout of Blender's exporter, with the patch name
+as solid name instead of Blender's version string (snappyHexMeshDict names
+the surfaces itself). blendout.jpg is not rendered; the assembly image comes
+from process_geometry's render_callback.
+"""
+
+import itertools
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+from .cross_section import polydata_arrays
+
+# Cuts of blender_ortho.py (Blender world coordinates, mm)
+BISECT_Z = 0.5
+PRELIMINARY_INLET_SCALE = (100.0, 3.0, 120.0)
+INLET_SCALE = (100.0, 8.0, 10.0)
+INLET_ROTATION_X = 1.021018       # rad
+INLET_DROP = 10.0                 # inlet cube center below the last preliminary inlet face
+OUTLET_SCALE = (100.0, 120.0, 11.0)
+
+# system/face_centers.txt and system/bb_min_max.txt
+OUTLET_CENTER_RAISE = 5.0         # mm added to z of the outlet face centers
+OUTLET_CENTER_NUDGE = 0.002       # m, along the negative mean outlet normal
+BOUND_PAD = 1.0                   # mm
+BOX1_INSET_X = 10.0               # mm
+OUT_PLANE_DROP = 20.0             # mm below the last preliminary inlet face
+IN_PLANE_DROP = 13.0              # mm in y from the last outlet face
+PLANE_INSET = 2.0                 # mm above the wall minimum
+N_IN_PLANES = 5
+N_OUT_PLANES = 6
+
+# Distance below which the points of the bisect and of its fill are merged (mm)
+_MERGE_TOLERANCE = 1e-6
+
+_FACET_FORMAT = ("facet normal %f %f %f\nouter loop\n"
+                 "vertex %f %f %f\nvertex %f %f %f\nvertex %f %f %f\n"
+                 "endloop\nendfacet")
+
+
+class CutBox:
+    """Blender cube of size 2 with a scale, a rotation about x and a location."""
+
+    def __init__(self, scale, location=(0.0, 0.0, 0.0), rotation_x=0.0):
+        c, s = math.cos(rotation_x), math.sin(rotation_x)
+        # World directions of the local x, y and z axes
+        self.axes = np.array([[1.0, 0.0, 0.0], [0.0, c, s], [0.0, -s, c]])
+        self.half_sizes = np.asarray(scale, dtype=float)
+        self.center = np.asarray(location, dtype=float)
+
+    def face_planes(self, axes: Sequence[int] = (0, 1, 2)):
+        """(point, outward normal) of the two faces normal to each of the local axes."""
+        return [(self.center + sign * self.half_sizes[axis] * self.axes[axis], sign * self.axes[axis])
+                for axis in axes for sign in (1.0, -1.0)]
+
+    def implicit(self, axes: Sequence[int] = (0, 1, 2)) -> vtk.vtkPlanes:
+        """Negative inside the box (inside the slabs of the given axes only, if fewer than three)."""
+        points = vtk.vtkPoints()
+        normals = vtk.vtkDoubleArray()
+        normals.SetNumberOfComponents(3)
+        for point, normal in self.face_planes(axes):
+            points.InsertNextPoint(*point)
+            normals.InsertNextTuple3(*normal)
+        planes = vtk.vtkPlanes()
+        planes.SetPoints(points)
+        planes.SetNormals(normals)
+        return planes
+
+
+# --------------------------------------------------------------------------
+# Surface operations
+# --------------------------------------------------------------------------
+
+def _clip(surface, function, keep_inside=False):
+    """Part of surface where function > 0 (< 0 with keep_inside), cut exactly at 0."""
+    clip = vtk.vtkClipPolyData()
+    clip.SetInputData(surface)
+    clip.SetClipFunction(function)
+    clip.SetInsideOut(keep_inside)
+    clip.Update()
+    return clip.GetOutput()
+
+
+def _section(surface, point, normal):
+    """Triangulated section of a closed surface by a plane."""
+    plane = vtk.vtkPlane()
+    plane.SetOrigin(*point)
+    plane.SetNormal(*normal)
+    cutter = vtk.vtkCutter()
+    cutter.SetInputData(surface)
+    cutter.SetCutFunction(plane)
+    stripper = vtk.vtkStripper()
+    stripper.SetInputConnection(cutter.GetOutputPort())
+    stripper.JoinContiguousSegmentsOn()
+    triangulator = vtk.vtkContourTriangulator()
+    triangulator.SetInputConnection(stripper.GetOutputPort())
+    triangulator.Update()
+    return triangulator.GetOutput()
+
+
+def _crosses(surface, point, normal) -> bool:
+    """True if the plane passes through the bounding box of surface."""
+    bounds = np.array(surface.GetBounds()).reshape(3, 2)
+    side = (np.array(list(itertools.product(*bounds))) - point) @ normal
+    return side.min() <= 0 <= side.max()
+
+
+def _pieces(section, direction) -> List[Dict[str, Any]]:
+    """
+    Connected pieces of a planar section, triangles oriented along direction.
+
+    Returns:
+        list of dicts with triangles (K x 3 x 3 coordinates), center (mean of
+        the boundary vertices of the piece) and normal
+    """
+    if section.GetNumberOfCells() == 0:
+        return []  # e.g. a section clipped away entirely
+    connectivity = vtk.vtkPolyDataConnectivityFilter()
+    connectivity.SetInputData(section)
+    connectivity.SetExtractionModeToAllRegions()
+    connectivity.ColorRegionsOn()
+    connectivity.Update()
+    output = connectivity.GetOutput()
+    points, triangles = polydata_arrays(output)
+    # ColorRegions writes RegionId as point data; a triangle is in the region of its vertices
+    point_regions = output.GetPointData().GetArray("RegionId")
+    if len(triangles) == 0 or point_regions is None:
+        return []
+    regions = numpy_support.vtk_to_numpy(point_regions)[triangles[:, 0]]
+
+    normals = np.cross(points[triangles[:, 1]] - points[triangles[:, 0]],
+                       points[triangles[:, 2]] - points[triangles[:, 0]])
+    flip = normals @ direction < 0
+    triangles = triangles.copy()
+    triangles[flip] = triangles[flip][:, ::-1]
+
+    edges = np.sort(np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]]), axis=1)
+    edge_regions = np.tile(regions, 3)
+    unique, first, counts = np.unique(edges, axis=0, return_index=True, return_counts=True)
+    boundary, boundary_regions = unique[counts == 1], edge_regions[first[counts == 1]]
+
+    pieces = []
+    for region in np.unique(regions):
+        boundary_points = np.unique(boundary[boundary_regions == region])
+        if len(boundary_points) == 0:
+            continue
+        pieces.append({
+            "triangles": points[triangles[regions == region]],
+            "center": points[boundary_points].mean(axis=0),
+            "normal": np.asarray(direction, dtype=float),
+        })
+    return pieces
+
+
+def cap_faces(surface, box: CutBox, excluded: Sequence[CutBox] = ()) -> List[Dict[str, Any]]:
+    """
+    Part of the surface of box that lies inside the closed surface.
+
+    Args:
+        surface: Closed airway surface
+        box: Cutting cube
+        excluded: Cubes already cut away; the caps are removed where they lie inside them
+
+    Returns:
+        One entry per connected piece (see _pieces), normals pointing out of
+        the remaining airway (into the box)
+    """
+    faces = []
+    for axis in range(3):
+        for point, normal in box.face_planes((axis,)):
+            if not _crosses(surface, point, normal):
+                continue
+            section = _section(surface, point, normal)
+            if section.GetNumberOfCells() == 0:
+                continue
+            # The face is a rectangle, not the whole plane
+            section = _clip(section, box.implicit([other for other in range(3) if other != axis]),
+                            keep_inside=True)
+            for previous in excluded:
+                section = _clip(section, previous.implicit())
+            faces.extend(_pieces(section, -normal))
+    return faces
+
+
+def _bisect(surface):
+    """Part of surface above z = BISECT_Z, closed by its section."""
+    point, normal = (0.0, 0.0, BISECT_Z), (0.0, 0.0, 1.0)
+    plane = vtk.vtkPlane()
+    plane.SetOrigin(*point)
+    plane.SetNormal(*normal)
+    append = vtk.vtkAppendPolyData()
+    append.AddInputData(_clip(surface, plane))
+    append.AddInputData(_section(surface, point, normal))
+    cleaner = vtk.vtkCleanPolyData()
+    cleaner.SetInputConnection(append.GetOutputPort())
+    cleaner.ToleranceIsAbsoluteOn()
+    cleaner.SetAbsoluteTolerance(_MERGE_TOLERANCE)
+    cleaner.ConvertLinesToPointsOff()
+    cleaner.ConvertPolysToLinesOff()
+    cleaner.ConvertStripsToPolysOff()
+    cleaner.Update()
+    return cleaner.GetOutput()
+
+
+def load_placed(stl_path):
+    """The STL with its vertex mean at the origin, then moved by |min| (Blender's placement)."""
+    reader = vtk.vtkSTLReader()
+    reader.SetFileName(str(stl_path))
+    reader.Update()
+    surface = vtk.vtkPolyData()
+    surface.DeepCopy(reader.GetOutput())
+    if surface.GetNumberOfPoints() == 0:
+        raise ValueError(f"No triangles in {stl_path}")
+
+    points = numpy_support.vtk_to_numpy(surface.GetPoints().GetData()).astype(float)
+    centered = points - points.mean(axis=0)
+    placed = vtk.vtkPoints()
+    placed.SetData(numpy_support.numpy_to_vtk(centered + np.abs(centered.min(axis=0)), deep=True))
+    surface.SetPoints(placed)
+    return surface
+
+
+# --------------------------------------------------------------------------
+# Output files
+# --------------------------------------------------------------------------
+
+def write_ascii_stl(path, triangles: np.ndarray, name: str):
+    """ASCII STL of K x 3 x 3 triangle coordinates, laid out like Blender's exporter."""
+    triangles = np.asarray(triangles, dtype=float).reshape(-1, 3, 3)
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    with open(path, "w") as f:
+        f.write(f"solid {name}\n")
+        np.savetxt(f, np.hstack([normals, triangles.reshape(-1, 9)]), fmt=_FACET_FORMAT)
+        f.write(f"endsolid {name}\n")
+
+
+def write_inlet_centers(path, faces):
+    """system/face_centers_i.txt: the preliminary inlet face centers in m."""
+    with open(path, "w") as f:
+        f.write("Object: ini\n")
+        for face in faces:
+            x, y, z = (float(value) for value in face["center"])
+            f.write(f"({x * 0.001} {y * 0.001} {z * 0.001})\n")
+
+
+def write_outlet_center(path, faces):
+    """system/face_centers.txt: mean outlet face center, raised and nudged into the airway (m)."""
+    with open(path, "w") as f:
+        if not faces:
+            return
+        centers = np.array([face["center"] for face in faces], dtype=float)
+        centers[:, 2] += OUTLET_CENTER_RAISE
+        center = (centers * 0.001).mean(axis=0)
+        normal = np.array([face["normal"] for face in faces]).mean(axis=0)
+        length = np.linalg.norm(normal)
+        if length:
+            center -= normal / length * OUTLET_CENTER_NUDGE
+        f.write(f"({center[0]:.6f} {center[1]:.6f} {center[2]:.6f})\n")
+
+
+def write_manifest(path, manifest: Dict[str, Any]):
+    """JSON manifest of the outputs, through a temporary file (as blender_ortho.py writes it)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def bounds_text(wall_points: np.ndarray, inlet_face, outlet_face) -> str:
+    """
+    Contents of system/bb_min_max.txt.
+
+    Args:
+        wall_points: Vertices of the wall (mm)
+        inlet_face: Last preliminary inlet face
+        outlet_face: Last outlet face
+    """
+    (min_x, min_y, min_z), (max_x, max_y, max_z) = wall_points.min(axis=0), wall_points.max(axis=0)
+    bound_min = (min_x - BOUND_PAD, min_y - BOUND_PAD, min_z - BOUND_PAD)
+    bound_max = (max_x + BOUND_PAD, max_y + BOUND_PAD, max_z + BOUND_PAD)
+    box1_min = ((min_x + BOX1_INSET_X) * 0.001, (min_y - BOUND_PAD) * 0.001, (min_z - BOUND_PAD) * 0.001)
+    box1_max = ((max_x - BOX1_INSET_X) * 0.001, (max_y + BOUND_PAD) * 0.001, (max_z + BOUND_PAD) * 0.001)
+
+    op_z0 = (float(inlet_face["center"][2]) - OUT_PLANE_DROP) * 0.001
+    op_z_last = (min_z + PLANE_INSET) * 0.001
+    out_planes = [op_z0 - (op_z0 - op_z_last) * i / (N_OUT_PLANES - 1) for i in range(N_OUT_PLANES - 1)]
+    out_planes.append(op_z_last)
+    ip_y0 = (float(outlet_face["center"][1]) - IN_PLANE_DROP) * 0.001
+    ip_y_last = (min_y + PLANE_INSET) * 0.001
+    in_planes = [ip_y0 - (ip_y0 - ip_y_last) * i / (N_IN_PLANES - 1) for i in range(N_IN_PLANES - 1)]
+    in_planes.append(ip_y_last)
+
+    lines = []
+    for label, values in (("BOUND_MIN_{}", bound_min), ("BOUND_MAX_{}", bound_max),
+                          ("BOUND_MIN_{}1", box1_min), ("BOUND_MAX_{}1", box1_max)):
+        lines.extend(f"{label.format(axis)} {value:.3f};" for axis, value in zip("XYZ", values))
+    lines.extend(f"OUT_PLANE_Z{i} {value:.3f};" for i, value in enumerate(out_planes))
+    lines.extend(f"IN_PLANE_Y{i} {value:.3f};" for i, value in enumerate(in_planes))
+    lines.extend(f"N{axis} {int(round(high - low))};" for axis, low, high in zip("XYZ", bound_min, bound_max))
+    return "\n".join(lines) + "\n"
+
+
+# --------------------------------------------------------------------------
+# Engine
+# --------------------------------------------------------------------------
+
+class GeometryEngine:
+    """In-process replacement of blender_ortho.py for one case."""
+
+    def __init__(self, logger=None):
+        """
+        Args:
+            logger: Optional logger instance
+        """
+        self.logger = logger
+        self.timings = {}
+
+    def _log_info(self, message):
+        """Helper method to log info messages"""
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _timed(self, name, function, *args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.timings[name] = time.perf_counter() - started
+        return result
+
+    def process(self, stl_path, case_dir, manifest_path=None) -> Dict[str, Any]:
+        """
+        Cut the airway STL and write the geometry files of the case.
+
+        Args:
+            stl_path: Airway surface from the segmentation
+            case_dir: CFD case folder (constant/triSurface and system are created if missing)
+            manifest_path: Manifest written after all other files, in the
+                format of blender_ortho.py; None writes none
+
+        Returns:
+            dict with inlet_path, outlet_path, wall_path, triangles (per patch) and timings
+
+        Raises:
+            ValueError: If the surface does not reach the inlet or outlet cubes
+        """
+        self.timings = {}
+        surface = self._timed("load", load_placed, stl_path)
+        solid = self._timed("bisect", _bisect, surface)
+
+        preliminary = self._timed("preliminary_inlet", cap_faces, solid, CutBox(PRELIMINARY_INLET_SCALE))
+        if not preliminary:
+            raise ValueError("The airway does not reach the preliminary inlet cube")
+        inlet_box = CutBox(INLET_SCALE, (0.0, 0.0, float(preliminary[-1]["center"][2]) - INLET_DROP),
+                           INLET_ROTATION_X)
+        outlet_box = CutBox(OUTLET_SCALE)
+
+        inlet = self._timed("inlet", cap_faces, solid, inlet_box)
+        outlet = self._timed("outlet", cap_faces, solid, outlet_box, excluded=(inlet_box,))
+        if not inlet or not outlet:
+            raise ValueError(f"The airway does not reach the {'inlet' if not inlet else 'outlet'} cube")
+        wall = self._timed("wall", lambda: _clip(_clip(solid, inlet_box.implicit()), outlet_box.implicit()))
+        wall_points, wall_triangles = polydata_arrays(wall)
+
+        trisurf_dir = os.path.join(case_dir, "constant", "triSurface")
+        system_dir = os.path.join(case_dir, "system")
+        os.makedirs(trisurf_dir, exist_ok=True)
+        os.makedirs(system_dir, exist_ok=True)
+
+        started = time.perf_counter()
+        write_inlet_centers(os.path.join(system_dir, "face_centers_i.txt"), preliminary)
+        write_outlet_center(os.path.join(system_dir, "face_centers.txt"), outlet)
+        with open(os.path.join(system_dir, "bb_min_max.txt"), "w") as f:
+            f.write(bounds_text(wall_points, preliminary[-1], outlet[-1]))
+
+        patches = {
+            "inlet": np.concatenate([face["triangles"] for face in inlet]),
+            "outlet": np.concatenate([face["triangles"] for face in outlet]),
+            "wall": wall_points[wall_triangles],
+        }
+        paths = {}
+        for name, triangles in patches.items():
+            paths[name] = os.path.join(trisurf_dir, f"{name}.stl")
+            write_ascii_stl(paths[name], triangles, name)
+        self.timings["write"] = time.perf_counter() - started
+
+        counts = {name: len(triangles) for name, triangles in patches.items()}
+        if manifest_path:
+            write_manifest(manifest_path, {
+                "engine": "vtk",
+                "stl": str(stl_path),
+                "case": str(case_dir),
+                "files": {
+                    **paths,
+                    "face_centers_i": os.path.join(system_dir, "face_centers_i.txt"),
+                    "face_centers": os.path.join(system_dir, "face_centers.txt"),
+                    "bb_min_max": os.path.join(system_dir, "bb_min_max.txt"),
+                },
+                "triangles": counts,
+                "timings": {**self.timings, "total": sum(self.timings.values())},
+            })
+        self._log_info(
+            f"Geometry (VTK): inlet {counts['inlet']}, outlet {counts['outlet']}, wall {counts['wall']} triangles "
+            f"in {sum(self.timings.values()):.2f} s "
+            f"({', '.join(f'{name} {seconds:.2f} s' for name, seconds in self.timings.items())})"
+        )
+        return {
+            "inlet_path": paths["inlet"],
+            "outlet_path": paths["outlet"],
+            "wall_path": paths["wall"],
+            "triangles": counts,
+            "timings": dict(self.timings),
+        }
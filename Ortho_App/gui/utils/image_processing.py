@@ -1,10 +1,13 @@
 # gui/utils/image_processing.py
 import os
+import glob
 import numpy as np
 import pydicom
-from PIL import Image
+from PIL import Image, ImageChops, ImageDraw
 from pathlib import Path
 from typing import Dict, List, Tuple
+from gui.utils.dicom_index import dicom_index, main_series
+from gui.utils.slice_provider import DicomSlices, NiftiSlices, preview_cache
 
 def enhance_contrast(image: np.ndarray) -> np.ndarray:
     """
@@ -141,60 +144,22 @@ def load_dicom_series(folder_path: str) -> Tuple[List[pydicom.dataset.FileDatase
     Returns:
         Tuple of (list of DICOM datasets, 3D volume array)
     """
-    # Find all files in the folder - don't filter by extension
-    all_files = []
-    folder = Path(folder_path)
-    
-    for f in folder.iterdir():
-        if f.is_file():
-            all_files.append(str(f))
-    
-    if not all_files:
-        raise ValueError("No files found in the specified folder")
-    
-    print(f"Found {len(all_files)} total files in folder")
-    
-    # Filter for DICOM files by checking file content
-    dicom_files = []
-    for file_path in all_files:
-        if is_dicom_file(file_path):
-            dicom_files.append(file_path)
-            # print(f"Valid DICOM: {os.path.basename(file_path)}") # For troubleshooting
-    
+    # Slices of the main series, already validated and sorted from their headers
+    index = dicom_index(folder_path)
+    dicom_files = main_series(index)["files"]
     print(f"Identified {len(dicom_files)} DICOM image files")
-    
-    if not dicom_files:
-        raise ValueError("No DICOM image files found in the specified folder.")
 
-    # Load and sort slices - use force=True for non-standard files
+    # Load the slices in index order - use force=True for non-standard files
     slices = []
     for f in dicom_files:
         try:
-            ds = pydicom.dcmread(f, force=True)
-            # Double-check that it has pixel data
-            if not hasattr(ds, 'pixel_array'):
-                continue
-            slices.append(ds)
+            slices.append(pydicom.dcmread(f, force=True))
         except Exception as e:
             print(f"Warning: Could not read {os.path.basename(f)}: {e}")
     
     if not slices:
         raise ValueError("Could not read any DICOM files successfully")
     
-    # Try to sort by slice location - use multiple sorting strategies for robustness
-    try:
-        # First try: Sort by ImagePositionPatient[2] if available
-        if hasattr(slices[0], 'ImagePositionPatient'):
-            slices.sort(key=lambda s: float(s.ImagePositionPatient[2]) if hasattr(s, 'ImagePositionPatient') else 0)
-        # Second try: Sort by InstanceNumber if available
-        elif hasattr(slices[0], 'InstanceNumber'):
-            slices.sort(key=lambda s: int(s.InstanceNumber) if hasattr(s, 'InstanceNumber') else 0)
-        # Last resort: Just use the file name order
-        else:
-            print("Warning: No standard DICOM sorting attributes found. Using original file order.")
-    except Exception as e:
-        print(f"Warning: Could not sort slices properly: {e}. Using original file order.")
-    
     # Create volume with proper scaling
     try:
         pixel_arrays = [s.pixel_array for s in slices]
@@ -248,18 +213,11 @@ def generate_slices(dicom_folder: str) -> Dict[str, Image.Image]:
     """
     print(f"Generating slices from: {dicom_folder}")
     
-    # Load DICOM series - enhanced to work with non-standard files
-    slices, volume = load_dicom_series(dicom_folder)
-    
-    print(f"Scan shape: {volume.shape}")
-    
-    # Extract middle slices
-    middle_slices = {
-        'axial': volume[len(volume) // 2, :, :],
-        'coronal': volume[:, volume.shape[1] // 2, :],
-        'sagittal': volume[:, :, volume.shape[2] // 2]
-    }
-    
+    # Only the three middle slices are read (no full volume); rendered once per scan
+    return preview_cache.get(DicomSlices(dicom_folder), _render_dicom_slices)
+
+def _render_dicom_slices(middle_slices: Dict[str, np.ndarray]) -> Dict[str, Image.Image]:
+    """Preview images of the middle axial, coronal and sagittal DICOM slices"""
     # Process each slice
     processed_slices = {}
     for orientation, slice_data in middle_slices.items():
@@ -293,65 +251,9 @@ def generate_nifti_slices(nifti_file: str) -> Dict[str, Image.Image]:
         Dictionary with orthogonal views as PIL images
     """
     try:
-        import nibabel as nib
-        import numpy as np
-        
         print(f"Reading NIfTI file: {nifti_file}")
-        # Load the NIfTI file
-        img = nib.load(nifti_file)
-        data = img.get_fdata()
-        
-        print(f"NIfTI volume shape: {data.shape}")
-        
-        # Get the middle slice index for each dimension
-        x_mid = data.shape[0] // 2
-        y_mid = data.shape[1] // 2
-        z_mid = data.shape[2] // 2
-        
-        # Extract the middle slices - get raw data first
-        axial_raw = data[:, :, z_mid]
-        coronal_raw = data[:, y_mid, :]
-        sagittal_raw = data[x_mid, :, :]
-        
-        # Apply specific orientation adjustments for NIfTI
-        # These transformations might need fine-tuning based on your specific data
-        axial = np.flip(np.rot90(axial_raw, k=3), axis=1)  # Rotate and flip to match DICOM convention
-        axial = np.flip(axial, axis=1)
-        coronal = np.flip(np.rot90(coronal_raw, k=1), axis=1)  # Rotate and flip
-        coronal = np.flip(coronal, axis=1)
-        sagittal = np.flip(np.rot90(sagittal_raw, k=1), axis=1)  # Rotate and flip
-        sagittal = np.flip(sagittal, axis=1)
-
-        # For debugging orientation issues:
-        print(f"Axial shape after orientation: {axial.shape}")
-        print(f"Coronal shape after orientation: {coronal.shape}")
-        print(f"Sagittal shape after orientation: {sagittal.shape}")
-        
-        # Create dictionary of oriented slices
-        slices = {
-            'axial': axial,
-            'coronal': coronal,
-            'sagittal': sagittal
-        }
-        
-        # Process each slice similar to DICOM processing
-        processed_slices = {}
-        for orientation, slice_data in slices.items():
-            # Enhance contrast - This function should work the same for both DICOM and NIfTI
-            enhanced = enhance_contrast(slice_data)
-            
-            # Convert to PIL image with consistent sizing
-            target_width = 700  # Same as DICOM for consistency
-            aspect_ratio = enhanced.shape[0] / enhanced.shape[1]
-            target_height = int(target_width * aspect_ratio)
-
-            pil_image = Image.fromarray(enhanced)
-            processed_slices[orientation] = pil_image.resize(
-                (target_width, target_height),
-                Image.Resampling.LANCZOS
-            )
-        
-        return processed_slices
+        # Only the three middle slices are read through the data proxy; rendered once per scan
+        return preview_cache.get(NiftiSlices(nifti_file), _render_nifti_slices)
         
     except ImportError:
         print("Error: nibabel library is not installed. Please install with 'pip install nibabel'")
@@ -362,6 +264,52 @@ def generate_nifti_slices(nifti_file: str) -> Dict[str, Image.Image]:
         print(traceback.format_exc())
         raise ValueError(f"Could not generate slices from NIfTI file: {str(e)}")
 
+def _render_nifti_slices(middle_slices: Dict[str, np.ndarray]) -> Dict[str, Image.Image]:
+    """Preview images of the middle axial, coronal and sagittal NIfTI slices"""
+    axial_raw = middle_slices['axial']
+    coronal_raw = middle_slices['coronal']
+    sagittal_raw = middle_slices['sagittal']
+    
+    # Apply specific orientation adjustments for NIfTI
+    # These transformations might need fine-tuning based on your specific data
+    axial = np.flip(np.rot90(axial_raw, k=3), axis=1)  # Rotate and flip to match DICOM convention
+    axial = np.flip(axial, axis=1)
+    coronal = np.flip(np.rot90(coronal_raw, k=1), axis=1)  # Rotate and flip
+    coronal = np.flip(coronal, axis=1)
+    sagittal = np.flip(np.rot90(sagittal_raw, k=1), axis=1)  # Rotate and flip
+    sagittal = np.flip(sagittal, axis=1)
+
+    # For debugging orientation issues:
+    print(f"Axial shape after orientation: {axial.shape}")
+    print(f"Coronal shape after orientation: {coronal.shape}")
+    print(f"Sagittal shape after orientation: {sagittal.shape}")
+    
+    # Create dictionary of oriented slices
+    slices = {
+        'axial': axial,
+        'coronal': coronal,
+        'sagittal': sagittal
+    }
+    
+    # Process each slice similar to DICOM processing
+    processed_slices = {}
+    for orientation, slice_data in slices.items():
+        # Enhance contrast - This function should work the same for both DICOM and NIfTI
+        enhanced = enhance_contrast(slice_data)
+        
+        # Convert to PIL image with consistent sizing
+        target_width = 700  # Same as DICOM for consistency
+        aspect_ratio = enhanced.shape[0] / enhanced.shape[1]
+        target_height = int(target_width * aspect_ratio)
+
+        pil_image = Image.fromarray(enhanced)
+        processed_slices[orientation] = pil_image.resize(
+            (target_width, target_height),
+            Image.Resampling.LANCZOS
+        )
+    
+    return processed_slices
+
 # Alternative implementation using SimpleITK if PyDICOM approach fails
 def generate_slices_sitk(dicom_folder: str) -> Dict[str, Image.Image]:
     """
@@ -486,4 +434,34 @@ def should_skip_file(file_path):
     except:
         pass
         
-    return False
\ No newline at end of file
+    return False
+
+
+def autocrop_whitespace(folder, pattern="*.png", ignore_axes=True):
+    """
+    Crop the white margins of the ParaView screenshots in a folder (in place).
+
+    Args:
+        folder: Folder holding the images
+        pattern: Glob pattern of the images to crop
+        ignore_axes: Ignore the orientation axes drawn in the bottom-left corner
+    """
+    for fname in glob.glob(os.path.join(folder, pattern)):
+        with Image.open(fname) as img:
+            work_img = img
+            if ignore_axes:
+                work_img = img.copy()
+                width, height = work_img.size
+                corner = int(min(width, height) * 0.12)
+                corner = max(40, min(corner, 120))
+                draw = ImageDraw.Draw(work_img)
+                draw.rectangle([0, height - corner, corner, height], fill=(255, 255, 255))
+            # create a white background image the same size
+            bg = Image.new(work_img.mode, work_img.size, (255, 255, 255))
+            # find the bounding box of the non-white area
+            diff = ImageChops.difference(work_img, bg)
+            bbox = diff.getbbox()
+            if bbox:
+                cropped = img.crop(bbox)
+                cropped.save(fname)  # overwrite
+                print(f"Cropped whitespace from {os.path.basename(fname)}")
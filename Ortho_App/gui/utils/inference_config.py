@@ -0,0 +1,127 @@
+# gui/utils/inference_config.py
+"""
+Device and thread configuration for nnUNet inference.
+
+NNUNET["DEVICE"] = "auto" picks CUDA when a usable GPU is present and the CPU
+otherwise, so the same installation runs on workstations and on GPU-less
+cluster nodes. On the CPU the configuration is derived from the machine:
+
+- torch intra-op threads: all cores available to the process
+  (or CPU["THREADS"])
+- preprocessing / export workers (-npp / -nps): limited by the cores and by
+  the available RAM, since each worker holds a full resampled volume
+- test-time augmentation (mirroring): off by default (CPU["DISABLE_TTA"]),
+  it multiplies CPU inference time by up to 8
+"""
+
+import functools
+import os
+import shutil
+import subprocess
+from typing import Any, Dict, Optional
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from .decomposition import available_cores
+
+NNUNET_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["NNUNET"]
+CPU_SETTINGS = NNUNET_SETTINGS["CPU"]
+
+
+def _nvidia_gpu_present() -> bool:
+    """True if nvidia-smi lists at least one GPU."""
+    if not shutil.which("nvidia-smi"):
+        return False
+    try:
+        result = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0 and "GPU" in result.stdout
+
+
+@functools.lru_cache(maxsize=1)
+def detect_device() -> str:
+    """
+    'cuda' or 'cpu' for NNUNET["DEVICE"] == "auto", else the configured device.
+
+    nvidia-smi is checked first so GPU-less nodes never import torch here.
+    When a GPU is listed and torch is importable in this interpreter, torch
+    has the final word (a CPU-only torch build cannot use the GPU).
+    """
+    configured = NNUNET_SETTINGS["DEVICE"]
+    if configured != "auto":
+        return configured
+    if not _nvidia_gpu_present():
+        return "cpu"
+    try:
+        import torch
+    except ImportError:
+        return "cuda"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def available_memory_bytes() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, or free physical memory, or None."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _cpu_worker_count(n_cores: int, memory: Optional[int]) -> int:
+    """Preprocessing/export workers that fit in the cores and the RAM."""
+    workers = max(1, n_cores // 4)
+    if memory:
+        per_worker = CPU_SETTINGS["RAM_PER_WORKER_GB"] * 1024 ** 3
+        workers = min(workers, max(1, int(memory // per_worker)))
+    return max(1, min(workers, CPU_SETTINGS["MAX_WORKERS"]))
+
+
+def inference_config(max_threads: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Effective nnUNet inference options for this machine.
+
+    Args:
+        max_threads: Cores reserved for the inference (e.g. by the batch
+            scheduler); bounds the CPU threads and workers. None = all cores
+
+    Returns:
+        dict with device, threads (None = torch default), npp, nps,
+        disable_tta and step_size
+    """
+    device = detect_device()
+    if device != "cpu":
+        return {
+            "device": device,
+            "threads": None,
+            "npp": NNUNET_SETTINGS["NPP"],
+            "nps": NNUNET_SETTINGS["NPS"],
+            "disable_tta": NNUNET_SETTINGS["DISABLE_TTA"],
+            "step_size": NNUNET_SETTINGS["STEP_SIZE"],
+        }
+
+    n_cores = len(available_cores())
+    if max_threads:
+        n_cores = max(1, min(n_cores, max_threads))
+    workers = _cpu_worker_count(n_cores, available_memory_bytes())
+    return {
+        "device": "cpu",
+        "threads": min(CPU_SETTINGS["THREADS"] or n_cores, n_cores),
+        "npp": workers,
+        "nps": workers,
+        "disable_tta": NNUNET_SETTINGS["DISABLE_TTA"] or CPU_SETTINGS["DISABLE_TTA"],
+        "step_size": NNUNET_SETTINGS["STEP_SIZE"],
+    }
+
+
+def describe(config: Dict[str, Any]) -> str:
+    """One-line summary for the logs."""
+    return (f"device={config['device']} threads={config['threads'] or 'default'} "
+            f"npp={config['npp']} nps={config['nps']} step_size={config['step_size']} "
+            f"tta={'off' if config['disable_tta'] else 'on'}")
@@ -0,0 +1,127 @@
+# gui/utils/label_stats.py
+"""
+Airway statistics straight from the predicted label map.
+
+calculate_volume used nib.load(...).get_fdata(), which turns the uint8 label
+volume into float64 (8x the memory) only to count the airway voxels. Here
+the labels are read in their stored integer type, memory-mapped when the
+file is uncompressed, and scanned in slabs of SLAB_SLICES slices, so the
+temporary boolean mask never covers the whole scan. One scan gives:
+
+- the voxel count and volume (mm³)
+- the airway voxel count of every axial slice, i.e. a voxel CSA profile (mm²)
+- the bounding box of the airway (voxel indices)
+
+Connected components are labelled afterwards inside the bounding box only.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import nibabel as nib
+import numpy as np
+from scipy import ndimage
+
+from gui.config.settings import ANALYSIS_SETTINGS
+
+LABEL_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["LABEL_STATS"]
+
+
+def load_labels(path) -> Tuple[np.ndarray, np.ndarray, Tuple[float, ...]]:
+    """
+    Label array in its stored dtype, plus the affine and voxel sizes.
+
+    Uncompressed .nii files are memory-mapped; .nii.gz files are read once
+    without conversion to float.
+    """
+    image = nib.load(str(path), mmap=True)
+    proxy = image.dataobj
+    slope = getattr(proxy, "slope", 1.0)
+    inter = getattr(proxy, "inter", 0.0)
+    if hasattr(proxy, "get_unscaled") and slope in (1.0, None) and inter in (0.0, None):
+        data = proxy.get_unscaled()
+    else:
+        data = np.asanyarray(proxy)
+    return data, image.affine, tuple(float(z) for z in image.header.get_zooms()[:3])
+
+
+def bounding_box(mask_projection_xy: np.ndarray, slice_counts: np.ndarray):
+    """((i0, i1), (j0, j1), (k0, k1)) half-open voxel ranges, or None for an empty mask."""
+    occupied_k = np.flatnonzero(slice_counts)
+    if len(occupied_k) == 0:
+        return None
+    occupied_i = np.flatnonzero(mask_projection_xy.any(axis=1))
+    occupied_j = np.flatnonzero(mask_projection_xy.any(axis=0))
+    return (
+        (int(occupied_i[0]), int(occupied_i[-1]) + 1),
+        (int(occupied_j[0]), int(occupied_j[-1]) + 1),
+        (int(occupied_k[0]), int(occupied_k[-1]) + 1),
+    )
+
+
+def compute_label_stats(data: np.ndarray, zooms, label: Optional[int] = None,
+                        components: bool = True) -> Dict[str, Any]:
+    """
+    Volume, per-slice area, bounding box and connected components of one label.
+
+    Args:
+        data: Label array (i, j, k), any integer dtype, may be a memmap
+        zooms: Voxel size in mm (i, j, k)
+        label: Label value (LABEL_STATS["AIRWAY_LABEL"])
+        components: Also label the connected components (6-connectivity)
+
+    Returns:
+        dict with voxel_count, volume_mm3, slice_area_mm2 (list per k),
+        bbox (voxel ranges or None) and, if requested, components
+    """
+    label = LABEL_SETTINGS["AIRWAY_LABEL"] if label is None else label
+    slab = LABEL_SETTINGS["SLAB_SLICES"]
+    # Compare in the array's own dtype (no promotion of the whole slab)
+    value = np.asarray(label, dtype=data.dtype)
+
+    slice_counts = np.zeros(data.shape[2], dtype=np.int64)
+    projection = np.zeros(data.shape[:2], dtype=bool)
+    for k0 in range(0, data.shape[2], slab):
+        mask = data[:, :, k0:k0 + slab] == value
+        slice_counts[k0:k0 + mask.shape[2]] = np.count_nonzero(mask, axis=(0, 1))
+        projection |= mask.any(axis=2)
+
+    voxel_volume = float(np.prod(zooms[:3]))
+    voxel_count = int(slice_counts.sum())
+    stats = {
+        "label": int(label),
+        "voxel_size_mm": [float(z) for z in zooms[:3]],
+        "voxel_count": voxel_count,
+        "volume_mm3": voxel_count * voxel_volume,
+        "slice_area_mm2": (slice_counts * float(zooms[0] * zooms[1])).tolist(),
+        "bbox": bounding_box(projection, slice_counts),
+    }
+
+    if components and stats["bbox"] is not None:
+        (i0, i1), (j0, j1), (k0, k1) = stats["bbox"]
+        mask = np.asarray(data[i0:i1, j0:j1, k0:k1]) == value
+        labelled, count = ndimage.label(mask)
+        sizes = np.bincount(labelled.ravel())[1:]
+        sizes = np.sort(sizes)[::-1]
+        stats["components"] = {
+            "count": int(count),
+            "largest_voxels": int(sizes[0]) if count else 0,
+            "largest_fraction": float(sizes[0] / voxel_count) if count else 0.0,
+            "sizes_voxels": [int(size) for size in sizes[:10]],
+        }
+    return stats
+
+
+def label_stats(path, label: Optional[int] = None, components: bool = True) -> Dict[str, Any]:
+    """compute_label_stats() for a NIfTI label map on disk."""
+    data, _affine, zooms = load_labels(path)
+    return compute_label_stats(data, zooms, label=label, components=components)
+
+
+def write_label_stats(stats: Dict[str, Any], output_folder) -> Path:
+    """Save the statistics as LABEL_STATS["FILE"] in output_folder."""
+    path = Path(output_folder) / LABEL_SETTINGS["FILE"]
+    with open(path, "w") as f:
+        json.dump(stats, f, indent=2)
+    return path
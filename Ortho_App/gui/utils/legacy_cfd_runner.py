@@ -5,17 +5,40 @@ without pulling in the Tkinter UI.
 This mirrors the core steps:
 1) Write the flow rate file (pvfr.txt)
 2) Run Allclean
-3) Rebuild combined.stl from the triSurface parts
+3) Rebuild combined.stl from the inlet, outlet and wall surfaces
 4) Run Allrun
 
+Step 4 runs the Allrun stages one by one (pre, snappy1, snappy2, solve) so
+numberOfSubdomains can be sized for each decomposePar from the current cell
+count (see decomposition.py). With PIPELINE_MODE the stages after pre are
+replaced by the Allrun "pipeline" stage, which decomposes once and only
+reconstructs the final mesh and fields. When the mesh cache is enabled, a
+cached constant/polyMesh for the same geometry is linked into the case and
+only the solve stage runs; otherwise the freshly built mesh is stored for
+the next flow rate. While a stage that runs simpleFoam is active, a
+ConvergenceMonitor (convergence.py) stops the solver once the pressure drop
+has converged. On a mesh cache hit the solver starts from the nearest
+finished flow rate of the same mesh (warm_start.py).
+
 It accepts the case directory and flow rate so Tab4 (or other callers)
 can delegate the CFD stage to the legacy scripts.
 """
 
 import os
+import shutil
 import subprocess
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Sequence, Tuple
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from .mesh_cache import MeshCache, compute_mesh_key
+from .decomposition import decompose_for_phase
+from .convergence import watch_convergence
+from .warm_start import restore_initial_fields, warm_start
+from .surface_assembly import assemble_surfaces
+
+# Allrun stages that run simpleFoam
+SOLVER_STAGES = {None, "all", "solve", "pipeline"}
 
 
 def _log(logger, level: str, message: str):
@@ -26,14 +49,92 @@ def _log(logger, level: str, message: str):
         print(f"{level.upper()}: {message}")
 
 
-def run_cfd(case_dir: str, flow_rate_lpm: float, logger=None) -> Tuple[bool, str]:
+def _run_allrun(
+    case_dir: str,
+    stage: Optional[str],
+    logger=None,
+    cpu_set: Optional[Sequence[int]] = None,
+) -> Tuple[bool, str]:
+    """Run Allrun (optionally a single stage of it) and report the outcome."""
+    cmd = ["bash", "./Allrun"]
+    label = "Allrun"
+    if stage:
+        cmd.append(stage)
+        label = f"Allrun {stage}"
+    if cpu_set and shutil.which("taskset"):
+        # Pin concurrent runs to disjoint cores; mpirun binds inside this set
+        cmd = ["taskset", "-c", ",".join(str(c) for c in cpu_set)] + cmd
+
+    _log(logger, "info", f"Running {label} in {case_dir}")
+    # Solver stages may be stopped early once the pressure drop has converged
+    with watch_convergence(case_dir, logger, enabled=None if stage in SOLVER_STAGES else False):
+        allrun_proc = subprocess.run(
+            cmd,
+            cwd=case_dir,
+            check=False,
+            capture_output=True,
+            text=True,
+        )
+    if allrun_proc.returncode != 0:
+        msg = f"{label} failed (code {allrun_proc.returncode})"
+        _log(logger, "error", msg)
+        _log(logger, "error", allrun_proc.stdout or "")
+        _log(logger, "error", allrun_proc.stderr or "")
+        return False, msg
+
+    _log(logger, "info", f"{label} completed")
+    return True, f"{label} completed"
+
+
+def has_second_snappy_pass(case_dir) -> bool:
+    """The turbulent template adds layers in a second pass (snappyHexMeshDict1)."""
+    return (Path(case_dir) / "system" / "snappyHexMeshDict1").exists()
+
+
+def run_mesh_stages(case_dir: str, logger=None, cpu_set: Optional[Sequence[int]] = None) -> Tuple[bool, str]:
+    """Run the Allrun mesh stages, sizing the decomposition before each snappy pass."""
+    max_ranks = len(cpu_set) if cpu_set else None
+    snappy_stages = ["snappy1", "snappy2"] if has_second_snappy_pass(case_dir) else ["snappy1"]
+
+    ok, msg = _run_allrun(case_dir, "pre", logger, cpu_set=cpu_set)
+    if not ok:
+        return False, msg
+
+    for stage in snappy_stages:
+        decompose_for_phase(case_dir, stage, max_ranks, logger)
+        ok, msg = _run_allrun(case_dir, stage, logger, cpu_set=cpu_set)
+        if not ok:
+            return False, msg
+
+    return True, "Mesh stages completed"
+
+
+def run_pipeline(case_dir: str, logger=None, cpu_set: Optional[Sequence[int]] = None) -> Tuple[bool, str]:
     """
-    Run the legacy CFD workflow in a prepared case directory.
+    Mesh and solve without intermediate reconstruct/decompose steps.
+
+    One subdomain count is used for every phase, sized from the background
+    mesh after the pre stage.
+    """
+    ok, msg = _run_allrun(case_dir, "pre", logger, cpu_set=cpu_set)
+    if not ok:
+        return False, msg
+
+    max_ranks = len(cpu_set) if cpu_set else None
+    decompose_for_phase(case_dir, "pipeline", max_ranks, logger)
+    return _run_allrun(case_dir, "pipeline", logger, cpu_set=cpu_set)
+
+
+def run_solve_stage(case_dir: str, logger=None, cpu_set: Optional[Sequence[int]] = None) -> Tuple[bool, str]:
+    """Run the Allrun solve stage with a decomposition sized for the final mesh."""
+    max_ranks = len(cpu_set) if cpu_set else None
+    decompose_for_phase(case_dir, "solve", max_ranks, logger)
+    return _run_allrun(case_dir, "solve", logger, cpu_set=cpu_set)
 
-    Args:
-        case_dir: Path to the OpenFOAM case (contains Allclean/Allrun).
-        flow_rate_lpm: Volume flow rate in LPM to write into 0/pvfr.txt.
-        logger: Optional logger with log_info/log_error methods.
+
+def prepare_case(case_dir: str, flow_rate_lpm: float, logger=None) -> Tuple[bool, str]:
+    """
+    Steps 1-3 of the legacy workflow: pvfr.txt, Allclean and combined.stl.
 
     Returns:
         (success, message) tuple.
@@ -47,51 +148,112 @@ def run_cfd(case_dir: str, flow_rate_lpm: float, logger=None) -> Tuple[bool, str
         _log(logger, "error", msg)
         return False, msg
 
+    # 1) write pvfr file (after clean in legacy flow, but harmless before)
+    step0 = case_path / "0"
+    step0.mkdir(exist_ok=True)
+    pvfr_path = step0 / "pvfr.txt"
+    pvfr_path.write_text(f"vfr {flow_rate_lpm:.1f};\n#inputMode merge")
+    _log(logger, "info", f"Wrote {pvfr_path}")
+
+    # 2) Allclean
+    _log(logger, "info", f"Running Allclean in {case_dir}")
+    subprocess.run(["bash", "./Allclean"], cwd=case_dir, check=True)
+    restore_initial_fields(case_dir)
+
+    # 3) rebuild combined.stl from triSurface (kept when the parts are unchanged)
+    tri_dir = case_path / "constant" / "triSurface"
     try:
-        # 1) write pvfr file (after clean in legacy flow, but harmless before)
-        step0 = case_path / "0"
-        step0.mkdir(exist_ok=True)
-        pvfr_path = step0 / "pvfr.txt"
-        pvfr_path.write_text(f"vfr {flow_rate_lpm:.1f};\n#inputMode merge")
-        _log(logger, "info", f"Wrote {pvfr_path}")
-
-        # 2) Allclean
-        _log(logger, "info", f"Running Allclean in {case_dir}")
-        subprocess.run(["bash", "./Allclean"], cwd=case_dir, check=True)
-
-        # 3) rebuild combined.stl from triSurface
-        tri_dir = case_path / "constant" / "triSurface"
-        combined = tri_dir / "combined.stl"
-        if combined.exists():
-            combined.unlink()
-        stl_list = sorted(p for p in tri_dir.glob("*.stl") if p.name != "combined.stl")
-        if not stl_list:
-            msg = f"No STL files found in {tri_dir}"
-            _log(logger, "error", msg)
-            return False, msg
-        # concatenate
-        cat_cmd = "cat *.stl > combined.stl"
-        subprocess.run(cat_cmd, shell=True, cwd=tri_dir, check=True)
-        _log(logger, "info", f"Rebuilt {combined}")
+        combined = assemble_surfaces(tri_dir)
+    except (OSError, ValueError) as e:
+        msg = f"Could not build combined.stl: {e}"
+        _log(logger, "error", msg)
+        return False, msg
+    _log(logger, "info", f"{'Kept' if combined['skipped'] else 'Rebuilt'} {combined['path']} ({combined['triangles']})")
+
+    return True, "Case prepared"
+
+
+def build_mesh(case_dir: str, logger=None, cpu_set: Optional[Sequence[int]] = None) -> Tuple[bool, str]:
+    """
+    Make sure a prepared case has its constant/polyMesh.
+
+    The mesh is linked from the MeshCache when possible; otherwise the Allrun
+    mesh stage runs and its result is stored for the other flow rates.
+
+    Returns:
+        (success, message) tuple.
+    """
+    case_path = Path(case_dir)
+    cache = MeshCache.for_case(case_path, logger=logger)
+    mesh_key = compute_mesh_key(case_path)
+    if mesh_key is None:
+        msg = "Mesh inputs incomplete, cannot use the mesh cache"
+        _log(logger, "warning", msg)
+        return False, msg
+
+    if cache.restore(mesh_key, case_path):
+        return True, "Reused cached mesh"
+
+    ok, msg = run_mesh_stages(case_dir, logger, cpu_set=cpu_set)
+    if ok:
+        cache.store(mesh_key, case_path)
+    return ok, msg
+
+
+def run_cfd(
+    case_dir: str,
+    flow_rate_lpm: float,
+    logger=None,
+    use_mesh_cache: Optional[bool] = None,
+    cpu_set: Optional[Sequence[int]] = None,
+    prepared: bool = False,
+) -> Tuple[bool, str]:
+    """
+    Run the legacy CFD workflow in a prepared case directory.
+
+    Args:
+        case_dir: Path to the OpenFOAM case (contains Allclean/Allrun).
+        flow_rate_lpm: Volume flow rate in LPM to write into 0/pvfr.txt.
+        logger: Optional logger with log_info/log_error methods.
+        use_mesh_cache: Reuse/store the mesh through MeshCache. Defaults to
+            ANALYSIS_SETTINGS["CFD"]["MESH_CACHE"]["ENABLED"].
+        cpu_set: Optional list of core ids the run is pinned to (taskset),
+            used when several cases run side by side.
+        prepared: True if prepare_case already ran for this flow rate (and
+            possibly build_mesh after it); Allclean is not run again.
+
+    Returns:
+        (success, message) tuple.
+    """
+    try:
+        if not prepared:
+            ok, msg = prepare_case(case_dir, flow_rate_lpm, logger)
+            if not ok:
+                return False, msg
 
         # 4) Allrun
-        _log(logger, "info", f"Running Allrun in {case_dir}")
-        allrun_proc = subprocess.run(
-            ["bash", "./Allrun"],
-            cwd=case_dir,
-            check=False,
-            capture_output=True,
-            text=True,
-        )
-        if allrun_proc.returncode != 0:
-            msg = f"Allrun failed (code {allrun_proc.returncode})"
-            _log(logger, "error", msg)
-            _log(logger, "error", allrun_proc.stdout or "")
-            _log(logger, "error", allrun_proc.stderr or "")
+        if use_mesh_cache is None:
+            use_mesh_cache = ANALYSIS_SETTINGS["CFD"]["MESH_CACHE"]["ENABLED"]
+        mesh_key = compute_mesh_key(case_dir) if use_mesh_cache else None
+        cache = MeshCache.for_case(case_dir, logger=logger)
+
+        if mesh_key and cache.restore(mesh_key, case_dir):
+            warm_start(case_dir, flow_rate_lpm, mesh_key, logger)
+            return run_solve_stage(case_dir, logger, cpu_set=cpu_set)
+
+        if ANALYSIS_SETTINGS["CFD"]["PIPELINE_MODE"]:
+            ok, msg = run_pipeline(case_dir, logger, cpu_set=cpu_set)
+            if ok and mesh_key:
+                cache.store(mesh_key, case_dir)
+            return ok, msg
+
+        ok, msg = run_mesh_stages(case_dir, logger, cpu_set=cpu_set)
+        if not ok:
             return False, msg
+        if mesh_key:
+            cache.store(mesh_key, case_dir)
 
-        _log(logger, "info", "Allrun completed")
-        return True, "Allrun completed"
+        return run_solve_stage(case_dir, logger, cpu_set=cpu_set)
 
     except subprocess.CalledProcessError as e:
         msg = f"{e.cmd} failed with code {e.returncode}"
@@ -101,4 +263,3 @@ def run_cfd(case_dir: str, flow_rate_lpm: float, logger=None) -> Tuple[bool, str
         msg = f"{type(e).__name__}: {e}"
         _log(logger, "error", msg)
         return False, msg
-
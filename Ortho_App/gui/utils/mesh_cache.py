@@ -0,0 +1,197 @@
+# gui/utils/mesh_cache.py
+"""
+Mesh cache for the OpenFOAM cases.
+
+Every flow rate of a patient (CFD_10_0, CFD_15_0, ...) is meshed from the
+same Blender output, so the snappyHexMesh result only depends on:
+
+- constant/triSurface/{inlet,outlet,wall}.stl
+- system/bb_min_max.txt and system/face_centers.txt (block extents and
+  locationInMesh written by Blender)
+- the meshing dictionaries (blockMeshDict, surfaceFeatureExtractDict and
+  every snappyHexMeshDict*)
+
+The hash of those files is used as the cache key. A finished
+constant/polyMesh is stored under <patient folder>/mesh_cache/<key>/ and is
+hard-linked (or copied when linking is not possible) into new cases, so
+they only need the solver stage of Allrun.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional
+
+from gui.config.settings import ANALYSIS_SETTINGS
+
+MESH_CACHE_SETTINGS = ANALYSIS_SETTINGS["CFD"]["MESH_CACHE"]
+
+# Files that fully determine the generated mesh, relative to the case directory
+MESH_INPUT_FILES = (
+    "constant/triSurface/inlet.stl",
+    "constant/triSurface/outlet.stl",
+    "constant/triSurface/wall.stl",
+    "system/bb_min_max.txt",
+    "system/face_centers.txt",
+    "system/blockMeshDict",
+    "system/surfaceFeatureExtractDict",
+)
+
+# Template files that Allrun renames during a run (snappyHexMeshDict ->
+# snappyHexMeshDict2, snappyHexMeshDict1 -> snappyHexMeshDict)
+TEMPLATE_MANAGED_FILES = ("system/snappyHexMeshDict*",)
+
+
+def _file_digest(path: Path) -> str:
+    """SHA-256 of a file, read in chunks so large STLs don't sit in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def clear_template_managed_files(case_dir):
+    """
+    Remove the files of TEMPLATE_MANAGED_FILES from a case.
+
+    Called before a template is copied into an existing case, so the case
+    holds exactly the template's snappyHexMeshDicts again (leftovers of an
+    earlier run would change the mesh key).
+    """
+    case_path = Path(case_dir)
+    for pattern in TEMPLATE_MANAGED_FILES:
+        for path in case_path.glob(pattern):
+            if path.is_file():
+                path.unlink()
+
+
+def compute_mesh_key(case_dir) -> Optional[str]:
+    """
+    Hash the meshing inputs of a case.
+
+    The snappyHexMeshDict files are hashed by content only (sorted digests),
+    because the turbulent Allrun swaps snappyHexMeshDict/snappyHexMeshDict1
+    between its two passes.
+
+    Returns:
+        Hex digest, or None if one of the required inputs is missing.
+    """
+    case_path = Path(case_dir)
+    digest = hashlib.sha256()
+
+    for rel_path in MESH_INPUT_FILES:
+        path = case_path / rel_path
+        if not path.is_file():
+            return None
+        digest.update(rel_path.encode())
+        digest.update(_file_digest(path).encode())
+
+    snappy_dicts = sorted((case_path / "system").glob("snappyHexMeshDict*"))
+    snappy_dicts = [p for p in snappy_dicts if not p.name.endswith("~")]
+    if not snappy_dicts:
+        return None
+    for snappy_digest in sorted(_file_digest(p) for p in snappy_dicts):
+        digest.update(snappy_digest.encode())
+
+    return digest.hexdigest()
+
+
+def _link_or_copy_tree(src: Path, dst: Path):
+    """Recreate src under dst using hard links, falling back to copies."""
+    for root, _dirs, files in os.walk(src):
+        target_root = dst / Path(root).relative_to(src)
+        target_root.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            src_file = Path(root) / name
+            dst_file = target_root / name
+            if dst_file.exists():
+                dst_file.unlink()
+            try:
+                os.link(src_file, dst_file)
+            except OSError:
+                shutil.copy2(src_file, dst_file)
+
+
+class MeshCache:
+    """Stores and restores constant/polyMesh directories by mesh key."""
+
+    def __init__(self, cache_root, logger=None):
+        self.cache_root = Path(cache_root)
+        self.logger = logger
+
+    @classmethod
+    def for_case(cls, case_dir, logger=None):
+        """Cache shared by all flow-rate cases of the same patient folder."""
+        return cls(Path(case_dir).parent / MESH_CACHE_SETTINGS["DIR_NAME"], logger=logger)
+
+    def _log_info(self, message):
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_root / key
+
+    def has(self, key: Optional[str]) -> bool:
+        """True if a complete polyMesh is stored for this key."""
+        if not key:
+            return False
+        return (self._entry_dir(key) / "polyMesh" / "owner").exists()
+
+    def restore(self, key: Optional[str], case_dir) -> bool:
+        """
+        Link the cached polyMesh into <case_dir>/constant/polyMesh.
+
+        Returns:
+            True on a cache hit, False otherwise.
+        """
+        if not self.has(key):
+            return False
+
+        target = Path(case_dir) / "constant" / "polyMesh"
+        if target.exists():
+            shutil.rmtree(target)
+        _link_or_copy_tree(self._entry_dir(key) / "polyMesh", target)
+        self._log_info(f"Mesh cache hit {key[:12]} -> {target}")
+        return True
+
+    def store(self, key: Optional[str], case_dir) -> bool:
+        """
+        Store <case_dir>/constant/polyMesh under the given key.
+
+        The entry is assembled in a temporary folder and renamed into place,
+        so a half-written mesh is never picked up by another run.
+        """
+        if not key:
+            return False
+
+        source = Path(case_dir) / "constant" / "polyMesh"
+        if not (source / "owner").exists():
+            return False
+        if self.has(key):
+            return True
+
+        self.cache_root.mkdir(parents=True, exist_ok=True)
+        staging = self.cache_root / f".{key}.{os.getpid()}.tmp"
+        if staging.exists():
+            shutil.rmtree(staging)
+
+        _link_or_copy_tree(source, staging / "polyMesh")
+        (staging / "meta.json").write_text(json.dumps({
+            "source_case": str(Path(case_dir).resolve()),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, indent=2))
+
+        try:
+            staging.rename(self._entry_dir(key))
+        except OSError:
+            # Another run stored the same mesh first
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self._log_info(f"Stored mesh {key[:12]} in {self.cache_root}")
+        return True
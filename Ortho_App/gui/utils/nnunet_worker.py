@@ -0,0 +1,350 @@
+# gui/utils/nnunet_worker.py
+"""
+Long-lived nnUNet predictor process.
+
+nnUNetv2_predict starts a new Python interpreter for every case, imports torch
+and loads all fold weights of the model before predicting, which costs more
+than the prediction itself on small scans and on CPU nodes. The worker does
+that once:
+
+    python -m gui.utils.nnunet_worker <socket path>
+
+loads an nnUNetPredictor with the configuration passed in the environment and
+then serves prediction jobs over a local (AF_UNIX) multiprocessing connection.
+While a job runs, everything nnUNet prints (including the tqdm percentage
+bars) is forwarded to the client line by line, so the GUI sees the same
+progress lines it parsed from the nnUNetv2_predict output.
+
+The client side is NnUNetWorker; the application keeps one instance
+(get_worker()) and stops it when it closes (shutdown_worker()).
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Callable, Optional
+
+from gui.config.settings import ANALYSIS_SETTINGS, PATH_SETTINGS
+
+WORKER_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["NNUNET"]["WORKER"]
+
+_CONFIG_ENV = "ORTHOCFD_NNUNET_CONFIG"
+_AUTHKEY_ENV = "ORTHOCFD_NNUNET_AUTHKEY"
+
+
+class WorkerUnavailable(RuntimeError):
+    """The worker could not be started or stopped answering."""
+
+
+# --------------------------------------------------------------------------
+# Server side (runs in the worker process)
+# --------------------------------------------------------------------------
+
+class _ConnectionWriter:
+    """File-like object that sends every printed line to the client."""
+
+    encoding = "utf-8"
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        # tqdm redraws its bar with '\r', plain prints end with '\n'
+        *lines, self.buffer = self.buffer.replace("\r", "\n").split("\n")
+        for line in lines:
+            if line.strip():
+                self.conn.send(("line", line))
+        return len(text)
+
+    def flush(self):
+        if self.buffer.strip():
+            self.conn.send(("line", self.buffer))
+        self.buffer = ""
+
+    def isatty(self):
+        return False
+
+
+def _parse_folds(folds):
+    """'all' -> ('all',), '0 1 2' -> (0, 1, 2)"""
+    return tuple(int(f) if f.isdigit() else f for f in str(folds).split())
+
+
+def _load_predictor(config):
+    """Create an nnUNetPredictor and load the model weights once."""
+    import torch
+    from nnunetv2.inference.predict_from_raw_data import nnUNetPredictor
+    from nnunetv2.utilities.file_path_utilities import get_output_folder
+
+    if config.get("threads"):
+        torch.set_num_threads(int(config["threads"]))
+    device = torch.device(config["device"])
+    predictor = nnUNetPredictor(
+        tile_step_size=float(config["step_size"]),
+        use_gaussian=True,
+        use_mirroring=not config["disable_tta"],
+        perform_everything_on_device=device.type == "cuda",
+        device=device,
+        verbose=False,
+        verbose_preprocessing=False,
+        allow_tqdm=True,
+    )
+    model_folder = get_output_folder(
+        config["dataset"], config["trainer"], config["plans"], config["configuration"]
+    )
+    predictor.initialize_from_trained_model_folder(
+        model_folder,
+        use_folds=_parse_folds(config["folds"]),
+        checkpoint_name=config["checkpoint"],
+    )
+    return predictor
+
+
+def _exit_with_parent(parent_pid):
+    """Stop the worker if the application dies without shutting it down."""
+    while True:
+        if os.getppid() != parent_pid:
+            os._exit(0)
+        time.sleep(2)
+
+
+def serve(address):
+    """Load the model, then answer prediction jobs until told to shut down."""
+    config = json.loads(os.environ[_CONFIG_ENV])
+    authkey = bytes.fromhex(os.environ[_AUTHKEY_ENV])
+    threading.Thread(target=_exit_with_parent, args=(os.getppid(),), daemon=True).start()
+
+    started = time.time()
+    predictor = _load_predictor(config)
+    print(f"nnUNet worker: model loaded in {time.time() - started:.1f} s", flush=True)
+
+    if os.path.exists(address):
+        os.unlink(address)
+    # The socket only appears once the model is loaded; the client waits for it
+    with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+        while True:
+            with listener.accept() as conn:
+                job = conn.recv()
+                if job.get("command") == "shutdown":
+                    conn.send(("done", None))
+                    break
+
+                writer = _ConnectionWriter(conn)
+                started = time.time()
+                # Per-job inference options (e.g. the quick preview pass); the weights stay loaded
+                defaults = (predictor.tile_step_size, predictor.use_mirroring)
+                overrides = job.get("overrides") or {}
+                if "step_size" in overrides:
+                    predictor.tile_step_size = float(overrides["step_size"])
+                if "disable_tta" in overrides:
+                    predictor.use_mirroring = not overrides["disable_tta"]
+                try:
+                    with redirect_stdout(writer), redirect_stderr(writer):
+                        predictor.predict_from_files(
+                            job["input_folder"],
+                            job["output_folder"],
+                            save_probabilities=False,
+                            overwrite=True,
+                            num_processes_preprocessing=int(job["npp"]),
+                            num_processes_segmentation_export=int(job["nps"]),
+                        )
+                    writer.flush()
+                    conn.send(("done", time.time() - started))
+                except Exception as e:
+                    writer.flush()
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+                finally:
+                    predictor.tile_step_size, predictor.use_mirroring = defaults
+
+    if os.path.exists(address):
+        os.unlink(address)
+
+
+# --------------------------------------------------------------------------
+# Client side (runs in the application)
+# --------------------------------------------------------------------------
+
+class NnUNetWorker:
+    """Starts the worker process and sends prediction jobs to it."""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.process = None
+        self.config = None
+        self.address = str(Path(tempfile.gettempdir()) / f"orthocfd_nnunet_{os.getpid()}.sock")
+        self.authkey = os.urandom(16)
+        self._lock = threading.Lock()
+
+    def _log_info(self, message):
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _log_error(self, message):
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            print(f"ERROR: {message}")
+
+    @property
+    def log_path(self) -> Path:
+        return Path(PATH_SETTINGS["LOGS_DIR"]) / "nnunet_worker.log"
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _start(self, config):
+        """Launch the worker and wait until its model is loaded."""
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+        env = os.environ.copy()
+        env[_CONFIG_ENV] = json.dumps(config)
+        env[_AUTHKEY_ENV] = self.authkey.hex()
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "ab") as log_file:
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "gui.utils.nnunet_worker", self.address],
+                cwd=str(PATH_SETTINGS["BASE_DIR"]),
+                env=env,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+            )
+        self.config = dict(config)
+        self._log_info(f"Starting nnUNet worker (pid {self.process.pid})")
+
+        deadline = time.time() + WORKER_SETTINGS["START_TIMEOUT"]
+        while not os.path.exists(self.address):
+            if self.process.poll() is not None:
+                self.process = None
+                raise WorkerUnavailable(f"nnUNet worker exited during startup, see {self.log_path}")
+            if time.time() > deadline:
+                self.kill()
+                raise WorkerUnavailable("nnUNet worker did not load the model in time")
+            time.sleep(0.5)
+        self._log_info("nnUNet worker ready")
+
+    def ensure_running(self, config):
+        """Start the worker, or restart it if it holds a different model configuration."""
+        if self.is_running() and self.config == config:
+            return
+        if self.is_running():
+            self._log_info("nnUNet configuration changed, restarting worker")
+            self.shutdown()
+        self._start(config)
+
+    def predict(self, input_folder, output_folder, config, npp, nps,
+                line_callback: Optional[Callable[[str], None]] = None,
+                cancel_event: Optional[threading.Event] = None,
+                overrides: Optional[dict] = None) -> float:
+        """
+        Predict every case in input_folder into output_folder.
+
+        Args:
+            input_folder: Folder with the *_0000.nii.gz inputs
+            output_folder: Folder for the predictions
+            config: Model configuration (restarts the worker if it changed)
+            npp: Preprocessing workers
+            nps: Segmentation export workers
+            line_callback: Called with every output line of the prediction
+            cancel_event: Set to abort; the worker is killed and restarted on next use
+            overrides: step_size / disable_tta for this job only (no restart)
+
+        Returns:
+            float: Prediction time in seconds, as measured by the worker
+        """
+        with self._lock:
+            self.ensure_running(config)
+            try:
+                conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except OSError as e:
+                self.kill()
+                raise WorkerUnavailable(f"Cannot connect to nnUNet worker: {e}")
+
+            with conn:
+                conn.send({
+                    "input_folder": str(input_folder),
+                    "output_folder": str(output_folder),
+                    "npp": npp,
+                    "nps": nps,
+                    "overrides": overrides or {},
+                })
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        self.kill()
+                        raise RuntimeError("nnUNet prediction cancelled")
+                    if not conn.poll(0.5):
+                        if not self.is_running():
+                            raise WorkerUnavailable("nnUNet worker stopped during prediction")
+                        continue
+                    try:
+                        kind, payload = conn.recv()
+                    except EOFError:
+                        raise WorkerUnavailable("nnUNet worker closed the connection")
+                    if kind == "line":
+                        if line_callback:
+                            line_callback(payload)
+                    elif kind == "done":
+                        return payload
+                    elif kind == "error":
+                        raise RuntimeError(f"nnUNet worker: {payload}")
+
+    def shutdown(self, timeout=10):
+        """Ask the worker to exit, killing it if it does not."""
+        if not self.is_running():
+            self.process = None
+            return
+        try:
+            with Client(self.address, family="AF_UNIX", authkey=self.authkey) as conn:
+                conn.send({"command": "shutdown"})
+                conn.recv()
+            self.process.wait(timeout=timeout)
+        except (OSError, EOFError, subprocess.TimeoutExpired):
+            self.kill()
+            return
+        self.process = None
+        self._log_info("nnUNet worker stopped")
+
+    def kill(self):
+        """Stop the worker immediately (e.g. on cancel)."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+            self._log_info("nnUNet worker killed")
+        self.process = None
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker(logger=None) -> NnUNetWorker:
+    """The application's shared worker client (the process starts on first use)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = NnUNetWorker(logger=logger)
+        return _worker
+
+
+def shutdown_worker():
+    """Stop the shared worker, if one was started."""
+    with _worker_lock:
+        if _worker is not None:
+            _worker.shutdown()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1])
@@ -0,0 +1,270 @@
+# gui/utils/pipeline_scheduler.py
+"""
+Stage-level job scheduler for running several patients at once.
+
+Every stage of the workflow is limited by something different: nnUNet by
+the GPU (or the CPU cores on GPU-less nodes), Blender by its single thread,
+snappyHexMesh/simpleFoam by the MPI cores. Running patients strictly one
+after the other leaves most of the machine idle, so the scheduler keeps one
+queue and a small worker pool per stage:
+
+    scheduler = PipelineScheduler({"gpu": 1, "blender": 1, "cores": available_cores()})
+    scheduler.add_stage("segmentation", segment, workers=1, needs={"gpu": 1})
+    scheduler.add_stage("geometry", blender, workers=2, needs={"blender": 1})
+    scheduler.add_stage("cfd", cfd, workers=2, needs={"cores": 8})
+    scheduler.run(jobs)
+
+A job moves to the next stage as soon as its current stage finishes, so
+while patient A is in simpleFoam, patient B can segment and patient C can
+run Blender. Before a stage function runs, its worker takes the resource
+tokens the stage needs from a shared ResourcePool. Resources are either
+counted ("gpu": 1) or a list of ids ("cores": [0, 1, ...]). The stage
+function receives the ids it holds, e.g. the cores to pin an MPI run to.
+
+A stage function is called as fn(job, allocation). It returns None to pass
+the job on, or a list of jobs to fan out (e.g. one CFD job per flow rate).
+An exception drops the job and is reported to on_error.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+Resources = Dict[str, Union[int, Sequence[Any]]]
+
+_STOP = object()
+
+
+class PipelineCancelled(RuntimeError):
+    """The scheduler was cancelled before the job's stage could start."""
+
+
+class ResourcePool:
+    """Counted and id-based resource tokens shared by all stages."""
+
+    def __init__(self, capacities: Resources):
+        self._free = {}
+        self._capacity = {}
+        for name, capacity in capacities.items():
+            if isinstance(capacity, int):
+                self._free[name] = capacity
+                self._capacity[name] = capacity
+            else:
+                self._free[name] = list(capacity)
+                self._capacity[name] = len(capacity)
+        self._cond = threading.Condition()
+
+    def capacity(self, name: str) -> int:
+        return self._capacity.get(name, 0)
+
+    def _normalize(self, request: Optional[Dict[str, int]]) -> Dict[str, int]:
+        """Drop empty entries and clamp requests to the pool size (never wait forever)."""
+        normalized = {}
+        for name, amount in (request or {}).items():
+            if name not in self._capacity:
+                raise KeyError(f"Unknown resource: {name}")
+            amount = min(int(amount), self._capacity[name])
+            if amount > 0:
+                normalized[name] = amount
+        return normalized
+
+    def _available(self, request: Dict[str, int]) -> bool:
+        for name, amount in request.items():
+            free = self._free[name]
+            if (len(free) if isinstance(free, list) else free) < amount:
+                return False
+        return True
+
+    @contextmanager
+    def acquire(self, request: Optional[Dict[str, int]], cancel_event: Optional[threading.Event] = None):
+        """
+        Hold all requested tokens for the duration of the with block.
+
+        Tokens are taken all at once, so two stages can never each hold part
+        of what the other needs.
+
+        Yields:
+            dict: resource -> list of ids (id resources) or amount (counted ones)
+        """
+        request = self._normalize(request)
+        allocation = {}
+        with self._cond:
+            while not self._available(request):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise PipelineCancelled("Cancelled while waiting for resources")
+                self._cond.wait(timeout=0.5)
+            for name, amount in request.items():
+                free = self._free[name]
+                if isinstance(free, list):
+                    allocation[name], self._free[name] = free[:amount], free[amount:]
+                else:
+                    allocation[name] = amount
+                    self._free[name] = free - amount
+        try:
+            yield allocation
+        finally:
+            with self._cond:
+                for name, held in allocation.items():
+                    if isinstance(held, list):
+                        self._free[name] = sorted(self._free[name] + held)
+                    else:
+                        self._free[name] += held
+                self._cond.notify_all()
+
+
+class _Stage:
+    def __init__(self, name, fn, workers, needs):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.needs = needs
+        self.queue = Queue()
+        self.busy_seconds = 0.0
+        self.completed = 0
+
+    def request_for(self, job) -> Dict[str, int]:
+        return self.needs(job) if callable(self.needs) else (self.needs or {})
+
+
+class PipelineScheduler:
+    """Per-stage worker pools that pass jobs down an ordered list of stages."""
+
+    def __init__(self, resources: Resources, logger=None,
+                 on_error: Optional[Callable[[Any, str, Exception], None]] = None,
+                 on_done: Optional[Callable[[Any], None]] = None):
+        """
+        Args:
+            resources: Resource capacities, e.g. {"gpu": 1, "blender": 1, "cores": [0, 1, 2, 3]}
+            logger: Optional logger instance
+            on_error: Called as on_error(job, stage_name, exception) when a stage fails
+            on_done: Called with each job that finished the last stage
+        """
+        self.pool = ResourcePool(resources)
+        self.logger = logger
+        self.on_error = on_error
+        self.on_done = on_done
+        self.cancel_event = threading.Event()
+        self._stages: List[_Stage] = []
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+
+    def _log_info(self, message):
+        """Helper method to log info messages"""
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _log_error(self, message):
+        """Helper method to log error messages"""
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            print(f"ERROR: {message}")
+
+    def add_stage(self, name: str, fn: Callable[[Any, dict], Optional[Iterable[Any]]],
+                  workers: int = 1, needs=None):
+        """
+        Append a stage.
+
+        Args:
+            name: Stage name (for logs and statistics)
+            fn: fn(job, allocation); return None to pass the job on or a list of jobs
+            workers: How many jobs may be in this stage at once
+            needs: Resource request dict, or a function job -> request dict
+        """
+        self._stages.append(_Stage(name, fn, workers, needs))
+
+    def cancel(self):
+        """Finish running stage functions but start no new ones."""
+        self.cancel_event.set()
+
+    def _enqueue(self, job, stage_index: int):
+        with self._pending_cond:
+            self._pending += 1
+        self._stages[stage_index].queue.put(job)
+
+    def _job_left_stage(self):
+        with self._pending_cond:
+            self._pending -= 1
+            self._pending_cond.notify_all()
+
+    def _report_error(self, job, stage_name, error):
+        if self.on_error:
+            self.on_error(job, stage_name, error)
+        else:
+            self._log_error(f"{stage_name} failed for {job}: {error}")
+
+    def _worker(self, stage_index: int):
+        stage = self._stages[stage_index]
+        while True:
+            job = stage.queue.get()
+            if job is _STOP:
+                return
+            try:
+                if self.cancel_event.is_set():
+                    raise PipelineCancelled(f"Cancelled before {stage.name}")
+                with self.pool.acquire(stage.request_for(job), self.cancel_event) as allocation:
+                    started = time.time()
+                    try:
+                        result = stage.fn(job, allocation)
+                    finally:
+                        stage.busy_seconds += time.time() - started
+                stage.completed += 1
+
+                next_jobs = [job] if result is None else list(result)
+                for next_job in next_jobs:
+                    if stage_index + 1 < len(self._stages):
+                        self._enqueue(next_job, stage_index + 1)
+                    elif self.on_done:
+                        self.on_done(next_job)
+            except Exception as e:
+                self._report_error(job, stage.name, e)
+            finally:
+                self._job_left_stage()
+
+    def run(self, jobs: Iterable[Any]) -> Dict[str, Dict[str, float]]:
+        """
+        Run all jobs through all stages and wait until every job has left the pipeline.
+
+        Returns:
+            dict: stage name -> {"completed", "busy_seconds"}
+        """
+        if not self._stages:
+            raise ValueError("No stages added")
+
+        threads = []
+        for index, stage in enumerate(self._stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index,),
+                                          name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        for job in jobs:
+            self._enqueue(job, 0)
+
+        try:
+            with self._pending_cond:
+                while self._pending > 0:
+                    self._pending_cond.wait(timeout=1.0)
+        except KeyboardInterrupt:
+            self._log_error("Interrupted, waiting for running stages to finish")
+            self.cancel()
+            raise
+        finally:
+            for stage in self._stages:
+                for _ in range(stage.workers):
+                    stage.queue.put(_STOP)
+
+        for thread in threads:
+            thread.join()
+
+        stats = {
+            stage.name: {"completed": stage.completed, "busy_seconds": round(stage.busy_seconds, 1)}
+            for stage in self._stages
+        }
+        self._log_info(f"Pipeline finished: {stats}")
+        return stats
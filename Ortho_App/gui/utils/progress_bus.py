@@ -0,0 +1,117 @@
+# gui/utils/progress_bus.py
+"""
+Rate-limited progress updates from worker threads to the Tk main loop.
+
+Workers used to schedule one app.after(0, ...) per output line. snappyHexMesh
+and simpleFoam print thousands of lines per second, so the Tk event queue
+filled up with redraws and the GUI fell behind the solver.
+
+ProgressBus.post() only stores the update under a lock:
+
+- the latest percentage and status message (older ones are superseded)
+- output lines in a ring buffer of MAX_BUFFERED_LINES (the oldest lines are
+  dropped and counted if the GUI cannot keep up; they are still in the log)
+
+A single timer on the Tk thread drains the buffer FPS times per second and
+hands everything to the apply callback in one call, so the widgets are
+redrawn at most FPS times per second whatever the output rate.
+"""
+
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+from gui.config.settings import UI_SETTINGS
+from .basic_utils import AppLogger
+
+PROGRESS_SETTINGS = UI_SETTINGS["PROGRESS"]
+
+
+class ProgressBus:
+    """Thread-safe buffer for progress updates, flushed to Tk at a fixed rate."""
+
+    def __init__(self, widget, apply: Callable[[Optional[float], Optional[str], List[str], int], None],
+                 fps: Optional[float] = None, max_lines: Optional[int] = None, logger=None):
+        """
+        Args:
+            widget: Tk widget whose after() drives the flush timer
+            apply: apply(percentage, message, lines, dropped_lines), called on the Tk thread
+            fps: Flushes per second (UI_SETTINGS["PROGRESS"]["FPS"])
+            max_lines: Ring buffer size (UI_SETTINGS["PROGRESS"]["MAX_BUFFERED_LINES"])
+            logger: Logger for errors raised by apply (AppLogger by default)
+        """
+        self.widget = widget
+        self.apply = apply
+        self.logger = logger or AppLogger()
+        self.interval_ms = max(1, int(1000 / (fps or PROGRESS_SETTINGS["FPS"])))
+        self._lock = threading.Lock()
+        self._lines = deque(maxlen=max_lines or PROGRESS_SETTINGS["MAX_BUFFERED_LINES"])
+        self._dropped = 0
+        self._percentage = None
+        self._message = None
+        self._timer = None
+
+    def post(self, message=None, percentage=None, output_line=None):
+        """Queue an update; safe to call from any thread at any rate."""
+        with self._lock:
+            if message is not None:
+                self._message = message
+            if percentage is not None:
+                self._percentage = percentage
+            if output_line:
+                if len(self._lines) == self._lines.maxlen:
+                    self._dropped += 1
+                self._lines.append(output_line)
+
+    def _take(self):
+        with self._lock:
+            update = (self._percentage, self._message, list(self._lines), self._dropped)
+            self._percentage = None
+            self._message = None
+            self._lines.clear()
+            self._dropped = 0
+        return update
+
+    def flush(self, include_status=True):
+        """
+        Apply everything buffered now (Tk thread only).
+
+        With include_status=False the buffered lines are shown but a pending
+        percentage/message is discarded, e.g. when the progress was just reset.
+        """
+        percentage, message, lines, dropped = self._take()
+        if not include_status:
+            percentage = message = None
+        if percentage is not None or message is not None or lines:
+            self.apply(percentage, message, lines, dropped)
+
+    def clear(self):
+        """Drop everything buffered; safe to call from any thread."""
+        self._take()
+
+    def _tick(self):
+        self._timer = None
+        try:
+            if not self.widget.winfo_exists():
+                return
+        except Exception:
+            return  # widget already destroyed
+        try:
+            self.flush()
+        except Exception as e:
+            # A failing update must not stop the progress display for good
+            self.logger.log_error(f"Progress update failed: {e}")
+        finally:
+            self._timer = self.widget.after(self.interval_ms, self._tick)
+
+    def start(self):
+        """Drop anything buffered and start the flush timer (Tk thread only)."""
+        self.clear()
+        if self._timer is None:
+            self._timer = self.widget.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        """Stop the flush timer (Tk thread only)."""
+        if self._timer is not None:
+            self.widget.after_cancel(self._timer)
+            self._timer = None
@@ -0,0 +1,342 @@
+# gui/utils/residual_monitor.py
+"""
+Incremental residual tracking for a running simpleFoam case.
+
+The GUI used to run the gnuplot_residuals script every 2 seconds, which
+re-parsed the whole (ever growing) log with a fixed scanf format and wrote a
+new PNG each time. ResidualMonitor reads only what was appended since the
+last poll:
+
+- postProcessing/residuals/<time>/solverInfo.dat (the "residuals" function
+  object in controlDict), columns found from its "# Time" header
+- log.simpleFoam ("Solving for X, Initial residual = ..." lines) for cases
+  without that function object
+
+The initial residual of each field is kept in growable NumPy buffers
+(ResidualHistory), and the plot is redrawn only when new iterations arrive.
+The plot is downsampled to its pixel width, so one poll costs the same at
+iteration 10 and at iteration 1000.
+"""
+
+import glob
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from gui.config.settings import ANALYSIS_SETTINGS
+
+RESIDUAL_SETTINGS = ANALYSIS_SETTINGS["CFD"]["RESIDUALS"]
+
+# Same order and colours as the old gnuplot plot
+_COLORS = ["#9400D3", "#009E73", "#56B4E9", "#E69F00", "#F0E442", "#0072B2",
+           "#E51E10", "#000000"]
+
+_LOG_TIME = re.compile(r"^Time = ([0-9eE+\-.]+)")
+_LOG_RESIDUAL = re.compile(r"Solving for (\w+), Initial residual = ([0-9eE+\-.]+)")
+
+
+class ResidualHistory:
+    """Initial residual per field and iteration, in growable NumPy buffers."""
+
+    def __init__(self, fields: Sequence[str], capacity: int = 1024):
+        self.fields = list(fields)
+        self.size = 0
+        self._times = np.empty(capacity)
+        self._values = {field: np.full(capacity, np.nan) for field in self.fields}
+
+    def _grow(self):
+        capacity = 2 * len(self._times)
+        self._times = np.resize(self._times, capacity)
+        for field, buffer in self._values.items():
+            grown = np.full(capacity, np.nan)
+            grown[:self.size] = buffer[:self.size]
+            self._values[field] = grown
+
+    def append(self, time: float, residuals: Dict[str, float]):
+        """Add one iteration; fields missing from residuals are stored as NaN."""
+        if self.size == len(self._times):
+            self._grow()
+        self._times[self.size] = time
+        for field in self.fields:
+            self._values[field][self.size] = residuals.get(field, np.nan)
+        self.size += 1
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[:self.size]
+
+    def series(self, field: str) -> np.ndarray:
+        return self._values[field][:self.size]
+
+    def latest(self) -> Dict[str, float]:
+        """Residuals of the last iteration ({} before the first one)."""
+        if not self.size:
+            return {}
+        return {field: float(self._values[field][self.size - 1]) for field in self.fields}
+
+    def __len__(self):
+        return self.size
+
+
+class FileTail:
+    """Reads the complete lines appended to a file since the previous call."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+
+    def read_lines(self) -> List[str]:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        if size < self.offset:
+            # File was recreated (e.g. Allclean between runs): start over
+            self.offset = 0
+            self.partial = b""
+        if size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+        # The solver may be halfway through a line; keep it for the next read
+        *lines, self.partial = (self.partial + data).split(b"\n")
+        return [line.decode("utf-8", "replace") for line in lines]
+
+
+class _SolverInfoParser:
+    """Rows of solverInfo.dat -> (time, {field: initial residual})."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.columns = None
+
+    def parse(self, lines):
+        rows = []
+        for line in lines:
+            if line.startswith("#"):
+                names = line.lstrip("#").split()
+                if names and names[0] == "Time":
+                    self.columns = {
+                        name[:-len("_initial")]: index
+                        for index, name in enumerate(names)
+                        if name.endswith("_initial") and name[:-len("_initial")] in self.fields
+                    }
+                continue
+            parts = line.split()
+            if not parts or self.columns is None:
+                continue
+            try:
+                time = float(parts[0])
+                residuals = {field: float(parts[index])
+                             for field, index in self.columns.items() if index < len(parts)}
+            except ValueError:
+                continue
+            rows.append((time, residuals))
+        return rows
+
+
+class _LogParser:
+    """simpleFoam log lines -> (time, {field: first initial residual of the step})."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.time = None
+        self.residuals = {}
+
+    def parse(self, lines):
+        rows = []
+        for line in lines:
+            match = _LOG_TIME.match(line)
+            if match:
+                self.time = float(match.group(1))
+                self.residuals = {}
+                continue
+            if self.time is None:
+                continue
+            if line.startswith("ExecutionTime"):
+                # Last line of every iteration
+                if self.residuals:
+                    rows.append((self.time, self.residuals))
+                self.time = None
+                continue
+            match = _LOG_RESIDUAL.search(line)
+            if match and match.group(1) in self.fields and match.group(1) not in self.residuals:
+                self.residuals[match.group(1)] = float(match.group(2))
+        return rows
+
+
+def _has_residuals_function(case_dir: str) -> bool:
+    """True if system/controlDict writes solverInfo.dat."""
+    try:
+        with open(os.path.join(case_dir, "system", "controlDict"), "r") as f:
+            text = f.read()
+    except OSError:
+        return False
+    return '#includeFunc "residuals"' in text or "solverInfo" in text
+
+
+def render_residual_plot(history: ResidualHistory, size=None, title="CFD analysis residuals") -> Image.Image:
+    """Log-scale plot of every field in history, downsampled to the plot width."""
+    width, height = size or RESIDUAL_SETTINGS["PLOT_SIZE"]
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    left, right, top, bottom = 70, width - 110, 40, height - 50
+    draw.text((width // 2 - 70, 12), title, fill="black", font=font)
+    draw.rectangle([left, top, right, bottom], outline="black")
+    draw.text(((left + right) // 2 - 80, height - 25), "No of Iterations/Timesteps", fill="black", font=font)
+    draw.text((8, top - 25), "Residual", fill="black", font=font)
+    if not len(history):
+        return image
+
+    # Downsample to at most one point per pixel column
+    step = max(1, len(history) // max(1, right - left))
+    times = history.times[::step]
+    series = {}
+    for field in history.fields:
+        values = history.series(field)[::step]
+        values = np.where(values > 0, values, np.nan)
+        if np.isfinite(values).any():
+            series[field] = np.log10(values)
+    if not series:
+        return image
+
+    all_values = np.concatenate([values[np.isfinite(values)] for values in series.values()])
+    y_min, y_max = np.floor(all_values.min()), np.ceil(all_values.max())
+    if y_max == y_min:
+        y_max += 1
+    t_min, t_max = float(times[0]), float(times[-1])
+    if t_max == t_min:
+        t_max += 1
+
+    def to_x(t):
+        return left + (t - t_min) / (t_max - t_min) * (right - left)
+
+    def to_y(v):
+        return bottom - (v - y_min) / (y_max - y_min) * (bottom - top)
+
+    for decade in range(int(y_min), int(y_max) + 1):
+        y = to_y(decade)
+        draw.line([left, y, left + 5, y], fill="black")
+        draw.text((left - 45, y - 6), f"1e{decade}", fill="black", font=font)
+    for t in np.linspace(t_min, t_max, 6):
+        x = to_x(t)
+        draw.line([x, bottom, x, bottom - 5], fill="black")
+        draw.text((x - 10, bottom + 6), f"{t:g}", fill="black", font=font)
+
+    xs = to_x(times)
+    for index, (field, values) in enumerate(series.items()):
+        color = _COLORS[index % len(_COLORS)]
+        finite = np.isfinite(values)
+        points = list(zip(xs[finite].tolist(), to_y(values[finite]).tolist()))
+        if len(points) > 1:
+            draw.line(points, fill=color, width=2)
+        elif points:
+            x, y = points[0]
+            draw.ellipse([x - 2, y - 2, x + 2, y + 2], fill=color)
+        legend_y = top + 15 * index
+        draw.line([right + 10, legend_y + 6, right + 30, legend_y + 6], fill=color, width=2)
+        draw.text((right + 36, legend_y), field, fill="black", font=font)
+    return image
+
+
+class ResidualMonitor:
+    """Follows the residuals of one running case."""
+
+    def __init__(self, case_dir: str, fields: Optional[Sequence[str]] = None, logger=None,
+                 on_update: Optional[Callable[[Image.Image, ResidualHistory], None]] = None,
+                 plot: bool = True):
+        """
+        Args:
+            case_dir: OpenFOAM case folder
+            fields: Fields to track (RESIDUALS["FIELDS"])
+            logger: Optional logger instance
+            on_update: Called with the new plot and the history after every poll
+                that added iterations (from the monitoring thread)
+            plot: False to only collect the history (no PNG, no on_update)
+        """
+        self.case_dir = case_dir
+        self.fields = list(fields or RESIDUAL_SETTINGS["FIELDS"])
+        self.logger = logger
+        self.on_update = on_update
+        self.plot = plot
+        self.history = ResidualHistory(self.fields)
+        self.plot_path = os.path.join(case_dir, RESIDUAL_SETTINGS["PLOT_FILE"])
+        self._use_solver_info = _has_residuals_function(case_dir)
+        self._tail = None
+        self._parser = None
+
+    def _log_info(self, message):
+        """Helper method to log info messages"""
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _log_error(self, message):
+        """Helper method to log error messages"""
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            print(f"ERROR: {message}")
+
+    def _open_source(self) -> bool:
+        """Find the file to follow; solverInfo.dat only exists after the first iteration."""
+        if self._use_solver_info:
+            pattern = os.path.join(self.case_dir, "postProcessing", "residuals", "*", "solverInfo*.dat")
+            candidates = glob.glob(pattern)
+            if not candidates:
+                return False
+            path = max(candidates, key=os.path.getmtime)
+            self._parser = _SolverInfoParser(self.fields)
+        else:
+            path = os.path.join(self.case_dir, "log.simpleFoam")
+            if not os.path.exists(path):
+                return False
+            self._parser = _LogParser(self.fields)
+        self._tail = FileTail(path)
+        self._log_info(f"Following residuals in {path}")
+        return True
+
+    def poll(self) -> int:
+        """Read what the solver appended since the last call; returns the number of new iterations."""
+        if self._tail is None and not self._open_source():
+            return 0
+        rows = self._parser.parse(self._tail.read_lines())
+        for time, residuals in rows:
+            self.history.append(time, residuals)
+        if rows and self.plot:
+            self._redraw()
+        return len(rows)
+
+    def _redraw(self):
+        image = render_residual_plot(self.history)
+        try:
+            tmp_path = self.plot_path + ".tmp.png"
+            image.save(tmp_path)
+            os.replace(tmp_path, self.plot_path)
+        except OSError as e:
+            self._log_error(f"Could not write residual plot: {e}")
+        if self.on_update:
+            self.on_update(image, self.history)
+
+    def run(self, stop_event: threading.Event, interval: Optional[float] = None):
+        """Poll until stop_event is set, then pick up the last iterations."""
+        interval = interval or RESIDUAL_SETTINGS["POLL_INTERVAL"]
+        while not stop_event.wait(interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self._log_error(f"Error monitoring residuals: {e}")
+        try:
+            self.poll()
+        except Exception as e:
+            self._log_error(f"Error monitoring residuals: {e}")
@@ -0,0 +1,113 @@
+# gui/utils/roi.py
+"""
+Airway region of interest (ROI) of a predicted label map.
+
+The airway fills a small part of a dental CBCT, yet the volume statistics
+and the surface extraction used to work on the whole scan. After the
+prediction, the bounding box of the airway label is computed once (one
+slab-wise pass, see label_stats), widened by ROI["MARGIN_MM"] and cut out
+into <case>_pred_roi.nii.gz next to the full prediction. The affine of the
+cropped image is shifted by the offset of the box:
+
+    affine_roi = affine @ translate(i0, j0, k0)
+
+so voxel (0, 0, 0) of the ROI lies where voxel (i0, j0, k0) of the scan
+was, and everything derived from it (STL, CSA, volume) is in the same
+patient coordinates as before. The box is saved as ROI["FILE"] in the
+output folder so the other tools can map ROI voxels back to the scan.
+
+The full prediction is kept: it is what the segmentation cache stores and
+what the user gets to see.
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import nibabel as nib
+import numpy as np
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from .label_stats import compute_label_stats, load_labels
+
+ROI_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["ROI"]
+
+
+def roi_path_for(label_path) -> Path:
+    """<case>_pred_roi.nii.gz next to <case>_pred.nii.gz."""
+    label_path = Path(label_path)
+    name = label_path.name
+    for suffix in (".nii.gz", ".nii"):
+        if name.endswith(suffix):
+            return label_path.with_name(f"{name[:-len(suffix)]}_roi{suffix}")
+    return label_path.with_name(f"{name}_roi.nii.gz")
+
+
+def padded_bbox(bbox, shape, zooms, margin_mm: float):
+    """Half-open voxel box widened by margin_mm on every side, clamped to the scan."""
+    padded = []
+    for (low, high), size, zoom in zip(bbox, shape[:3], zooms[:3]):
+        margin = int(math.ceil(margin_mm / zoom)) if zoom > 0 else 0
+        padded.append((max(0, low - margin), min(int(size), high + margin)))
+    return tuple(padded)
+
+
+def shifted_affine(affine: np.ndarray, offset) -> np.ndarray:
+    """Affine of a sub-volume whose first voxel is voxel offset of the original."""
+    shifted = np.array(affine, dtype=float)
+    shifted[:3, 3] = affine[:3, :3] @ np.asarray(offset, dtype=float) + affine[:3, 3]
+    return shifted
+
+
+def extract_roi(label_path, output_path=None, margin_mm: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Crop a label map to the airway bounding box plus margin.
+
+    Args:
+        label_path: Predicted label map (full scan)
+        output_path: Cropped label map; defaults to roi_path_for(label_path)
+        margin_mm: Margin around the airway (ROI["MARGIN_MM"])
+
+    Returns:
+        dict with path (cropped file), source, shape (of the full scan),
+        bbox (cropped box, scan voxels, half-open), airway_bbox and margin_mm
+
+    Raises:
+        ValueError: If the label map contains no airway voxels
+    """
+    margin_mm = ROI_SETTINGS["MARGIN_MM"] if margin_mm is None else margin_mm
+    output_path = Path(output_path) if output_path else roi_path_for(label_path)
+
+    data, affine, zooms = load_labels(label_path)
+    airway_bbox = compute_label_stats(data, zooms, components=False)["bbox"]
+    if airway_bbox is None:
+        raise ValueError(f"No airway voxels in {label_path}")
+    bbox = padded_bbox(airway_bbox, data.shape, zooms, margin_mm)
+    (i0, i1), (j0, j1), (k0, k1) = bbox
+
+    header = nib.load(str(label_path)).header.copy()
+    roi_affine = shifted_affine(affine, (i0, j0, k0))
+    cropped = nib.Nifti1Image(np.ascontiguousarray(data[i0:i1, j0:j1, k0:k1]), roi_affine, header=header)
+    # A new affine resets qform_code to 0, and the surface pipeline reads the qform
+    cropped.set_qform(roi_affine, code=1)
+    cropped.set_sform(roi_affine, code=1)
+    nib.save(cropped, str(output_path))
+
+    return {
+        "path": str(output_path),
+        "source": str(label_path),
+        "shape": [int(size) for size in data.shape[:3]],
+        "bbox": [list(axis) for axis in bbox],
+        "airway_bbox": [list(axis) for axis in airway_bbox],
+        "margin_mm": float(margin_mm),
+        "voxel_size_mm": [float(z) for z in zooms[:3]],
+    }
+
+
+def write_roi(roi: Dict[str, Any], output_folder) -> Path:
+    """Save the ROI description as ROI["FILE"] in output_folder."""
+    path = Path(output_folder) / ROI_SETTINGS["FILE"]
+    with open(path, "w") as f:
+        json.dump(roi, f, indent=2)
+    return path
@@ -1,20 +1,32 @@
 import os
+import json
 import subprocess
 import threading
 import SimpleITK as sitk
-import nibabel as nib
 import numpy as np
 import vtk
 from pathlib import Path
 import re
 from gui.utils.basic_utils import AppLogger
+from gui.utils.segmentation_cache import SegmentationCache
+from gui.utils.nnunet_worker import get_worker, WorkerUnavailable
+from gui.utils.inference_config import inference_config, describe
+from gui.utils.cross_section import csa_profile, write_csa_outputs
+from gui.utils.label_stats import label_stats, write_label_stats
+from gui.utils.surface_pipeline import SurfacePipeline
+from gui.utils.roi import extract_roi, write_roi
+from gui.utils.dicom_index import series_files
+from gui.config.settings import ANALYSIS_SETTINGS
 import time
 from scipy.spatial import ConvexHull
 import shutil
 import tkinter.messagebox as messagebox
 
+NNUNET_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["NNUNET"]
+
 class AirwaySegmentator:
-    def __init__(self, input_file=None, input_folder=None, output_folder=None, callback=None, input_type="dicom"):
+    def __init__(self, input_file=None, input_folder=None, output_folder=None, callback=None, input_type="dicom",
+                 preview_callback=None, max_threads=None):
         """
         Initialize the airway processing pipeline
         
@@ -22,14 +34,20 @@ class AirwaySegmentator:
             input_folder (str): Path to folder containing DICOM files
             output_folder (str): Path to output folder for all processing steps
             callback (callable): Optional callback function for progress updates
+            preview_callback (callable): Optional, called with the image of the quick preview segmentation
+            max_threads (int): Optional, cores reserved for CPU inference (all cores by default)
         """
         self.input_file = Path(input_file) if input_file else None
         self.input_folder = Path(input_folder) if input_folder else None
         self.output_folder = Path(output_folder)
         self.callback = callback
+        self.preview_callback = preview_callback
         self.input_type = input_type.lower()
         self.current_subprocess = None
         self.logger = AppLogger()
+        self.max_threads = max_threads
+        self._inference = None
+        self._label_stats = None
 
         # For cancelling the procedure
         self.cancel_event = threading.Event()
@@ -41,112 +59,258 @@ class AirwaySegmentator:
         
         for folder in [self.nifti_folder, self.prediction_folder, self.stl_folder]:
             folder.mkdir(parents=True, exist_ok=True)
+
+        # Results of scans that were segmented before
+        self.cache = None
+        if ANALYSIS_SETTINGS["SEGMENTATION"]["CACHE"]["ENABLED"]:
+            self.cache = SegmentationCache(logger=self.logger)
         
     def update_progress(self, message, percentage, output_line=None):
         """Update progress through callback if available"""
         if self.callback:
             self.callback(message, percentage, output_line)
 
+    # Regular expression to match percentage at start of line
+    _percentage_pattern = re.compile(r'^\d+%')
+
+    def _handle_output_line(self, output_line, stage_name, base_progress):
+        """Log one line of nnUNet output and turn progress lines into progress updates"""
+        output_line = output_line.strip()
+        if not output_line:
+            return
+        # Get raw output line
+        self.logger.log_info(f"{stage_name}: {output_line}")
+        # Only show lines that start with a percentage
+        if self._percentage_pattern.match(output_line):
+            try:
+                # Extract percentage value
+                percentage = int(output_line.split('%')[0])
+                # Scale the percentage to fit within the stage's progress range
+                progress = base_progress + (percentage / 100) * 20
+
+                self.update_progress(
+                    f"{stage_name}: {output_line}",
+                    progress,
+                    output_line
+                )
+            except (IndexError, ValueError):
+                pass  # Skip malformed percentage lines
+        elif "processing case" in output_line.lower():
+            try:
+                case_num = int(output_line.split()[2])
+                total_cases = int(output_line.split()[4])
+                progress = base_progress + (case_num / total_cases) * 20
+                self.update_progress(
+                    f"{stage_name}: Processing case {case_num}/{total_cases}",
+                    progress,
+                    output_line
+                )
+            except (IndexError, ValueError):
+                pass
+
     def _stream_subprocess_output(self, process, stage_name, base_progress):
         """Stream subprocess output and update progress"""
-        # Regular expression to match percentage at start of line
-        percentage_pattern = re.compile(r'^\d+%')
-        
         while True:
             # bail out if user hit cancel
             if self.cancel_event.is_set():
                 break
             if process.poll() is not None:
                 break
-                
-            output_line = process.stdout.readline().strip()
-            if output_line:
-                # Get raw output line
-                self.logger.log_info(f"{stage_name}: {output_line}")
-                # Only show lines that start with a percentage
-                if percentage_pattern.match(output_line):
-                    try:
-                        # Extract percentage value
-                        percentage = int(output_line.split('%')[0])
-                        # Scale the percentage to fit within the stage's progress range
-                        progress = base_progress + (percentage / 100) * 20
-                        
-                        self.update_progress(
-                            f"{stage_name}: {output_line}",
-                            progress,
-                            output_line
-                        )
-                    except (IndexError, ValueError):
-                        pass  # Skip malformed percentage lines
-                elif "processing case" in output_line.lower():
-                    try:
-                        case_num = int(output_line.split()[2])
-                        total_cases = int(output_line.split()[4])
-                        progress = base_progress + (case_num / total_cases) * 20
-                        self.update_progress(
-                            f"{stage_name}: Processing case {case_num}/{total_cases}",
-                            progress,
-                            output_line
-                        )
-                    except (IndexError, ValueError):
-                        pass
+
+            self._handle_output_line(process.stdout.readline(), stage_name, base_progress)
 
         # Check for any remaining output
         remaining_output = process.stdout.read()
         if remaining_output:
             for line in remaining_output.splitlines():
-                if line.strip(): 
-                    self.logger.log_info(f"{stage_name}: {line}")
-                    if percentage_pattern.match(line):
-                        self.update_progress(f"{stage_name}: {line}", base_progress, line)
+                self._handle_output_line(line, stage_name, base_progress)
+
+    @property
+    def inference(self):
+        """Device, threads and worker counts for nnUNet on this machine (detected once)"""
+        if self._inference is None:
+            self._inference = inference_config(self.max_threads)
+        return self._inference
+
+    def _nnunet_model_config(self):
+        """Model options the predictor is loaded with (worker restarts if they change)"""
+        return {
+            "dataset": NNUNET_SETTINGS["DATASET"],
+            "configuration": NNUNET_SETTINGS["CONFIGURATION"],
+            "trainer": NNUNET_SETTINGS["TRAINER"],
+            "plans": NNUNET_SETTINGS["PLANS"],
+            "checkpoint": NNUNET_SETTINGS["CHECKPOINT"],
+            "folds": NNUNET_SETTINGS["FOLDS"],
+            "step_size": self.inference["step_size"],
+            "disable_tta": self.inference["disable_tta"],
+            "device": self.inference["device"],
+            "threads": self.inference["threads"],
+        }
+
+    def _predict_with_worker(self, output_folder=None, overrides=None,
+                             stage_name="nnUNet Prediction", base_progress=30):
+        """Run the prediction in the persistent nnUNet worker"""
+        worker = get_worker(self.logger)
+        # Cancelling sets cancel_event, which makes predict() kill the worker
+        elapsed = worker.predict(
+            self.nifti_folder,
+            output_folder or self.prediction_folder,
+            self._nnunet_model_config(),
+            self.inference["npp"],
+            self.inference["nps"],
+            line_callback=lambda line: self._handle_output_line(line, stage_name, base_progress),
+            cancel_event=self.cancel_event,
+            overrides=overrides,
+        )
+        self.logger.log_info(f"nnUNet worker prediction took {elapsed:.1f} s")
+
+    def _predict_with_cli(self, output_folder=None, overrides=None,
+                          stage_name="nnUNet Prediction", base_progress=30):
+        """Run the prediction with a one-off nnUNetv2_predict process"""
+        overrides = overrides or {}
+        step_size = overrides.get("step_size", self.inference["step_size"])
+        disable_tta = overrides.get("disable_tta", self.inference["disable_tta"])
+        command = [
+            'nnUNetv2_predict',
+            '-i', str(self.nifti_folder),
+            '-o', str(output_folder or self.prediction_folder),
+            '-d', NNUNET_SETTINGS["DATASET"],
+            '-c', NNUNET_SETTINGS["CONFIGURATION"],
+            '-tr', NNUNET_SETTINGS["TRAINER"],
+            '-p', NNUNET_SETTINGS["PLANS"],
+            '-chk', NNUNET_SETTINGS["CHECKPOINT"],
+            '-device', self.inference["device"],
+            '-f', *NNUNET_SETTINGS["FOLDS"].split(),
+            '-step_size', str(step_size),
+            '-npp', str(self.inference["npp"]),
+            '-nps', str(self.inference["nps"]),
+        ]
+        if disable_tta:
+            command.append('--disable_tta')
+        # nnUNetv2_predict sets its own torch thread count on the CPU; max_threads
+        # only bounds -npp/-nps here (the worker applies it to torch as well)
+
+        # Create subprocess with pipe for output
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=1,
+            universal_newlines=True
+        )
+
+        self.current_subprocess = process
+
+        # Stream output in a separate thread
+        output_thread = threading.Thread(
+            target=self._stream_subprocess_output,
+            args=(process, stage_name, base_progress)
+        )
+        output_thread.start()
+
+        # Wait for process to complete
+        process.wait()
+        output_thread.join()
+
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode,
+                process.args,
+                process.stdout,
+                process.stderr
+            )
+
+    def _record_inference(self, backend, elapsed):
+        """Log the inference configuration and time, and keep them with the case"""
+        summary = f"{describe(self.inference)} backend={backend} time={elapsed:.1f}s"
+        self.logger.log_info(f"nnUNet prediction finished: {summary}")
+        try:
+            with open(self.output_folder / "inference_log.txt", "a") as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {summary}\n")
+        except OSError as e:
+            self.logger.log_error(f"Could not write inference log: {e}")
+
+    def _predict(self, output_folder=None, overrides=None, stage_name="nnUNet Prediction", base_progress=30):
+        """Predict with the worker, or nnUNetv2_predict if it is off or unavailable; returns the backend used"""
+        if NNUNET_SETTINGS["WORKER"]["ENABLED"]:
+            try:
+                self._predict_with_worker(output_folder, overrides, stage_name, base_progress)
+                return "worker"
+            except WorkerUnavailable as e:
+                self.logger.log_error(f"nnUNet worker unavailable, using nnUNetv2_predict: {e}")
+        self._predict_with_cli(output_folder, overrides, stage_name, base_progress)
+        return "nnUNetv2_predict"
+
+    def run_preview(self):
+        """
+        Quick, coarse segmentation shown while the full prediction runs.
+
+        Same model without mirroring and tile overlap, meshed with the
+        preview surface preset into the preview folder. The operator can
+        cancel after seeing it instead of waiting for the full inference.
+        Returns the preview image path, or None.
+        """
+        settings = NNUNET_SETTINGS["PREVIEW"]
+        preview_folder = self.output_folder / settings["DIR_NAME"]
+        try:
+            self.update_progress("Computing quick segmentation preview...", 10,
+                                 "Computing quick segmentation preview...")
+            if preview_folder.exists():
+                shutil.rmtree(preview_folder)
+            preview_folder.mkdir(parents=True)
+            started = time.time()
+            self._predict(
+                preview_folder,
+                overrides={"step_size": settings["STEP_SIZE"], "disable_tta": settings["DISABLE_TTA"]},
+                stage_name="nnUNet Preview",
+                base_progress=10,
+            )
+            if self.cancel_event.is_set():
+                return None
+
+            pred_path = next(preview_folder.glob("*.nii.gz"))
+            stats = label_stats(pred_path, components=False)
+            if stats["bbox"] is None:
+                self.logger.log_warning("Quick preview found no airway in this scan")
+                return None
+            stl_path = preview_folder / f"{pred_path.name[:-len('.nii.gz')]}_geo_preview.stl"
+            pipeline = SurfacePipeline(pred_path, preset=settings["SURFACE_PRESET"],
+                                       bbox=stats["bbox"], logger=self.logger)
+            pipeline.write_stl(stl_path)
+            preview_path = self.generate_stl_preview(str(stl_path))
+        except StopIteration:
+            self.logger.log_warning("Quick preview produced no prediction")
+            return None
+        except Exception as e:
+            if self.cancel_event.is_set():
+                return None
+            self.logger.log_warning(f"Quick segmentation preview failed: {e}")
+            return None
+
+        self.logger.log_info(
+            f"Segmentation preview ready in {time.time() - started:.1f} s "
+            f"({stats['volume_mm3']:.0f} mm³); cancel now to skip the full prediction"
+        )
+        if preview_path and self.preview_callback:
+            self.preview_callback(preview_path)
+        return preview_path
+
+    def remove_preview(self):
+        """Delete the quick preview folder once the full segmentation has replaced it"""
+        preview_folder = self.output_folder / NNUNET_SETTINGS["PREVIEW"]["DIR_NAME"]
+        if preview_folder.exists():
+            shutil.rmtree(preview_folder, ignore_errors=True)
 
     def run_nnunet_prediction(self):
         """Run nnUNet prediction on the NIfTI file with real-time output"""
         try:
             self.update_progress("Starting nnUNet prediction...", 30, "Starting nnUNet prediction...")
-            
-            # Create subprocess with pipe for output
-            process = subprocess.Popen(
-                [
-                    'nnUNetv2_predict',
-                    '-i', str(self.nifti_folder),
-                    '-o', str(self.prediction_folder),
-                    '-d', 'Dataset014_Airways',
-                    '-c', '3d_fullres_bs4',
-                    '-device', 'cuda',
-                    '-f', 'all',
-                    '-step_size', '0.7', # Increased from default 0.5
-                    #'--disable_tta',  # Disable for 5x faster inference but segmentation is a bit less accurate
-                    '-npp', '8',  # Increase preprocessing threads (up from default 2)
-                    '-nps', '8',  # Increase segmentation export threads (up from default 2)
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            self.current_subprocess = process
-            
-            # Stream output in a separate thread
-            output_thread = threading.Thread(
-                target=self._stream_subprocess_output,
-                args=(process, "nnUNet Prediction", 30)
-            )
-            output_thread.start()
-            
-            # Wait for process to complete
-            process.wait()
-            output_thread.join()
-            
-            if process.returncode != 0:
-                raise subprocess.CalledProcessError(
-                    process.returncode,
-                    process.args,
-                    process.stdout,
-                    process.stderr
-                )
-            
+
+            self.logger.log_info(f"nnUNet inference: {describe(self.inference)}")
+            started = time.time()
+            backend = self._predict()
+            self._record_inference(backend, time.time() - started)
+
             # Rename prediction file to add _pred suffix 
             pred_folder = Path(self.prediction_folder)
             for old_path in pred_folder.glob('*.nii.gz'):
@@ -254,7 +418,8 @@ class AirwaySegmentator:
         try:
             self.logger.log_info("Converting DICOM to NIfTI...")
             reader = sitk.ImageSeriesReader()
-            dicom_names = reader.GetGDCMSeriesFileNames(str(self.input_folder))
+            # Sorted slices of the main series from the header index (no second folder scan)
+            dicom_names = series_files(self.input_folder)
             if not dicom_names:
                 raise ValueError("No DICOM series found in input directory")
             reader.SetFileNames(dicom_names)
@@ -272,18 +437,40 @@ class AirwaySegmentator:
             self.logger.log_error(f"Error in DICOM to NIfTI conversion: {e}")
             raise
 
+    def extract_roi(self, pred_path):
+        """Crop the prediction to the airway region; returns the label map to use downstream"""
+        if not ANALYSIS_SETTINGS["SEGMENTATION"]["ROI"]["ENABLED"]:
+            return pred_path
+        try:
+            roi = extract_roi(pred_path)
+            write_roi(roi, self.output_folder)
+        except (OSError, ValueError) as e:
+            self.logger.log_warning(f"Airway region not extracted, using the full scan: {e}")
+            return pred_path
+
+        full = int(np.prod(roi["shape"]))
+        cropped = int(np.prod([high - low for low, high in roi["bbox"]]))
+        self.logger.log_info(
+            f"Airway region {' x '.join(str(high - low) for low, high in roi['bbox'])} voxels "
+            f"({100 * cropped / full:.1f}% of the scan)"
+        )
+        return roi["path"]
+
     def calculate_volume(self, nifti_path):
-        """Calculate volume of the segmented airway"""
+        """Calculate volume of the segmented airway (and the other label statistics)"""
         try:
-            
-            nifti_img = nib.load(nifti_path)
-            data = nifti_img.get_fdata()
-            voxel_sizes = nifti_img.header.get_zooms()
-            
-            voxel_volume = np.prod(voxel_sizes)  # mm³
-            airway_voxel_count = np.sum(data == 1)  # assuming label 1 for airway
-            total_volume_mm3 = airway_voxel_count * voxel_volume
-        
+            # Integer labels, scanned slab by slab (no float64 copy of the scan)
+            stats = label_stats(nifti_path)
+            write_label_stats(stats, self.output_folder)
+            self._label_stats = stats
+            total_volume_mm3 = stats["volume_mm3"]
+            components = stats.get("components")
+            if components and components["count"] > 1:
+                self.logger.log_warning(
+                    f"Segmentation has {components['count']} connected regions, the largest holds "
+                    f"{100 * components['largest_fraction']:.1f}% of the airway voxels"
+                )
+
             # Save volume calculation
             with open(self.output_folder / "volume_calculation.txt", "w") as f:
                 f.write(f"Airway Volume: {total_volume_mm3:.2f} mm³\n")
@@ -305,6 +492,10 @@ class AirwaySegmentator:
             if nifti_filename.endswith('.nii'):
                 nifti_filename = Path(nifti_filename).stem  # Removes the .nii
 
+            # Cropped label map (extract_roi): same STL name as the full prediction
+            if nifti_filename.endswith("_roi"):
+                nifti_filename = nifti_filename[:-len("_roi")]
+
             # Then handle the _pred suffix
             if nifti_filename.endswith("_pred"):
                 nifti_filename = nifti_filename.replace("_pred", "_geo")  # Remove _pred suffix if exists
@@ -312,137 +503,18 @@ class AirwaySegmentator:
             stl_path = self.stl_folder / f"{nifti_filename}.stl"  # Set STL filename
             stl_path = stl_path.resolve()  # Ensures it's absolute
             
-            # Load NIfTI file
-            reader = vtk.vtkNIFTIImageReader()
-            reader.SetFileName(str(nifti_path))
-            reader.Update()
-            
-            # Apply vtkDiscreteFlyingEdges3D
-            discrete_flying_edges = vtk.vtkDiscreteFlyingEdges3D()
-            discrete_flying_edges.SetInputConnection(reader.GetOutputPort())
-            discrete_flying_edges.SetValue(0, threshold_value)
-            discrete_flying_edges.Update()
-            
-            output_polydata = discrete_flying_edges.GetOutput()
-
-            # First clean the mesh to remove duplicate points
-            cleaner = vtk.vtkCleanPolyData()
-            cleaner.SetInputData(output_polydata)
-            cleaner.SetTolerance(0.0001)
-            cleaner.ConvertLinesToPointsOff()
-            cleaner.ConvertPolysToLinesOff()
-            cleaner.ConvertStripsToPolysOff()
-            cleaner.PointMergingOn()
-            cleaner.Update()
-            output_polydata = cleaner.GetOutput()
-
-            # # Improve triangle quality - deemed not necessary because mesh is dense enough to avoid too much tirangle distortion
-            # triangle_filter = vtk.vtkTriangleFilter()
-            # triangle_filter.SetInputData(output_polydata)
-            # triangle_filter.PassLinesOff()
-            # triangle_filter.PassVertsOff()
-            # triangle_filter.Update()
-            # output_polydata = triangle_filter.GetOutput()
-
-            # Ensure model is completely closed and manifold
-            connected_filter = vtk.vtkPolyDataConnectivityFilter()
-            connected_filter.SetInputData(output_polydata)
-            connected_filter.SetExtractionModeToLargestRegion()
-            connected_filter.Update()
-            output_polydata = connected_filter.GetOutput()
-
-            # Apply smoothing
-            smoothing_filter = vtk.vtkSmoothPolyDataFilter()
-            smoothing_filter.SetInputData(output_polydata)
-            smoothing_filter.SetNumberOfIterations(25)
-            smoothing_filter.SetRelaxationFactor(0.2)  
-            smoothing_filter.FeatureEdgeSmoothingOff()
-            smoothing_filter.BoundarySmoothingOn()
-            smoothing_filter.Update()
-            output_polydata = smoothing_filter.GetOutput()
-
-            # # Apply decimation? Not worth it because the triangles get distorted
-            # decimator = vtk.vtkDecimatePro()
-            # decimator.SetInputData(output_polydata)
-            # decimator.SetTargetReduction(decimate_target_reduction)
-            # decimator.PreserveTopologyOn()
-            # decimator.BoundaryVertexDeletionOff()
-            # decimator.SplittingOff()
-            # decimator.Update()
-            # output_polydata = decimator.GetOutput()
-            
-            # Apply Windowed Sinc smoothing with conservative settings
-            smoother = vtk.vtkWindowedSincPolyDataFilter()
-            smoother.SetInputData(output_polydata)
-            smoother.SetNumberOfIterations(20)
-            smoother.FeatureEdgeSmoothingOff()
-            smoother.SetFeatureAngle(60)
-            smoother.SetPassBand(0.2)
-            smoother.SetBoundarySmoothing(True)
-            smoother.Update()
-            output_polydata = smoother.GetOutput()
-
-            # Get QForm matrix
-            qform_matrix = reader.GetQFormMatrix()
-
-            # Create IJK to RAS transformation
-            ijk_to_ras = vtk.vtkMatrix4x4()
-            ijk_to_ras.DeepCopy(qform_matrix)
-
-            # Adjust for VTK's coordinate system
-            flip_xy = vtk.vtkMatrix4x4()
-            flip_xy.SetElement(0, 0, -1)
-            flip_xy.SetElement(1, 1, -1)
-
-            vtk.vtkMatrix4x4.Multiply4x4(flip_xy, ijk_to_ras, ijk_to_ras)
-
-            # Create transformation matrix
-            transform = vtk.vtkTransform()
-            transform.SetMatrix(ijk_to_ras)
-
-            # Apply transformation
-            transform_filter = vtk.vtkTransformPolyDataFilter()
-            transform_filter.SetInputData(output_polydata)
-            transform_filter.SetTransform(transform)
-            transform_filter.Update()
-            transformed_polydata = transform_filter.GetOutput()
-
-            # Extract largest region again after transformation
-            connected_filter = vtk.vtkPolyDataConnectivityFilter()
-            connected_filter.SetInputData(transformed_polydata)
-            connected_filter.SetExtractionModeToLargestRegion()
-            connected_filter.Update()
-            clean_polydata = connected_filter.GetOutput()
-
-            # Compute normals 
-            normals = vtk.vtkPolyDataNormals()
-            normals.SetInputData(clean_polydata)
-            normals.SetFeatureAngle(60.0)
-            normals.ConsistencyOn()
-            normals.SplittingOff()
-            normals.AutoOrientNormalsOn()
-            normals.Update()
-            output_polydata = normals.GetOutput()
-            
-            # Final clean to ensure high quality
-            final_cleaner = vtk.vtkCleanPolyData()
-            final_cleaner.SetInputData(output_polydata)
-            final_cleaner.Update()
-
-            # Write STL file
-            stl_writer = vtk.vtkSTLWriter()
-            stl_writer.SetFileTypeToBinary()
-            stl_writer.SetFileName(str(stl_path))
-            stl_writer.SetInputData(output_polydata)
-            stl_writer.Write()
+            # Contour only the airway's bounding box (known from calculate_volume)
+            stats = self._label_stats or label_stats(nifti_path, components=False)
+            pipeline = SurfacePipeline(nifti_path, bbox=stats["bbox"],
+                                       threshold_value=threshold_value, logger=self.logger)
+            output_polydata = pipeline.write_stl(stl_path)
+            pipeline.log_timings()
 
             # Generate STL Preview
             preview_path = self.generate_stl_preview(str(stl_path))
 
-            # Minimum cross section computation
-            min_csa = self.approx_min_cross_section_area(clean_polydata, num_slices=50)  ## TODO: Change approx_min_cross_section_area function to the final version
-            with open(self.output_folder/"min_csa.txt", "w") as f:
-                f.write(f"Min CSA (approx): {min_csa:.2f} mm²\n")
+            # Minimum cross section computation (exact sections of the oriented surface)
+            min_csa = self.compute_min_csa(output_polydata)
 
             return {'stl_path': str(stl_path), 'preview_path': preview_path, 'min_csa': min_csa}
             
@@ -450,6 +522,100 @@ class AirwaySegmentator:
             self.logger.log_error(f"Error in STL creation: {e}")
             raise
 
+    def model_signature(self):
+        """nnUNet options that change the prediction (part of the cache key)"""
+        return "|".join(str(value) for value in (
+            NNUNET_SETTINGS["DATASET"],
+            NNUNET_SETTINGS["CONFIGURATION"],
+            NNUNET_SETTINGS["FOLDS"],
+            self.inference["step_size"],
+            self.inference["disable_tta"],
+        ))
+
+    def output_signature(self):
+        """Settings that change the outputs made from the prediction (part of the cache key)"""
+        settings = ANALYSIS_SETTINGS["SEGMENTATION"]
+        surface = settings["SURFACE"]
+        return json.dumps({
+            "surface": surface["PRESETS"][surface["PRESET"]],
+            "crop_margin": surface["CROP_MARGIN"],
+            "roi": {key: settings["ROI"][key] for key in ("ENABLED", "MARGIN_MM")},
+            "csa": {key: settings["CSA"][key] for key in ("STATIONS", "AXIS", "END_MARGIN")},
+            "airway_label": settings["LABEL_STATS"]["AIRWAY_LABEL"],
+        }, sort_keys=True)
+
+    def _output_paths(self, nifti_path):
+        """Paths of the segmentation outputs for an input scan, by cache role"""
+        case_name = Path(nifti_path).name
+        for suffix in (".gz", ".nii"):
+            if case_name.endswith(suffix):
+                case_name = case_name[:-len(suffix)]
+        if case_name.endswith("_0000"):
+            case_name = case_name[:-len("_0000")]
+        return {
+            "pred": self.prediction_folder / f"{case_name}_pred.nii.gz",
+            "stl": (self.stl_folder / f"{case_name}_geo.stl").resolve(),
+            "preview": (self.stl_folder / f"{case_name}_geo.png").resolve(),
+            "volume": self.output_folder / "volume_calculation.txt",
+            "min_csa": self.output_folder / "min_csa.txt",
+            "csa_profile": self.output_folder / ANALYSIS_SETTINGS["SEGMENTATION"]["CSA"]["PROFILE_FILE"],
+            "label_stats": self.output_folder / ANALYSIS_SETTINGS["SEGMENTATION"]["LABEL_STATS"]["FILE"],
+            "roi": self.output_folder / ANALYSIS_SETTINGS["SEGMENTATION"]["ROI"]["FILE"],
+        }
+
+    def _lookup_cache(self, nifti_path):
+        """Cache key of the input scan, or None if the cache is off or unusable"""
+        if not self.cache:
+            return None
+        try:
+            return self.cache.compute_key(nifti_path, f"{self.model_signature()}|{self.output_signature()}")
+        except OSError as e:
+            self.logger.log_error(f"Segmentation cache lookup failed: {e}")
+            return None
+
+    def _restore_from_cache(self, cache_key, nifti_path):
+        """Reuse a cached segmentation. Returns the process() result or None."""
+        paths = self._output_paths(nifti_path)
+        meta = self.cache.restore(cache_key, paths)
+        if meta is None:
+            return None
+
+        self.update_progress("Reusing previous segmentation of this scan", 95,
+                             "Identical scan found in the segmentation cache, skipping nnUNet")
+        preview_path = str(paths["preview"]) if paths["preview"].exists() else None
+        return {
+            'nifti_path': str(nifti_path),
+            'prediction_path': str(paths["pred"]),
+            'volume': meta.get("volume"),
+            'stl_path': {
+                'stl_path': str(paths["stl"]),
+                'preview_path': preview_path,
+                'min_csa': meta.get("min_csa"),
+            }
+        }
+
+    def _store_in_cache(self, cache_key, nifti_path, pred_path, volume, stl_result):
+        """Keep the finished segmentation for later runs on the same scan"""
+        paths = self._output_paths(nifti_path)
+        sources = {
+            "pred": Path(pred_path),
+            "stl": Path(stl_result['stl_path']),
+            "preview": Path(stl_result['preview_path']) if stl_result.get('preview_path') else None,
+            "volume": paths["volume"],
+            "min_csa": paths["min_csa"],
+            "csa_profile": paths["csa_profile"],
+            "label_stats": paths["label_stats"],
+            "roi": paths["roi"],
+        }
+        try:
+            self.cache.store(cache_key, sources, meta={
+                "volume": float(volume),
+                "min_csa": float(stl_result['min_csa']),
+                "input": str(self.input_file or self.input_folder),
+            })
+        except OSError as e:
+            self.logger.log_error(f"Could not store segmentation in cache: {e}")
+
     def process(self):
         """Run the complete processing pipeline for DICOM or NIfTI input"""
         try:
@@ -471,21 +637,43 @@ class AirwaySegmentator:
                 if self.cancel_event.is_set():
                    raise RuntimeError("User cancelled during DICOM→NIfTI")
 
+            # Same scan and model as an earlier run: reuse its results
+            cache_key = self._lookup_cache(nifti_path)
+            if cache_key:
+                cached = self._restore_from_cache(cache_key, nifti_path)
+                if cached:
+                    return cached
+
+            # Coarse result first, so a bad scan can be stopped early (only when someone sees it)
+            if NNUNET_SETTINGS["PREVIEW"]["ENABLED"] and self.preview_callback:
+                self.run_preview()
+                if self.cancel_event.is_set():
+                    raise RuntimeError("User cancelled after the segmentation preview")
+
             # Run nnUNet prediction
             pred_path = self.run_nnunet_prediction()
             if self.cancel_event.is_set():
                    raise RuntimeError("User cancelled during nnUNet prediction")
 
+            # Cut the airway region out of the scan once; the later steps only see that
+            roi_path = self.extract_roi(pred_path)
+
             # Calculate volume
-            volume = self.calculate_volume(pred_path)
+            volume = self.calculate_volume(roi_path)
             if self.cancel_event.is_set():
                    raise RuntimeError("User cancelled during volume computation")
 
             # Create STL
-            stl_result = self.create_stl(pred_path)
+            stl_result = self.create_stl(roi_path)
             if self.cancel_event.is_set():
                    raise RuntimeError("User cancelled during STL creation")
 
+            # The full result replaces the quick preview
+            self.remove_preview()
+
+            if cache_key:
+                self._store_in_cache(cache_key, nifti_path, pred_path, volume, stl_result)
+
             return {
                 'nifti_path': str(nifti_path),
                 'prediction_path': pred_path,
@@ -642,37 +830,13 @@ class AirwaySegmentator:
             self.logger.log_error(f"Error generating STL preview: {str(e)}")
             return None
     
-    def approx_min_cross_section_area(self, polydata, num_slices=50):
-        """
-        Placeholder: approximate the minimum cross‐sectional area in Z by
-        slicing the mesh into `num_slices` and taking the smallest bounding‑box.
-        """
-        # 1) grab all mesh vertices
-        n_pts = polydata.GetNumberOfPoints()
-        pts = np.array([polydata.GetPoint(i) for i in range(n_pts)])
-        if pts.size == 0:
-            return 0.0
-
-        z = pts[:, 2]
-        zmin, zmax = z.min(), z.max()
-        if zmax <= zmin:
-            return 0.0
-
-        edges = np.linspace(zmin, zmax, num_slices + 1)
-        min_area = float('inf')
-
-        for i in range(num_slices):
-            mask = (z >= edges[i]) & (z < edges[i+1])
-            slice_xy = pts[mask][:, :2]
-            if slice_xy.shape[0] < 3:
-                continue
-
-            # --- Simple bounding‐box area --- 
-            dx = np.ptp(slice_xy[:, 0])   # max(slice_xy[:,0]) - min(...)
-            dy = np.ptp(slice_xy[:, 1])
-            area = dx * dy
-
-            min_area = min(min_area, area)
-
-        return min_area if min_area != float('inf') else 0.0
-    
\ No newline at end of file
+    def compute_min_csa(self, polydata):
+        """Write the CSA profile and min_csa.txt for an airway surface; returns the minimum CSA (mm²)"""
+        started = time.time()
+        profile = csa_profile(polydata)
+        min_csa = write_csa_outputs(profile, self.output_folder)
+        self.logger.log_info(
+            f"Min CSA {min_csa:.2f} mm² from {len(profile['area'])} sections "
+            f"({time.time() - started:.2f} s)"
+        )
+        return min_csa
@@ -0,0 +1,213 @@
+# gui/utils/segmentation_cache.py
+"""
+Content-addressed cache for the segmentation stage.
+
+The same scan is often segmented more than once (re-runs after a wrong
+patient name, another user, another results folder). The key of an entry is
+the SHA-256 of the uncompressed input NIfTI (the *_0000.nii.gz written by the
+DICOM conversion) plus the nnUNet model options and the settings of the
+steps after it (surface preset, ROI, CSA), so a different scan, model or
+surface never matches.
+
+An entry holds the files the segmentation stage produces:
+
+- pred:    prediction/<case>_pred.nii.gz
+- stl:     stl/<case>_geo.stl
+- preview: stl/<case>_geo.png
+- volume:  volume_calculation.txt
+- min_csa: min_csa.txt
+- csa_profile: csa_profile.csv
+- label_stats: label_stats.json
+
+and a meta.json with the volume, the minimum CSA and the last time the
+entry was used. When the cache grows above CACHE["MAX_BYTES"] the least
+recently used entries are removed.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from gui.config.settings import ANALYSIS_SETTINGS, PATH_SETTINGS
+
+CACHE_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["CACHE"]
+
+# Output roles stored in an entry and their file names inside the entry
+ENTRY_FILES = {
+    "pred": "pred.nii.gz",
+    "stl": "geo.stl",
+    "preview": "geo.png",
+    "volume": "volume_calculation.txt",
+    "min_csa": "min_csa.txt",
+    "csa_profile": "csa_profile.csv",
+    "label_stats": "label_stats.json",
+    "roi": "roi.json",
+}
+REQUIRED_ROLES = ("pred", "stl")
+
+
+def scan_digest(nifti_path) -> str:
+    """
+    SHA-256 of the image data of a NIfTI file.
+
+    Compressed files are hashed after decompression, so the gzip header
+    (timestamp, compression level) does not change the digest.
+    """
+    nifti_path = Path(nifti_path)
+    opener = gzip.open if nifti_path.suffix == ".gz" else open
+    digest = hashlib.sha256()
+    with opener(nifti_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class SegmentationCache:
+    """Stores and restores segmentation results by scan and model."""
+
+    def __init__(self, cache_root=None, max_bytes=None, logger=None):
+        self.cache_root = Path(cache_root) if cache_root else (
+            PATH_SETTINGS["CACHE_DIR"] / CACHE_SETTINGS["DIR_NAME"]
+        )
+        self.max_bytes = CACHE_SETTINGS["MAX_BYTES"] if max_bytes is None else max_bytes
+        self.logger = logger
+
+    def _log_info(self, message):
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    def _log_error(self, message):
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            print(f"ERROR: {message}")
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_root / key
+
+    def compute_key(self, nifti_path, model_signature: str) -> str:
+        """Cache key of an input scan segmented and post-processed with the given options."""
+        digest = hashlib.sha256()
+        digest.update(scan_digest(nifti_path).encode())
+        digest.update(model_signature.encode())
+        return digest.hexdigest()
+
+    def has(self, key: Optional[str]) -> bool:
+        """True if a complete entry is stored for this key."""
+        if not key:
+            return False
+        entry = self._entry_dir(key)
+        return (entry / "meta.json").is_file() and all(
+            (entry / ENTRY_FILES[role]).is_file() for role in REQUIRED_ROLES
+        )
+
+    def restore(self, key: Optional[str], destinations: Dict[str, Path]) -> Optional[dict]:
+        """
+        Copy a cached entry to the given destination paths.
+
+        Args:
+            key: Cache key from compute_key()
+            destinations: Output role (see ENTRY_FILES) -> destination path
+
+        Returns:
+            The entry's meta data on a cache hit, None otherwise.
+        """
+        if not self.has(key):
+            return None
+
+        entry = self._entry_dir(key)
+        try:
+            meta = json.loads((entry / "meta.json").read_text())
+            for role, dst in destinations.items():
+                src = entry / ENTRY_FILES[role]
+                if not src.is_file():
+                    continue
+                dst = Path(dst)
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                # Copies, not links: the case folders are edited and deleted freely
+                shutil.copy2(src, dst)
+
+            meta["last_used"] = time.time()
+            (entry / "meta.json").write_text(json.dumps(meta, indent=2))
+        except (OSError, ValueError) as e:
+            self._log_error(f"Could not restore segmentation cache entry {key[:12]}: {e}")
+            return None
+
+        self._log_info(f"Segmentation cache hit {key[:12]}")
+        return meta
+
+    def store(self, key: Optional[str], sources: Dict[str, Path], meta: Optional[dict] = None) -> bool:
+        """
+        Store the outputs of a finished segmentation under the given key.
+
+        The entry is assembled in a temporary folder and renamed into place,
+        so a partial entry is never picked up by another run.
+        """
+        if not key:
+            return False
+        if self.has(key):
+            return True
+        if not all(sources.get(role) and Path(sources[role]).is_file() for role in REQUIRED_ROLES):
+            return False
+
+        self.cache_root.mkdir(parents=True, exist_ok=True)
+        staging = self.cache_root / f".{key}.{os.getpid()}.tmp"
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir()
+
+        try:
+            for role, src in sources.items():
+                if src and Path(src).is_file():
+                    shutil.copy2(src, staging / ENTRY_FILES[role])
+            now = time.time()
+            (staging / "meta.json").write_text(json.dumps({
+                **(meta or {}),
+                "created": now,
+                "last_used": now,
+            }, indent=2))
+            staging.rename(self._entry_dir(key))
+        except OSError as e:
+            # Another run stored the same scan first, or the disk is full
+            shutil.rmtree(staging, ignore_errors=True)
+            if not self.has(key):
+                self._log_error(f"Could not store segmentation cache entry {key[:12]}: {e}")
+                return False
+
+        self._log_info(f"Stored segmentation {key[:12]} in {self.cache_root}")
+        self.evict()
+        return True
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        if not self.max_bytes or not self.cache_root.is_dir():
+            return
+
+        entries = []
+        for entry in self.cache_root.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            try:
+                last_used = json.loads((entry / "meta.json").read_text()).get("last_used", 0)
+            except (OSError, ValueError):
+                last_used = 0
+            entries.append((last_used, _dir_size(entry), entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            self._log_info(f"Evicted segmentation cache entry {entry.name[:12]}")
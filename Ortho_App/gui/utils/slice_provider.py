@@ -0,0 +1,193 @@
+# gui/utils/slice_provider.py
+"""
+Middle slices of a scan, read without loading the whole volume.
+
+The scan previews of Tab3 show three slices, but generate_slices decoded and
+stacked the pixel data of every DICOM file, and generate_nifti_slices turned
+the whole NIfTI volume into float64 with get_fdata(). The providers here
+read only what the three slices need:
+
+- DICOM (DicomSlices): the axial slice is the middle file of the series
+  (order from the DICOM index). The coronal and sagittal slices need one
+  row and one column of every file; for uncompressed little-endian files
+  the pixel data is memory-mapped at its offset in the file (found from a
+  header read that defers the pixel data), so nothing is decoded and only
+  those values are copied. Compressed files are decoded in full, one at a
+  time.
+- NIfTI (NiftiSlices): the slices are taken from the dataobj proxy, which
+  reads (or memory-maps, for .nii) only the requested part and keeps the
+  stored data type.
+
+The rendered preview images are kept per scan (PreviewCache), so going back
+and forth between the tabs does not read the scan again.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pydicom
+
+from gui.config.settings import FILE_SETTINGS
+from .dicom_index import dicom_index, main_series
+
+PREVIEW_SETTINGS = FILE_SETTINGS["SLICE_PREVIEW"]
+INDEX_SETTINGS = FILE_SETTINGS["DICOM_INDEX"]
+
+
+# --------------------------------------------------------------------------
+# DICOM
+# --------------------------------------------------------------------------
+
+def _pixel_map(path) -> Optional[np.ndarray]:
+    """Rows x Columns memory map of the pixel data of an uncompressed file, or None."""
+    ds = pydicom.dcmread(str(path), force=True, defer_size=1024)
+    element = ds.get_item("PixelData")
+    if element is None or getattr(element, "value_tell", None) is None:
+        return None
+    transfer_syntax = getattr(getattr(ds, "file_meta", None), "TransferSyntaxUID", None)
+    if transfer_syntax is not None and (transfer_syntax.is_compressed or not transfer_syntax.is_little_endian):
+        return None
+    if int(ds.get("SamplesPerPixel", 1)) != 1 or int(ds.get("NumberOfFrames", 1) or 1) != 1:
+        return None
+    bits = int(ds.BitsAllocated)
+    if bits not in (8, 16, 32):
+        return None
+    dtype = np.dtype(f"<{'i' if int(ds.get('PixelRepresentation', 0)) else 'u'}{bits // 8}")
+    shape = (int(ds.Rows), int(ds.Columns))
+    if element.length < shape[0] * shape[1] * dtype.itemsize:
+        return None
+    return np.memmap(str(path), dtype=dtype, mode="r", offset=element.value_tell, shape=shape)
+
+
+def _pixels(path) -> np.ndarray:
+    """Pixel array of one file: memory-mapped when possible, decoded otherwise."""
+    mapped = _pixel_map(path)
+    if mapped is not None:
+        return mapped
+    return pydicom.dcmread(str(path), force=True).pixel_array
+
+
+class DicomSlices:
+    """Middle slices of the main DICOM series of a folder."""
+
+    def __init__(self, folder):
+        self.folder = str(folder)
+        self.index = dicom_index(folder)
+        self.series = main_series(self.index)
+        self.files = self.series["files"]
+        info = self.series["info"]
+        self.slope = float(info.get("RescaleSlope", 1.0))
+        self.intercept = float(info.get("RescaleIntercept", 0.0))
+
+    @property
+    def key(self):
+        return ("dicom", os.path.abspath(self.folder), self.index["fingerprint"])
+
+    def _rescale(self, data: np.ndarray) -> np.ndarray:
+        return np.asarray(data, dtype=float) * self.slope + self.intercept
+
+    def middle_slices(self) -> Dict[str, np.ndarray]:
+        """
+        Same slices as volume[n // 2], volume[:, rows // 2, :] and volume[:, :, cols // 2]
+        of the stacked series, with the rescale slope and intercept applied.
+        """
+        axial = _pixels(self.files[len(self.files) // 2])
+        rows, cols = axial.shape[:2]
+
+        def read(path):
+            pixels = _pixels(path)
+            return np.array(pixels[rows // 2, :]), np.array(pixels[:, cols // 2])
+
+        # File access dominates, so the rows and columns are read in a thread pool
+        with ThreadPoolExecutor(max_workers=INDEX_SETTINGS["WORKERS"]) as pool:
+            lines = list(pool.map(read, self.files))
+        return {
+            "axial": self._rescale(axial),
+            "coronal": self._rescale(np.stack([row for row, _ in lines])),
+            "sagittal": self._rescale(np.stack([column for _, column in lines])),
+        }
+
+
+# --------------------------------------------------------------------------
+# NIfTI
+# --------------------------------------------------------------------------
+
+class NiftiSlices:
+    """Middle slices of a NIfTI volume through its data proxy."""
+
+    def __init__(self, path):
+        import nibabel as nib
+
+        self.path = str(path)
+        self.image = nib.load(self.path, mmap=True)
+        self.shape = self.image.shape[:3]
+
+    @property
+    def key(self):
+        stat = os.stat(self.path)
+        return ("nifti", os.path.abspath(self.path), stat.st_size, stat.st_mtime_ns)
+
+    def _slice(self, index) -> np.ndarray:
+        data = self.image.dataobj[index]
+        # 4D images: first volume
+        while data.ndim > 2:
+            data = data[..., 0]
+        return np.asarray(data, dtype=float)
+
+    def middle_slices(self) -> Dict[str, np.ndarray]:
+        """Same slices as data[:, :, z // 2], data[:, y // 2, :] and data[x // 2, :, :]."""
+        x_mid, y_mid, z_mid = (size // 2 for size in self.shape)
+        return {
+            "axial": self._slice((slice(None), slice(None), z_mid)),
+            "coronal": self._slice((slice(None), y_mid, slice(None))),
+            "sagittal": self._slice((x_mid, slice(None), slice(None))),
+        }
+
+
+def open_slices(path):
+    """DicomSlices for a folder, NiftiSlices for a .nii/.nii.gz file."""
+    if os.path.isdir(str(path)):
+        return DicomSlices(path)
+    if str(path).lower().endswith((".nii", ".nii.gz")):
+        return NiftiSlices(path)
+    raise ValueError(f"Not a DICOM folder or NIfTI file: {path}")
+
+
+# --------------------------------------------------------------------------
+# Rendered previews
+# --------------------------------------------------------------------------
+
+class PreviewCache:
+    """Rendered preview images of the last SLICE_PREVIEW["CACHE_SCANS"] scans."""
+
+    def __init__(self, max_scans: Optional[int] = None):
+        self.max_scans = max_scans or PREVIEW_SETTINGS["CACHE_SCANS"]
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source, render: Callable[[Dict[str, np.ndarray]], Dict]) -> Dict:
+        """
+        Preview images of a scan, rendered from its middle slices on the first call.
+
+        Args:
+            source: DicomSlices or NiftiSlices
+            render: Turns the middle slices into the preview images
+        """
+        key = source.key
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return self._images[key]
+        images = render(source.middle_slices())
+        with self._lock:
+            self._images[key] = images
+            while len(self._images) > self.max_scans:
+                self._images.popitem(last=False)
+        return images
+
+
+preview_cache = PreviewCache()
@@ -0,0 +1,273 @@
+# gui/utils/surface_assembly.py
+"""
+constant/triSurface/combined.stl from the inlet, outlet and wall surfaces.
+
+surfaceFeatureExtract reads combined.stl, which used to be made with
+`rm -f combined.stl; cat *.stl > combined.stl` in the case. The glob took
+whatever STL files happened to be in the folder, and concatenated binary
+STLs are not a valid STL at all. Here the three patch files are streamed in
+1 MB blocks into one file:
+
+- ASCII (COMBINED["FORMAT"] = "ascii"): one solid per patch, named after
+  the patch (solid inlet ... endsolid inlet, ...), whatever the solid names
+  of the inputs were. ASCII parts are copied block by block, binary parts
+  are converted.
+- binary: one solid (the format has no names); binary parts are copied
+  record by record, ASCII parts are parsed.
+
+Every part is checked while it is streamed: it must have triangles, an
+ASCII part three vertices per facet and a binary part the size its header
+announces. The file is written under a temporary name and renamed, so a
+failed run never leaves half a combined.stl behind.
+
+The size, modification time and SHA-256 of the parts (hashed while they
+are streamed, so at no extra read) are saved in COMBINED["STAMP_FILE"].
+When the parts have the same size and modification time, or the same
+hash, as for the existing combined.stl, nothing is rewritten.
+"""
+
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from .mesh_cache import _file_digest
+
+COMBINED_SETTINGS = ANALYSIS_SETTINGS["CFD"]["GEOMETRY"]["COMBINED"]
+
+# Patch surfaces, in the order they are written
+PATCHES = ("inlet", "outlet", "wall")
+
+_BLOCK_SIZE = 1024 * 1024
+_BINARY_RECORD = np.dtype([("normal", "<f4", 3), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+_ASCII_FACET = ("facet normal %e %e %e\nouter loop\n"
+                "vertex %e %e %e\nvertex %e %e %e\nvertex %e %e %e\n"
+                "endloop\nendfacet")
+
+
+def is_binary_stl(path) -> bool:
+    """True if the file size matches the triangle count of a binary STL header."""
+    size = os.path.getsize(path)
+    if size < 84:
+        return False
+    with open(path, "rb") as f:
+        f.seek(80)
+        (count,) = struct.unpack("<I", f.read(4))
+    return size == 84 + 50 * count
+
+
+def _blocks(f, digest):
+    """Raw blocks of a file, hashed on the way."""
+    for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+        digest.update(block)
+        yield block
+
+
+def _ascii_lines(f, digest):
+    """Blocks of whole lines of an ASCII STL."""
+    rest = b""
+    for block in _blocks(f, digest):
+        block = rest + block
+        end = block.rfind(b"\n") + 1
+        rest = block[end:]
+        if end:
+            yield block[:end]
+    if rest:
+        yield rest + b"\n"
+
+
+def _without_solid_lines(lines: bytes) -> bytes:
+    """The facets of a block of lines, without its solid/endsolid lines."""
+    if b"solid" not in lines:
+        return lines
+    return b"".join(line for line in lines.splitlines(keepends=True)
+                    if not line.lstrip().startswith((b"solid", b"endsolid")))
+
+
+def _facet_normals(vertices: np.ndarray) -> np.ndarray:
+    normals = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+def _binary_records(f, digest, path):
+    """Triangle records of a binary STL, in blocks."""
+    header = f.read(84)
+    digest.update(header)
+    records = b""
+    for block in _blocks(f, digest):
+        records += block
+        usable = len(records) - len(records) % _BINARY_RECORD.itemsize
+        if usable:
+            yield np.frombuffer(records[:usable], dtype=_BINARY_RECORD)
+            records = records[usable:]
+    if records:
+        raise ValueError(f"{path}: truncated binary STL")
+
+
+def _ascii_vertices(f, digest):
+    """Triangle vertices (K x 3 x 3) of an ASCII STL, in blocks."""
+    carry = np.empty((0, 3), dtype=np.float32)
+    for lines in _ascii_lines(f, digest):
+        values = [line.split()[1:4] for line in lines.splitlines() if line.lstrip().startswith(b"vertex")]
+        vertices = np.concatenate([carry, np.array(values, dtype=np.float32).reshape(-1, 3)])
+        usable = len(vertices) - len(vertices) % 3
+        carry = vertices[usable:]
+        if usable:
+            yield vertices[:usable].reshape(-1, 3, 3)
+    if len(carry):
+        raise ValueError("incomplete facet at the end of the file")
+
+
+def _write_ascii_part(out, path, name, digest) -> int:
+    """Write one part as the solid name; returns its triangle count."""
+    out.write(f"solid {name}\n".encode())
+    triangles = 0
+    with open(path, "rb") as f:
+        if is_binary_stl(path):
+            for records in _binary_records(f, digest, path):
+                vertices = records["vertices"].astype(float)
+                np.savetxt(out, np.hstack([_facet_normals(vertices), vertices.reshape(-1, 9)]), fmt=_ASCII_FACET)
+                triangles += len(records)
+        else:
+            vertices = 0
+            for lines in _ascii_lines(f, digest):
+                facets = _without_solid_lines(lines)
+                out.write(facets)
+                triangles += facets.count(b"endfacet")
+                vertices += facets.count(b"vertex")
+            if vertices != 3 * triangles:
+                raise ValueError(f"{path}: {vertices} vertices for {triangles} facets")
+    out.write(f"endsolid {name}\n".encode())
+    return triangles
+
+
+def _write_binary_part(out, path, digest) -> int:
+    """Append the triangle records of one part; returns its triangle count."""
+    triangles = 0
+    with open(path, "rb") as f:
+        if is_binary_stl(path):
+            for records in _binary_records(f, digest, path):
+                out.write(records.tobytes())
+                triangles += len(records)
+        else:
+            try:
+                for vertices in _ascii_vertices(f, digest):
+                    records = np.zeros(len(vertices), dtype=_BINARY_RECORD)
+                    records["vertices"] = vertices
+                    records["normal"] = _facet_normals(vertices.astype(float))
+                    out.write(records.tobytes())
+                    triangles += len(records)
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}")
+    return triangles
+
+
+def _load_stamp(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_stamp(path: Path, stamp: Dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump(stamp, f, indent=2)
+
+
+def _unchanged(stamp, parts, output: Path, file_format: str) -> bool:
+    """True if output was written from parts with the same content."""
+    if not stamp or stamp.get("format") != file_format or not output.is_file():
+        return False
+    if stamp.get("output_size") != output.stat().st_size:
+        return False
+    previous = stamp.get("parts", [])
+    if [p["name"] for p in previous] != [p["name"] for p in parts]:
+        return False
+    if all(p["size"] == q["size"] and p["mtime_ns"] == q["mtime_ns"] for p, q in zip(parts, previous)):
+        return True
+    # Touched or copied, but possibly the same content
+    if any(p["size"] != q["size"] for p, q in zip(parts, previous)):
+        return False
+    return all(_file_digest(Path(p["path"])) == q["sha256"] for p, q in zip(parts, previous))
+
+
+def assemble_surfaces(tri_dir, patches: Sequence[str] = PATCHES, file_format: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write combined.stl from the patch surfaces of a case, unless it is up to date.
+
+    Args:
+        tri_dir: constant/triSurface of the case
+        patches: Patch names; <name>.stl must exist for each
+        file_format: "ascii" or "binary" (COMBINED["FORMAT"] by default)
+
+    Returns:
+        dict with path, format, triangles (per patch), skipped (True if the
+        existing file was kept)
+
+    Raises:
+        FileNotFoundError: If a patch surface is missing
+        ValueError: If a patch surface is empty or malformed
+    """
+    tri_dir = Path(tri_dir)
+    file_format = (file_format or COMBINED_SETTINGS["FORMAT"]).lower()
+    if file_format not in ("ascii", "binary"):
+        raise ValueError(f"Unknown STL format '{file_format}', expected 'ascii' or 'binary'")
+    output = tri_dir / COMBINED_SETTINGS["FILE"]
+    stamp_path = tri_dir / COMBINED_SETTINGS["STAMP_FILE"]
+
+    parts = []
+    for name in patches:
+        path = tri_dir / f"{name}.stl"
+        if not path.is_file():
+            raise FileNotFoundError(f"Patch surface not found: {path}")
+        stat = path.stat()
+        parts.append({"name": name, "path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+
+    stamp = _load_stamp(stamp_path)
+    if _unchanged(stamp, parts, output, file_format):
+        if any(p["mtime_ns"] != q["mtime_ns"] for p, q in zip(parts, stamp["parts"])):
+            # Same content: remember the new times so the next check is cheap again
+            for part, previous in zip(parts, stamp["parts"]):
+                previous["mtime_ns"] = part["mtime_ns"]
+            _save_stamp(stamp_path, stamp)
+        return {"path": str(output), "format": file_format, "skipped": True,
+                "triangles": {p["name"]: p["triangles"] for p in stamp["parts"]}}
+
+    tmp_path = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb", buffering=_BLOCK_SIZE) as out:
+            if file_format == "binary":
+                out.write(f"combined {' '.join(patches)}".encode()[:80].ljust(80, b" "))
+                out.write(struct.pack("<I", 0))
+            for part in parts:
+                digest = hashlib.sha256()
+                if file_format == "ascii":
+                    part["triangles"] = _write_ascii_part(out, part["path"], part["name"], digest)
+                else:
+                    part["triangles"] = _write_binary_part(out, part["path"], digest)
+                part["sha256"] = digest.hexdigest()
+                if not part["triangles"]:
+                    raise ValueError(f"{part['path']}: no triangles")
+            if file_format == "binary":
+                out.seek(80)
+                out.write(struct.pack("<I", sum(p["triangles"] for p in parts)))
+        os.replace(tmp_path, output)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    _save_stamp(stamp_path, {
+        "format": file_format,
+        "output_size": output.stat().st_size,
+        "parts": parts,
+    })
+    return {"path": str(output), "format": file_format, "skipped": False,
+            "triangles": {p["name"]: p["triangles"] for p in parts}}
+
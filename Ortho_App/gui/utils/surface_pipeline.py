@@ -0,0 +1,246 @@
+# gui/utils/surface_pipeline.py
+"""
+Airway surface (STL) from the predicted label map, as one VTK pipeline.
+
+create_stl used to call Update() after every filter and pass the result on
+with SetInputData, so every intermediate surface was kept in memory until
+the end, and a last vtkCleanPolyData ran whose output was never used. Here
+the filters are connected with SetInputConnection and nothing runs until
+the STL writer asks for its input; intermediate outputs are released as
+soon as the next filter has consumed them (ReleaseDataFlagOn).
+
+The chain:
+
+    NIfTI reader -> crop to the airway bounding box (+ CROP_MARGIN voxels)
+    [-> subsample (preview)] -> discrete flying edges [-> clean]
+    -> largest region -> Laplacian smoothing -> windowed sinc smoothing
+    -> IJK to RAS transform -> normals -> STL writer
+
+The crop only limits the extent that is contoured; the voxel coordinates
+are unchanged, so the surface is at the same place as without it. The
+second connectivity filter (after the transform) is gone: a transform does
+not change which triangles are connected.
+
+The smoothing settings come from SURFACE["PRESETS"] ("preview", "standard",
+"high"). The time spent in each filter is recorded through its StartEvent
+and EndEvent observers (a filter's upstream has always finished before its
+own StartEvent) and can be logged after the run.
+"""
+
+import time
+from typing import Dict, Optional
+
+import vtk
+
+from gui.config.settings import ANALYSIS_SETTINGS
+
+SURFACE_SETTINGS = ANALYSIS_SETTINGS["SEGMENTATION"]["SURFACE"]
+
+
+def surface_preset(name: Optional[str] = None) -> Dict:
+    """Settings of a quality preset (SURFACE["PRESET"] by default)."""
+    name = (name or SURFACE_SETTINGS["PRESET"]).lower()
+    try:
+        return SURFACE_SETTINGS["PRESETS"][name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown surface preset '{name}', expected one of {', '.join(SURFACE_SETTINGS['PRESETS'])}"
+        )
+
+
+class SurfacePipeline:
+    """Demand-driven label map -> airway surface pipeline."""
+
+    def __init__(self, nifti_path, preset: Optional[str] = None, bbox=None, threshold_value=1, logger=None):
+        """
+        Args:
+            nifti_path: Label map (.nii or .nii.gz)
+            preset: Quality preset name (SURFACE["PRESETS"])
+            bbox: Airway bounding box in NIfTI voxel indices, half-open
+                ((i0, i1), (j0, j1), (k0, k1)) as in label_stats; None
+                contours the whole volume
+            threshold_value: Label value of the airway
+            logger: Optional logger instance
+        """
+        self.nifti_path = str(nifti_path)
+        self.preset_name = (preset or SURFACE_SETTINGS["PRESET"]).lower()
+        self.preset = surface_preset(self.preset_name)
+        self.bbox = bbox
+        self.threshold_value = threshold_value
+        self.logger = logger
+        self.timings = {}
+        self._started = {}
+        self._stages = []
+        self._build()
+
+    def _log_info(self, message):
+        """Helper method to log info messages"""
+        if self.logger:
+            self.logger.log_info(message)
+        else:
+            print(f"INFO: {message}")
+
+    # ------------------------------------------------------------------
+    # Building the chain
+    # ------------------------------------------------------------------
+
+    def _add(self, name, algorithm, upstream=None):
+        """Connect algorithm after upstream and time its execution."""
+        if upstream is not None:
+            algorithm.SetInputConnection(upstream.GetOutputPort())
+        algorithm.AddObserver("StartEvent", lambda *_: self._started.__setitem__(name, time.perf_counter()))
+        algorithm.AddObserver("EndEvent", lambda *_: self._stop_timer(name))
+        self._stages.append((name, algorithm))
+        return algorithm
+
+    def _stop_timer(self, name):
+        started = self._started.pop(name, None)
+        if started is not None:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def _crop_extent(self, reader):
+        """VTK extent of the bounding box plus margin, or None to keep the whole volume."""
+        if self.bbox is None:
+            return None
+        reader.UpdateInformation()
+        whole = reader.GetOutputInformation(0).Get(vtk.vtkStreamingDemandDrivenPipeline.WHOLE_EXTENT())
+        margin = SURFACE_SETTINGS["CROP_MARGIN"]
+        (i0, i1), (j0, j1), (k0, k1) = self.bbox
+        if reader.GetQFac() < 0:
+            # The reader stores the slices in reverse order when qfac is -1
+            k0, k1 = whole[5] + 1 - k1, whole[5] + 1 - k0
+        extent = [i0 - margin, i1 - 1 + margin, j0 - margin, j1 - 1 + margin, k0 - margin, k1 - 1 + margin]
+        for axis in range(3):
+            extent[2 * axis] = max(extent[2 * axis], whole[2 * axis])
+            extent[2 * axis + 1] = min(extent[2 * axis + 1], whole[2 * axis + 1])
+        if reader.GetQFac() < 0:
+            # Asked for slices [a, b], the reader returns the file's slices
+            # [a, b] reversed rather than slices [a, b] of the reversed volume;
+            # the two agree only when the range is centered in the volume
+            last = whole[4] + whole[5]
+            extent[4], extent[5] = min(extent[4], last - extent[5]), max(extent[5], last - extent[4])
+        return extent
+
+    def _ijk_to_ras(self, reader):
+        """
+        QForm transform of the reader, adjusted for VTK's coordinate system.
+
+        Falls back to the SForm when the file has no qform (qform_code 0),
+        and to the reader's spacing alone when it has neither.
+        """
+        ijk_to_ras = vtk.vtkMatrix4x4()
+        matrix = reader.GetQFormMatrix() or reader.GetSFormMatrix()
+        if matrix is not None:
+            ijk_to_ras.DeepCopy(matrix)
+        flip_xy = vtk.vtkMatrix4x4()
+        flip_xy.SetElement(0, 0, -1)
+        flip_xy.SetElement(1, 1, -1)
+        vtk.vtkMatrix4x4.Multiply4x4(flip_xy, ijk_to_ras, ijk_to_ras)
+        transform = vtk.vtkTransform()
+        transform.SetMatrix(ijk_to_ras)
+        return transform
+
+    def _build(self):
+        preset = self.preset
+
+        reader = self._add("read", vtk.vtkNIFTIImageReader())
+        reader.SetFileName(self.nifti_path)
+        last = reader
+
+        extent = self._crop_extent(reader)
+        if extent is not None:
+            crop = self._add("crop", vtk.vtkExtractVOI(), last)
+            crop.SetVOI(*extent)
+            last = crop
+
+        if preset["SAMPLE_RATE"] > 1:
+            # Nearest voxel, no averaging: the labels must stay labels
+            shrink = self._add("subsample", vtk.vtkImageShrink3D(), last)
+            shrink.SetShrinkFactors(*(preset["SAMPLE_RATE"],) * 3)
+            shrink.AveragingOff()
+            last = shrink
+
+        contour = self._add("contour", vtk.vtkDiscreteFlyingEdges3D(), last)
+        contour.SetValue(0, self.threshold_value)
+        last = contour
+
+        if preset["CLEAN"]:
+            cleaner = self._add("clean", vtk.vtkCleanPolyData(), last)
+            cleaner.SetTolerance(0.0001)
+            cleaner.ConvertLinesToPointsOff()
+            cleaner.ConvertPolysToLinesOff()
+            cleaner.ConvertStripsToPolysOff()
+            cleaner.PointMergingOn()
+            last = cleaner
+
+        # Keep the airway only (closed, manifold)
+        connectivity = self._add("largest_region", vtk.vtkPolyDataConnectivityFilter(), last)
+        connectivity.SetExtractionModeToLargestRegion()
+        last = connectivity
+
+        if preset["LAPLACIAN_ITERATIONS"]:
+            smoothing = self._add("laplacian", vtk.vtkSmoothPolyDataFilter(), last)
+            smoothing.SetNumberOfIterations(preset["LAPLACIAN_ITERATIONS"])
+            smoothing.SetRelaxationFactor(0.2)
+            smoothing.FeatureEdgeSmoothingOff()
+            smoothing.BoundarySmoothingOn()
+            last = smoothing
+
+        if preset["SINC_ITERATIONS"]:
+            sinc = self._add("windowed_sinc", vtk.vtkWindowedSincPolyDataFilter(), last)
+            sinc.SetNumberOfIterations(preset["SINC_ITERATIONS"])
+            sinc.FeatureEdgeSmoothingOff()
+            sinc.SetFeatureAngle(60)
+            sinc.SetPassBand(preset["PASS_BAND"])
+            sinc.SetBoundarySmoothing(True)
+            last = sinc
+
+        # The QForm matrix is header information, available before any data is read
+        reader.UpdateInformation()
+        transform = self._add("transform", vtk.vtkTransformPolyDataFilter(), last)
+        transform.SetTransform(self._ijk_to_ras(reader))
+        last = transform
+
+        normals = self._add("normals", vtk.vtkPolyDataNormals(), last)
+        normals.SetFeatureAngle(60.0)
+        normals.ConsistencyOn()
+        normals.SplittingOff()
+        normals.AutoOrientNormalsOn()
+
+        # Free each intermediate result once the next filter has used it
+        for _name, algorithm in self._stages[:-1]:
+            algorithm.ReleaseDataFlagOn()
+        self.output = normals
+
+    # ------------------------------------------------------------------
+    # Running
+    # ------------------------------------------------------------------
+
+    def write_stl(self, stl_path):
+        """
+        Run the pipeline and write a binary STL.
+
+        Returns:
+            The surface (vtkPolyData, mm, consistent outward normals)
+        """
+        writer = vtk.vtkSTLWriter()
+        writer.SetFileTypeToBinary()
+        writer.SetFileName(str(stl_path))
+        writer.SetInputConnection(self.output.GetOutputPort())
+        self._add("write", writer)
+        writer.Write()
+        return self.output.GetOutput()
+
+    def update(self):
+        """Run the pipeline without writing; returns the surface."""
+        self.output.Update()
+        return self.output.GetOutput()
+
+    def log_timings(self):
+        """One log line with the time spent in every filter."""
+        total = sum(self.timings.values())
+        parts = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.timings.items())
+        polydata = self.output.GetOutput()
+        self._log_info(
+            f"Surface ({self.preset_name}): {polydata.GetNumberOfPolys()} triangles in {total:.2f} s ({parts})"
+        )
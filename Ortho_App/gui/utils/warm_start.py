@@ -0,0 +1,310 @@
+# gui/utils/warm_start.py
+"""
+Warm start of simpleFoam from another flow rate of the same patient.
+
+A new flow rate normally starts from the template's uniform fields
+(internalField uniform (0 0 0) in 0/U). When a finished case with the same
+mesh (same mesh cache key) exists, e.g. CFD_10_0 when CFD_12_0 is requested,
+its latest U, p, k, omega and nut are copied into the new case's 0/ folder,
+scaled to the new flow rate r = Q_new / Q_old:
+
+    U * r, p * r^2, k * r^2, omega * r, nut * r    (WARM_START["SCALING"])
+
+Values are scaled around the template's uniform internalField when it has
+one, so p (kinematic, referenced to the inlet total pressure p0) keeps its
+reference level and only the pressure differences are scaled.
+
+Only the internalField is replaced. The boundary conditions of the new case
+are kept, including the inlet values that use $internalField; those now
+refer to the template value under another keyword (TEMPLATE_KEY). The
+meshes are identical, so the cell values are copied as they are, without
+interpolation.
+
+Before every run the fields are restored from 0.orig/, so a case that was
+warm started once can still be re-run from the template fields.
+"""
+
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from .convergence import converged_time
+from .mesh_cache import compute_mesh_key
+
+WARM_START_SETTINGS = ANALYSIS_SETTINGS["CFD"]["WARM_START"]
+
+# Keyword the template's internalField is kept under (for $internalField in boundaryField)
+TEMPLATE_KEY = "templateInternalField"
+
+_COMPONENTS = {"scalar": 1, "vector": 3, "symmTensor": 6, "tensor": 9}
+_NONUNIFORM = re.compile(rb"internalField\s+nonuniform\s+List<(\w+)>\s+(\d+)\s*\(")
+_UNIFORM = re.compile(rb"internalField\s+uniform\s+([^;#]+);")
+_ENTRY_START = re.compile(r"^internalField\b", re.MULTILINE)
+_FORMAT = re.compile(rb"^\s*format\s+(\w+)\s*;", re.MULTILINE)
+_ARCH_SCALAR = re.compile(rb'arch\s+"[^"]*scalar=(\d+)')
+_N_CELLS = re.compile(rb"nCells:\s*(\d+)")
+
+
+def _log(logger, level: str, message: str):
+    if logger:
+        getattr(logger, f"log_{level}", logger.log_info)(message)
+    else:
+        print(f"{level.upper()}: {message}")
+
+
+# --------------------------------------------------------------------------
+# Reading and writing OpenFOAM fields
+# --------------------------------------------------------------------------
+
+def read_internal_field(path) -> Tuple[np.ndarray, int]:
+    """
+    Cell values of a volField file written by OpenFOAM (ascii or binary).
+
+    Returns:
+        (values, n_components): values has shape (n_cells, n_components), or
+        (1, n_components) for a uniform field
+    """
+    data = Path(path).read_bytes()
+
+    match = _NONUNIFORM.search(data)
+    if match:
+        n_components = _COMPONENTS[match.group(1).decode()]
+        count = int(match.group(2))
+        start = match.end()
+        format_match = _FORMAT.search(data)
+        if format_match and format_match.group(1) == b"binary":
+            arch = _ARCH_SCALAR.search(data)
+            dtype = "<f4" if arch and arch.group(1) == b"32" else "<f8"
+            n_bytes = count * n_components * np.dtype(dtype).itemsize
+            values = np.frombuffer(data[start:start + n_bytes], dtype=dtype).astype(float)
+        else:
+            end = re.compile(rb"\)\s*;").search(data, start).start()
+            text = data[start:end].replace(b"(", b" ").replace(b")", b" ")
+            values = np.array(text.split(), dtype=float)
+        if values.size != count * n_components:
+            raise ValueError(f"{path}: expected {count} values, read {values.size // n_components}")
+        return values.reshape(count, n_components), n_components
+
+    match = _UNIFORM.search(data)
+    if match:
+        text = match.group(1).replace(b"(", b" ").replace(b")", b" ")
+        values = np.array(text.split(), dtype=float)
+        return values.reshape(1, -1), values.size
+
+    raise ValueError(f"{path}: no internalField found")
+
+
+def _entry_end(text: str, start: int) -> int:
+    """Index just past the ';' that ends the dictionary entry starting at start."""
+    depth = 0
+    for index in range(start, len(text)):
+        char = text[index]
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        elif char == ";" and depth == 0:
+            return index + 1
+    raise ValueError("Unterminated internalField entry")
+
+
+def _format_values(values: np.ndarray) -> str:
+    """ascii List<scalar|vector|...> body, one cell per line."""
+    if values.shape[1] == 1:
+        return "\n".join(f"{v:.8g}" for v in values[:, 0])
+    return "\n".join("(" + " ".join(f"{v:.8g}" for v in row) + ")" for row in values)
+
+
+def write_internal_field(template_path, target_path, values: np.ndarray):
+    """
+    Write template_path to target_path with a nonuniform internalField.
+
+    The template's own internalField entry is kept under TEMPLATE_KEY and
+    $internalField references are pointed at it, so boundary values derived
+    from it (e.g. the inlet k and omega) are unchanged.
+    """
+    text = Path(template_path).read_text()
+    match = _ENTRY_START.search(text)
+    if not match:
+        raise ValueError(f"{template_path}: no internalField entry")
+    end = _entry_end(text, match.end())
+
+    kind = {1: "scalar", 3: "vector", 6: "symmTensor", 9: "tensor"}[values.shape[1]]
+    original = TEMPLATE_KEY + text[match.end():end]
+    mapped = (f"internalField   nonuniform List<{kind}>\n{len(values)}\n(\n"
+              f"{_format_values(values)}\n)\n;")
+    tail = re.sub(r"\$internalField\b", f"${TEMPLATE_KEY}", text[end:])
+
+    tmp_path = f"{target_path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text[:match.start()] + original + "\n\n" + mapped + tail)
+    os.replace(tmp_path, target_path)
+
+
+def _reference_value(template_path) -> np.ndarray:
+    """The template's uniform internalField, or 0 (e.g. for #codeStream values)."""
+    try:
+        values, _ = read_internal_field(template_path)
+    except (OSError, ValueError):
+        return np.zeros(1)
+    return values[0] if len(values) == 1 else np.zeros(1)
+
+
+def _mesh_cell_count(case_dir) -> Optional[int]:
+    """nCells from the header of constant/polyMesh/owner."""
+    owner = Path(case_dir) / "constant" / "polyMesh" / "owner"
+    try:
+        with open(owner, "rb") as f:
+            header = f.read(4096)
+    except OSError:
+        return None
+    match = _N_CELLS.search(header)
+    return int(match.group(1)) if match else None
+
+
+# --------------------------------------------------------------------------
+# Finding a source case
+# --------------------------------------------------------------------------
+
+def _end_time(case_dir) -> Optional[float]:
+    try:
+        text = (Path(case_dir) / "system" / "controlDict").read_text()
+    except OSError:
+        return None
+    match = re.search(r"^\s*endTime\s+([0-9eE+\-.]+)\s*;", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def completed_time_dir(case_dir) -> Optional[Path]:
+    """Latest time folder of a finished run (endTime or converged early), else None."""
+    latest = None
+    for entry in Path(case_dir).iterdir():
+        try:
+            value = float(entry.name)
+        except ValueError:
+            continue
+        if value > 0 and entry.is_dir() and (latest is None or value > latest[0]):
+            latest = (value, entry)
+    end_time = _end_time(case_dir)
+    if latest is None or end_time is None:
+        return None
+    stopped_at = converged_time(case_dir)
+    if stopped_at is not None:
+        end_time = min(end_time, stopped_at)
+    if latest[0] + 1e-6 < end_time or not (latest[1] / "U").is_file():
+        return None
+    return latest[1]
+
+
+def _sibling_cases(case_dir) -> Iterable[Tuple[float, Path]]:
+    """(flow rate, case folder) of the other CFD_<rate> folders of the patient."""
+    # Imported here: cfd_sweep imports legacy_cfd_runner, which imports this module
+    from .cfd_sweep import flow_rate_from_dirname
+
+    case_dir = Path(case_dir)
+    for entry in case_dir.parent.iterdir():
+        flow_rate = flow_rate_from_dirname(entry.name)
+        if flow_rate is not None and entry.is_dir() and entry.resolve() != case_dir.resolve():
+            yield flow_rate, entry
+
+
+def find_source(case_dir, flow_rate: float, mesh_key: str,
+                candidates: Optional[Iterable[Tuple[float, Path]]] = None):
+    """
+    Nearest finished flow rate with the same mesh.
+
+    Args:
+        case_dir: The case about to run
+        flow_rate: Its flow rate (LPM)
+        mesh_key: Its mesh cache key
+        candidates: (flow rate, case folder) pairs to consider; defaults to
+            the other CFD_<rate> folders next to case_dir
+
+    Returns:
+        (flow_rate, time_dir) of the source, or None
+    """
+    if candidates is None:
+        candidates = _sibling_cases(case_dir)
+    best = None
+    for source_rate, source_dir in candidates:
+        if source_rate <= 0 or Path(source_dir).resolve() == Path(case_dir).resolve():
+            continue
+        if best is not None and abs(source_rate - flow_rate) >= abs(best[0] - flow_rate):
+            continue
+        time_dir = completed_time_dir(source_dir)
+        if time_dir is None or compute_mesh_key(source_dir) != mesh_key:
+            continue
+        best = (source_rate, time_dir)
+    return best
+
+
+# --------------------------------------------------------------------------
+# Entry point
+# --------------------------------------------------------------------------
+
+def restore_initial_fields(case_dir):
+    """Put the template fields back into 0/ (undoes an earlier warm start)."""
+    original_dir = Path(case_dir) / WARM_START_SETTINGS["ORIGINAL_DIR"]
+    if not original_dir.is_dir():
+        return
+    for original in original_dir.iterdir():
+        shutil.copy2(original, Path(case_dir) / "0" / original.name)
+
+
+def warm_start(case_dir, flow_rate: float, mesh_key: Optional[str], logger=None,
+               candidates: Optional[Iterable[Tuple[float, Path]]] = None) -> Optional[float]:
+    """
+    Initialise 0/ of case_dir from the nearest finished flow rate on the same mesh.
+
+    Call after the cached mesh is linked into the case and before the solve
+    stage. Does nothing (beyond restoring the template fields) when disabled
+    or when no source case exists.
+
+    Returns:
+        The source flow rate, or None if the case starts from the template fields
+    """
+    restore_initial_fields(case_dir)
+    if not WARM_START_SETTINGS["ENABLED"] or not mesh_key:
+        return None
+
+    source = find_source(case_dir, flow_rate, mesh_key, candidates)
+    if source is None:
+        return None
+    source_rate, time_dir = source
+    ratio = flow_rate / source_rate
+    n_cells = _mesh_cell_count(case_dir)
+
+    zero_dir = Path(case_dir) / "0"
+    original_dir = Path(case_dir) / WARM_START_SETTINGS["ORIGINAL_DIR"]
+    mapped = {}
+    try:
+        for field, exponent in WARM_START_SETTINGS["SCALING"].items():
+            source_file, target_file = time_dir / field, zero_dir / field
+            if not source_file.is_file() or not target_file.is_file():
+                continue
+            values, _ = read_internal_field(source_file)
+            if n_cells is not None and len(values) != n_cells:
+                raise ValueError(f"{source_file} has {len(values)} cells, the mesh has {n_cells}")
+            reference = _reference_value(target_file)
+            mapped[field] = reference + (values - reference) * ratio ** exponent
+    except (OSError, ValueError, KeyError) as e:
+        _log(logger, "warning", f"Warm start from {time_dir} skipped: {e}")
+        return None
+    if not mapped:
+        return None
+
+    original_dir.mkdir(exist_ok=True)
+    for field, values in mapped.items():
+        original = original_dir / field
+        if not original.exists():
+            shutil.copy2(zero_dir / field, original)
+        write_internal_field(original, zero_dir / field, values)
+
+    _log(logger, "info",
+         f"Warm start: {', '.join(mapped)} from {time_dir} ({source_rate:g} LPM, scale {ratio:.3f})")
+    return source_rate
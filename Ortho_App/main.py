@@ -28,7 +28,7 @@
 #     instantiates OrthoCFDApp(), binds the window close event to on_closing(), and starts app.mainloop().
 
 # on_closing(app):  
-#     Deletes all files in the 'temp' directory, logs a closing banner with timestamp, and calls app.destroy().
+#     Stops the nnUNet worker, logs a closing banner with timestamp, and calls app.destroy().
 
 # if __name__ == "__main__":  
 #     Initializes AppLogger, sets sys.excepthook to handle_exception, logs a startup banner with timestamp,  
@@ -43,6 +43,7 @@ import tkinter as tk
 from tkinter import messagebox
 from gui.app import OrthoCFDApp
 from gui.utils.basic_utils import AppLogger
+from gui.utils.nnunet_worker import shutdown_worker
 from gui.config.settings import APP_SETTINGS, UI_SETTINGS , PATH_SETTINGS, EXTERNAL_APPS
 
 def setup_environment():
@@ -147,6 +148,9 @@ def on_closing(app):
         #             except Exception as e:
         #                 logger.log_warning(f"Error deleting temp file {path}: {e}")
 
+        # Stop the background nnUNet predictor, if one was started
+        shutdown_worker()
+
         # Log application close
         logger.log_info("=" * 50)
         logger.log_info(f"{APP_SETTINGS['TITLE']} Application closing - {datetime.now()}")
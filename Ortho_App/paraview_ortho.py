@@ -9,8 +9,11 @@
 # cmd opens gui = paraview --script=home/uday/Desktop/msc_ortho/paraview_ortho.py
 # cmd for local = pvbatch paraview_ortho.py
 # cmd for server no GUI = pvpython paraview_ortho.py
+# arguments: --case <CFD case folder> (without it the folder is read from sdir.txt)
 
+import argparse
 import paraview
+import sys
 import time
 import os
 
@@ -24,9 +27,15 @@ paraview.simple._DisableFirstRenderCameraReset()
 start_time = time.time()
 
 # Open case.foam file
-file = open("sdir.txt", "r")
-path1 = os.path.expandvars(os.path.expanduser(file.readline().strip()))
-file.close()
+parser = argparse.ArgumentParser(prog="paraview_ortho.py")
+parser.add_argument("--case", help="CFD case folder with case.foam")
+args, _ = parser.parse_known_args([a for a in sys.argv[1:] if a != "--"])
+if args.case:
+    path1 = os.path.expandvars(os.path.expanduser(args.case.strip()))
+else:
+    file = open("sdir.txt", "r")
+    path1 = os.path.expandvars(os.path.expanduser(file.readline().strip()))
+    file.close()
 path111 = os.path.join(path1, "case.foam")
 path22 = os.path.join(path1, "system/face_centers_i.txt")
 
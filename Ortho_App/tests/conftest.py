@@ -0,0 +1,9 @@
+# tests/conftest.py
+"""Make the application packages (gui, ...) importable when pytest runs from anywhere."""
+
+import sys
+from pathlib import Path
+
+APP_ROOT = Path(__file__).resolve().parents[1]
+if str(APP_ROOT) not in sys.path:
+    sys.path.insert(0, str(APP_ROOT))
@@ -0,0 +1,56 @@
+# tests/test_blender_manifest.py
+"""Reading the completion manifest of the geometry engine."""
+
+import json
+
+import pytest
+
+pytest.importorskip("tkinter")
+
+from gui.utils.blender_processor import GEOMETRY_SETTINGS, BlenderProcessor
+
+
+class _Logger:
+    def __init__(self):
+        self.lines = []
+
+    def log_info(self, message):
+        self.lines.append(message)
+
+    log_error = log_info
+
+
+def _write_manifest(case, triangles=None, missing=()):
+    triangles = triangles or {"inlet": 12, "outlet": 30, "wall": 900}
+    files = {}
+    for name in triangles:
+        path = case / "constant" / "triSurface" / f"{name}.stl"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if name not in missing:
+            path.write_text(f"solid {name}\nendsolid {name}\n")
+        files[name] = str(path)
+    manifest = {"engine": "blender", "files": files, "triangles": triangles,
+                "timings": {"import": 0.5, "cuts": 1.0}}
+    (case / GEOMETRY_SETTINGS["MANIFEST_FILE"]).write_text(json.dumps(manifest))
+    return manifest
+
+
+def test_complete_manifest(tmp_path):
+    logger = _Logger()
+    written = _write_manifest(tmp_path)
+    manifest, error = BlenderProcessor(logger=logger)._read_manifest(str(tmp_path))
+    assert error is None and manifest == written
+    assert logger.lines == ["Geometry manifest (blender): inlet 12, outlet 30, wall 900 triangles, 1.50 s"]
+
+
+@pytest.mark.parametrize("setup, message", [
+    (lambda case: None, "finished without writing"),
+    (lambda case: (case / GEOMETRY_SETTINGS["MANIFEST_FILE"]).write_text("{\"files\": "), "Could not read"),
+    (lambda case: _write_manifest(case, missing=("outlet",)), "outlet.stl listed in the manifest was not found"),
+    (lambda case: _write_manifest(case, triangles={"inlet": 12, "outlet": 30, "wall": 0}), "wall.stl has no triangles"),
+])
+def test_incomplete_manifest(tmp_path, setup, message):
+    setup(tmp_path)
+    manifest, error = BlenderProcessor(logger=_Logger())._read_manifest(str(tmp_path))
+    assert manifest is None
+    assert message in error
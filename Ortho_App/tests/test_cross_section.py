@@ -0,0 +1,111 @@
+# tests/test_cross_section.py
+"""Exact cross-sectional areas of closed surfaces (cylinders, a sphere)."""
+
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+vtk = pytest.importorskip("vtk")
+
+from gui.utils.cross_section import csa_profile, minimum_csa, section_areas, polydata_arrays, write_csa_outputs
+
+RESOLUTION = 128
+
+
+def _polygon_area(radius, sides=RESOLUTION):
+    """Area of the regular polygon a cylinder source has as its section."""
+    return 0.5 * sides * radius ** 2 * math.sin(2 * math.pi / sides)
+
+
+def _surface(source, rotate_x=0.0, translate=(0.0, 0.0, 0.0)):
+    """Triangulated output of a source, rotated about x (degrees) and moved."""
+    transform = vtk.vtkTransform()
+    transform.Translate(*translate)
+    transform.RotateX(rotate_x)
+    moved = vtk.vtkTransformPolyDataFilter()
+    moved.SetInputConnection(source.GetOutputPort())
+    moved.SetTransform(transform)
+    triangles = vtk.vtkTriangleFilter()
+    triangles.SetInputConnection(moved.GetOutputPort())
+    triangles.Update()
+    return triangles.GetOutput()
+
+
+def _cylinder(radius=5.0, height=40.0, **placement):
+    """Closed cylinder; the source's axis is y, rotate_x=90 puts it along z."""
+    source = vtk.vtkCylinderSource()
+    source.SetRadius(radius)
+    source.SetHeight(height)
+    source.SetResolution(RESOLUTION)
+    source.CappingOn()
+    return _surface(source, **placement)
+
+
+def test_cylinder_csa_is_pi_r_squared():
+    profile = csa_profile(_cylinder(rotate_x=90.0), n_stations=50, axis="z")
+
+    assert len(profile["area"]) == 50
+    assert np.allclose(profile["area"], _polygon_area(5.0), rtol=1e-5)
+    assert np.allclose(profile["area"], math.pi * 25.0, rtol=2e-3)
+    assert np.allclose(profile["axis"], [0.0, 0.0, 1.0])
+
+
+def test_principal_axis_follows_a_tilted_cylinder():
+    # The source's y axis rotated by 60 degrees about x
+    profile = csa_profile(_cylinder(height=60.0, rotate_x=60.0), n_stations=40, axis="principal")
+
+    expected = np.array([0.0, math.cos(math.radians(60.0)), math.sin(math.radians(60.0))])
+    assert abs(profile["axis"] @ expected) == pytest.approx(1.0, abs=1e-6)
+    assert np.allclose(profile["area"][2:-2], _polygon_area(5.0), rtol=1e-5)
+
+
+def test_separate_lumens_are_added():
+    append = vtk.vtkAppendPolyData()
+    append.AddInputData(_cylinder(radius=3.0, rotate_x=90.0))
+    append.AddInputData(_cylinder(radius=4.0, rotate_x=90.0, translate=(20.0, 0.0, 0.0)))
+    append.Update()
+    points, triangles = polydata_arrays(append.GetOutput())
+
+    areas = section_areas(points, triangles, [0.0, 0.0, 1.0], np.linspace(-15.0, 15.0, 7))
+
+    assert np.allclose(areas, _polygon_area(3.0) + _polygon_area(4.0), rtol=1e-5)
+
+
+def test_sphere_sections_follow_the_circle_area():
+    sphere = vtk.vtkSphereSource()
+    sphere.SetRadius(10.0)
+    sphere.SetThetaResolution(256)
+    sphere.SetPhiResolution(256)
+    points, triangles = polydata_arrays(_surface(sphere))
+    heights = np.array([-6.0, -3.0, 0.0, 4.0, 8.0])
+
+    areas = section_areas(points, triangles, [0.0, 0.0, 1.0], heights)
+
+    assert np.allclose(areas, math.pi * (100.0 - heights ** 2), rtol=1e-2)
+
+
+def test_no_section_outside_the_surface():
+    points, triangles = polydata_arrays(_cylinder(rotate_x=90.0))
+    assert np.all(section_areas(points, triangles, [0.0, 0.0, 1.0], [-30.0, 30.0]) == 0.0)
+
+
+def test_minimum_csa_skips_the_ends():
+    profile = {
+        "position": np.arange(10, dtype=float),
+        "area": np.array([0.1, 0.5, 5.0, 4.0, 2.0, 3.0, 4.0, 5.0, 0.2, 0.0]),
+        "axis": np.array([0.0, 0.0, 1.0]),
+    }
+    assert minimum_csa(profile, end_margin=0.2) == (2.0, 4.0)
+    assert minimum_csa(profile, end_margin=0.0) == (0.1, 0.0)
+
+
+def test_write_csa_outputs(tmp_path):
+    profile = csa_profile(_cylinder(rotate_x=90.0), n_stations=20, axis="z")
+
+    min_area = write_csa_outputs(profile, tmp_path)
+
+    assert min_area == pytest.approx(_polygon_area(5.0))
+    assert (tmp_path / "min_csa.txt").read_text().startswith(f"Min CSA: {min_area:.2f} mm²")
+    rows = (tmp_path / "csa_profile.csv").read_text().splitlines()
+    assert rows[0] == "position_mm,area_mm2" and len(rows) == 21
@@ -0,0 +1,100 @@
+# tests/test_decomposition.py
+"""Subdomain counts for the parallel phases of a case."""
+
+import shutil
+from pathlib import Path
+
+import pytest
+
+from gui.utils import decomposition
+from gui.utils.decomposition import (DECOMPOSITION_SETTINGS, MIN_PARALLEL_SUBDOMAINS, cell_count_for_phase,
+                                     choose_subdomains, decompose_for_phase, write_number_of_subdomains)
+
+TEMPLATE = Path(__file__).resolve().parents[1] / "data" / "Master_cfd_file"
+
+
+@pytest.fixture
+def case(tmp_path):
+    """The template's system folder and empty logs."""
+    shutil.copytree(TEMPLATE / "system", tmp_path / "system")
+    return tmp_path
+
+
+def _write_owner(case, cells):
+    owner = case / "constant" / "polyMesh" / "owner"
+    owner.parent.mkdir(parents=True)
+    owner.write_text('FoamFile\n{\n    note "nPoints:10 nCells:%d nFaces:30 nInternalFaces:5";\n}\n' % cells)
+
+
+def test_cell_counts_per_phase(case):
+    (case / "log.blockMesh").write_text("Mesh Information\n  nPoints: 1331\n  nCells: 1000\n")
+    (case / "log.snappyHexMesh1").write_text("Snapped mesh : cells:120000  faces:360000\n")
+    assert cell_count_for_phase(case, "snappy1") == 1000
+    assert cell_count_for_phase(case, "snappy2") == 120000
+    assert cell_count_for_phase(case, "solve") == 120000
+    _write_owner(case, 240000)
+    assert cell_count_for_phase(case, "solve") == 240000
+
+
+def test_subdomains_follow_the_cell_count(case):
+    _write_owner(case, 240000)
+    per_rank = DECOMPOSITION_SETTINGS["CELLS_PER_RANK"]["solve"]
+    assert choose_subdomains(case, "solve", max_ranks=64) == -(-240000 // per_rank)
+    assert choose_subdomains(case, "solve", max_ranks=3) == 3
+
+
+def test_never_fewer_than_two_subdomains(case, monkeypatch):
+    monkeypatch.setitem(DECOMPOSITION_SETTINGS, "MIN_SUBDOMAINS", 1)
+    _write_owner(case, 10)
+    assert choose_subdomains(case, "solve", max_ranks=1) == MIN_PARALLEL_SUBDOMAINS
+    assert choose_subdomains(case, "solve", max_ranks=8) == MIN_PARALLEL_SUBDOMAINS
+
+    # Without a cell count every allowed core is used, but still at least two
+    monkeypatch.setattr(decomposition, "available_cores", lambda: [0])
+    assert choose_subdomains(case, "snappy2") == MIN_PARALLEL_SUBDOMAINS
+
+
+def test_unknown_phase(case):
+    with pytest.raises(ValueError, match="Unknown decomposition phase"):
+        choose_subdomains(case, "reconstruct")
+
+
+def test_decompose_for_phase_rewrites_the_dict(case, monkeypatch):
+    monkeypatch.setitem(DECOMPOSITION_SETTINGS, "AUTO", True)
+    _write_owner(case, 240000)
+    n_subdomains = decompose_for_phase(case, "solve", max_ranks=16)
+    text = (case / "system" / "decomposeParDict").read_text()
+    assert f"numberOfSubdomains {n_subdomains};" in " ".join(text.split())
+
+    monkeypatch.setitem(DECOMPOSITION_SETTINGS, "AUTO", False)
+    assert decompose_for_phase(case, "solve", max_ranks=16) is None
+
+
+def test_dict_without_subdomain_count(case):
+    (case / "system" / "decomposeParDict").write_text("method scotch;\n")
+    with pytest.raises(ValueError, match="numberOfSubdomains not found"):
+        write_number_of_subdomains(case, 4)
+
+
+def test_final_mesh_estimate_uses_the_highest_refinement_level(case):
+    (case / "log.blockMesh").write_text("  nCells: 1000\n")
+    # The templates refine to level 2 ("levels ((1.0 2));")
+    assert cell_count_for_phase(case, "pipeline") == 1000 * 8 ** 2
+
+    # Backup files and commented-out entries are ignored
+    (case / "system" / "snappyHexMeshDict~").write_text("level 9;\n")
+    dict_path = case / "system" / "snappyHexMeshDict1"
+    dict_path.write_text(dict_path.read_text() + "\n// level 7;\n/* levels ((1.0 6)); */\nlevel (1 3);\n")
+    assert cell_count_for_phase(case, "pipeline") == 1000 * 8 ** 3
+
+
+def test_final_mesh_estimate_is_capped_by_max_global_cells(case):
+    (case / "log.blockMesh").write_text("  nCells: 1000000\n")
+    assert cell_count_for_phase(case, "pipeline") == 20000000
+    per_rank = DECOMPOSITION_SETTINGS["CELLS_PER_RANK"]["pipeline"]
+    assert choose_subdomains(case, "pipeline", max_ranks=1000) == 20000000 // per_rank
+
+
+def test_final_mesh_estimate_needs_the_background_mesh(case):
+    assert cell_count_for_phase(case, "pipeline") is None
+    assert choose_subdomains(case, "pipeline", max_ranks=6) == 6
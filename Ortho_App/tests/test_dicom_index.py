@@ -0,0 +1,111 @@
+# tests/test_dicom_index.py
+"""Header-only DICOM series index: grouping, slice order and the saved index."""
+
+import json
+import shutil
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pydicom = pytest.importorskip("pydicom")
+
+from pydicom.dataset import FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from gui.utils import dicom_index as index_module
+from gui.utils.dicom_index import INDEX_SETTINGS, dicom_index, main_series, read_header, series_files
+
+
+def _write_slice(path, series_uid, z, instance, rows=32):
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = CTImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = pydicom.Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.SeriesInstanceUID = series_uid
+    ds.Modality = "CT"
+    ds.PatientName = "Test^Patient"
+    ds.InstanceNumber = instance
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.ImagePositionPatient = [0.0, 0.0, z]
+    ds.PixelSpacing = [0.3, 0.3]
+    ds.Rows = ds.Columns = rows
+    ds.BitsAllocated = ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 1
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.PixelData = np.zeros((rows, rows), dtype=np.int16).tobytes()
+    ds.save_as(str(path), enforce_file_format=True)
+    return path
+
+
+@pytest.fixture
+def scan(tmp_path):
+    """Five slices of one series, written out of order, plus two of another series."""
+    folder = tmp_path / "scan"
+    folder.mkdir()
+    cbct = generate_uid()
+    # Instance numbers run against the positions: the positions decide
+    for name, z, instance in [("c", 0.6, 1), ("a", 0.0, 5), ("e", 1.2, 0), ("b", 0.3, 4), ("d", 0.9, 2)]:
+        _write_slice(folder / f"IMG_{name}", cbct, z, instance)
+    scout = generate_uid()
+    for i in range(2):
+        _write_slice(folder / f"SCOUT_{i}", scout, float(i), i + 1)
+    (folder / "notes.txt").write_text("not an image")
+    (folder / "junk").write_bytes(b"\0" * 4096)
+    index_module._memory_cache.clear()
+    yield folder
+    index_module._memory_cache.clear()
+
+
+def test_read_header_skips_files_that_are_not_images(scan):
+    assert read_header(scan / "junk") is None
+    header = read_header(scan / "IMG_a")
+    assert header["position"] == [0.0, 0.0, 0.0]
+    assert header["Modality"] == "CT"
+
+
+def test_series_are_grouped_and_sorted_by_position(scan):
+    index = dicom_index(scan)
+    assert [len(series["files"]) for series in index["series"]] == [5, 2]
+
+    main = main_series(index)
+    assert [p.rsplit("_", 1)[1] for p in main["files"]] == ["a", "b", "c", "d", "e"]
+    assert main["info"]["SliceSpacing"] == pytest.approx(0.3)
+    assert main["info"]["PatientName"] == "Test^Patient"
+
+
+def test_saved_index_lists_file_names(scan):
+    dicom_index(scan)
+    saved = json.loads((scan / INDEX_SETTINGS["FILE"]).read_text())
+    assert "folder" not in saved
+    assert saved["series"][0]["files"] == ["IMG_a", "IMG_b", "IMG_c", "IMG_d", "IMG_e"]
+
+
+def test_saved_index_is_reused(scan, monkeypatch):
+    expected = series_files(scan)
+    index_module._memory_cache.clear()
+    monkeypatch.setattr(index_module, "read_header", lambda path: pytest.fail("headers read again"))
+    assert series_files(scan) == expected
+
+
+def test_moved_folder_resolves_to_its_new_location(scan, tmp_path, monkeypatch):
+    dicom_index(scan)
+    moved = tmp_path / "moved"
+    shutil.copytree(scan, moved, copy_function=shutil.copy2)
+    shutil.rmtree(scan)
+    index_module._memory_cache.clear()
+    monkeypatch.setattr(index_module, "read_header", lambda path: pytest.fail("headers read again"))
+
+    files = series_files(moved)
+    assert files == [str(moved / f"IMG_{name}") for name in "abcde"]
+
+
+def test_changed_folder_is_indexed_again(scan):
+    dicom_index(scan)
+    (scan / "IMG_e").unlink()
+    assert len(series_files(scan)) == 4
@@ -0,0 +1,100 @@
+# tests/test_geometry_engine.py
+"""In-process inlet/outlet/wall cuts (engine="vtk") on synthetic surfaces."""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+vtk = pytest.importorskip("vtk")
+from vtk.util import numpy_support
+
+from gui.utils.geometry_engine import CutBox, GeometryEngine, _pieces, cap_faces
+
+
+def _two_spheres():
+    """Two disjoint spheres of radius 8 centered at x = 20 and x = 60."""
+    append = vtk.vtkAppendPolyData()
+    for center_x in (20.0, 60.0):
+        sphere = vtk.vtkSphereSource()
+        sphere.SetCenter(center_x, 0.0, 0.0)
+        sphere.SetRadius(8.0)
+        sphere.SetThetaResolution(32)
+        sphere.SetPhiResolution(32)
+        sphere.Update()
+        append.AddInputData(sphere.GetOutput())
+    append.Update()
+    return append.GetOutput()
+
+
+def _write_airway_stl(path):
+    """
+    Closed voxel airway: two nostril tubes along y (front at y = 2) joined
+    to a vertical pharynx tube at the back, 1 mm voxels.
+    """
+    nx, ny, nz = 50, 64, 72
+    x, y, z = np.meshgrid(np.arange(nx), np.arange(ny), np.arange(nz), indexing="ij")
+    mask = np.zeros((nx, ny, nz), dtype=bool)
+    for center_x in (16, 34):
+        mask |= ((x - center_x) ** 2 + (z - 52) ** 2 <= 25) & (y >= 2) & (y <= 44)
+    mask |= ((x - 25) ** 2 + (y - 44) ** 2 <= 49) & (z >= 2) & (z <= 56)
+    mask |= (np.abs(x - 25) <= 12) & (np.abs(y - 44) <= 4) & (np.abs(z - 52) <= 5)
+
+    image = vtk.vtkImageData()
+    image.SetDimensions(nx, ny, nz)
+    image.GetPointData().SetScalars(
+        numpy_support.numpy_to_vtk(mask.astype(np.uint8).ravel(order="F"), deep=True))
+    contour = vtk.vtkDiscreteFlyingEdges3D()
+    contour.SetInputData(image)
+    contour.SetValue(0, 1)
+    writer = vtk.vtkSTLWriter()
+    writer.SetFileName(str(path))
+    writer.SetInputConnection(contour.GetOutputPort())
+    writer.Write()
+
+
+def test_cap_faces_has_one_piece_per_component_and_face():
+    faces = cap_faces(_two_spheres(), CutBox((100.0, 3.0, 100.0)))
+
+    centers = sorted(tuple(np.round(face["center"], 3)) for face in faces)
+    assert centers == [(20.0, -3.0, 0.0), (20.0, 3.0, 0.0), (60.0, -3.0, 0.0), (60.0, 3.0, 0.0)]
+    for face in faces:
+        assert len(face["triangles"]) > 0
+        # Caps point into the box: against the outward normal of their face
+        assert np.sign(face["normal"][1]) == -np.sign(face["center"][1])
+
+
+def test_pieces_of_an_empty_section():
+    assert _pieces(vtk.vtkPolyData(), (0.0, 1.0, 0.0)) == []
+
+
+def test_cap_faces_skips_sections_clipped_away():
+    # Every cap of the small box lies inside the excluded one
+    box = CutBox((100.0, 3.0, 100.0))
+    assert cap_faces(_two_spheres(), box, excluded=(CutBox((200.0, 10.0, 200.0)),)) == []
+
+
+def test_process_writes_the_case_geometry(tmp_path):
+    stl_path = tmp_path / "airway.stl"
+    _write_airway_stl(stl_path)
+    manifest_path = tmp_path / "manifest.json"
+
+    result = GeometryEngine().process(stl_path, tmp_path, manifest_path=manifest_path)
+
+    assert all(result["triangles"][name] > 0 for name in ("inlet", "outlet", "wall"))
+    for name in ("inlet", "outlet", "wall"):
+        text = (tmp_path / "constant" / "triSurface" / f"{name}.stl").read_text()
+        assert text.startswith(f"solid {name}\n") and text.endswith(f"endsolid {name}\n")
+        assert text.count("endfacet") == result["triangles"][name]
+
+    # One preliminary inlet face per nostril
+    inlet_lines = (tmp_path / "system" / "face_centers_i.txt").read_text().splitlines()
+    assert inlet_lines[0] == "Object: ini" and len(inlet_lines) == 3
+    assert (tmp_path / "system" / "face_centers.txt").read_text().startswith("(")
+    bounds = (tmp_path / "system" / "bb_min_max.txt").read_text()
+    assert "BOUND_MIN_X" in bounds and "IN_PLANE_Y4" in bounds
+
+    manifest = json.loads(manifest_path.read_text())
+    assert manifest["engine"] == "vtk"
+    assert manifest["triangles"] == result["triangles"]
+
@@ -0,0 +1,31 @@
+# tests/test_inference_config.py
+"""CPU inference options bounded by the cores reserved for them."""
+
+from gui.utils import inference_config as config_module
+
+
+def _cpu_machine(monkeypatch, n_cores, memory=64 * 1024 ** 3):
+    monkeypatch.setattr(config_module, "detect_device", lambda: "cpu")
+    monkeypatch.setattr(config_module, "available_cores", lambda: list(range(n_cores)))
+    monkeypatch.setattr(config_module, "available_memory_bytes", lambda: memory)
+    monkeypatch.setitem(config_module.CPU_SETTINGS, "THREADS", None)
+
+
+def test_cpu_inference_uses_all_cores_by_default(monkeypatch):
+    _cpu_machine(monkeypatch, 32)
+    assert config_module.inference_config()["threads"] == 32
+
+
+def test_cpu_inference_stays_within_reserved_cores(monkeypatch):
+    _cpu_machine(monkeypatch, 32)
+    full = config_module.inference_config()
+    bounded = config_module.inference_config(max_threads=8)
+    assert bounded["threads"] == 8
+    assert bounded["npp"] <= full["npp"] and bounded["npp"] <= 8
+
+
+def test_configured_threads_never_exceed_reserved_cores(monkeypatch):
+    _cpu_machine(monkeypatch, 32)
+    monkeypatch.setitem(config_module.CPU_SETTINGS, "THREADS", 16)
+    assert config_module.inference_config(max_threads=4)["threads"] == 4
+    assert config_module.inference_config()["threads"] == 16
@@ -0,0 +1,72 @@
+# tests/test_label_stats.py
+"""Volume, slice areas, bounding box and components from integer label maps."""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+nib = pytest.importorskip("nibabel")
+pytest.importorskip("scipy")
+
+from gui.utils import label_stats as stats_module
+from gui.utils.label_stats import compute_label_stats, label_stats, load_labels, write_label_stats
+
+
+def _two_blocks():
+    """uint8 labels: a 4x5x6 airway block, a 2x2x2 airway island, and label 2 elsewhere."""
+    data = np.zeros((20, 16, 30), dtype=np.uint8)
+    data[3:7, 2:7, 10:16] = 1
+    data[15:17, 12:14, 25:27] = 1
+    data[0:2, 0:2, 0:2] = 2
+    return data
+
+
+def test_volume_slices_and_bbox():
+    stats = compute_label_stats(_two_blocks(), (0.5, 0.5, 2.0))
+
+    assert stats["voxel_count"] == 4 * 5 * 6 + 8
+    assert stats["volume_mm3"] == pytest.approx((4 * 5 * 6 + 8) * 0.5)
+    assert stats["slice_area_mm2"][12] == pytest.approx(20 * 0.25)
+    assert stats["slice_area_mm2"][25] == pytest.approx(4 * 0.25)
+    assert stats["slice_area_mm2"][0] == 0.0
+    assert stats["bbox"] == ((3, 17), (2, 14), (10, 27))
+
+
+def test_components_are_sorted_by_size():
+    components = compute_label_stats(_two_blocks(), (1.0, 1.0, 1.0))["components"]
+
+    assert components["count"] == 2
+    assert components["sizes_voxels"] == [120, 8]
+    assert components["largest_fraction"] == pytest.approx(120 / 128)
+
+
+def test_slabs_give_the_same_result(monkeypatch):
+    whole = compute_label_stats(_two_blocks(), (1.0, 1.0, 1.0))
+    monkeypatch.setitem(stats_module.LABEL_SETTINGS, "SLAB_SLICES", 4)
+    assert compute_label_stats(_two_blocks(), (1.0, 1.0, 1.0)) == whole
+
+
+def test_other_label_and_empty_map():
+    assert compute_label_stats(_two_blocks(), (1.0, 1.0, 1.0), label=2)["voxel_count"] == 8
+    empty = compute_label_stats(np.zeros((4, 4, 4), dtype=np.int16), (1.0, 1.0, 1.0))
+    assert empty["voxel_count"] == 0 and empty["bbox"] is None
+    assert "components" not in empty
+
+
+@pytest.mark.parametrize("name", ["pred.nii", "pred.nii.gz"])
+def test_labels_are_read_without_float_conversion(tmp_path, name):
+    image = nib.Nifti1Image(_two_blocks(), np.diag([0.5, 0.5, 2.0, 1.0]))
+    nib.save(image, str(tmp_path / name))
+
+    data, affine, zooms = load_labels(tmp_path / name)
+    assert data.dtype == np.uint8
+    assert zooms == (0.5, 0.5, 2.0)
+    assert label_stats(tmp_path / name)["volume_mm3"] == pytest.approx(128 * 0.5)
+
+
+def test_write_label_stats(tmp_path):
+    stats = compute_label_stats(_two_blocks(), (1.0, 1.0, 1.0))
+    path = write_label_stats(stats, tmp_path)
+    saved = json.loads(path.read_text())
+    assert saved["voxel_count"] == 128 and saved["bbox"] == [[3, 17], [2, 14], [10, 27]]
@@ -0,0 +1,96 @@
+# tests/test_pipeline_scheduler.py
+"""Stage worker pools, resource tokens and fan-out of the batch scheduler."""
+
+import threading
+import time
+
+import pytest
+
+from gui.utils.pipeline_scheduler import PipelineCancelled, PipelineScheduler, ResourcePool
+
+
+class _Logger:
+    def log_info(self, message):
+        pass
+
+    log_error = log_info
+
+
+def test_jobs_pass_every_stage_and_fan_out():
+    done = []
+    scheduler = PipelineScheduler({"cores": [0, 1, 2, 3]}, logger=_Logger(), on_done=done.append)
+    scheduler.add_stage("segmentation", lambda job, allocation: None, workers=2)
+    scheduler.add_stage("cfd", lambda job, allocation: [f"{job}@{rate}" for rate in (15, 30)], workers=2)
+
+    stats = scheduler.run(["a", "b", "c"])
+    assert sorted(done) == ["a@15", "a@30", "b@15", "b@30", "c@15", "c@30"]
+    assert stats["segmentation"]["completed"] == 3 and stats["cfd"]["completed"] == 3
+
+
+def test_concurrent_jobs_hold_disjoint_cores():
+    held, lock, overlaps = [], threading.Lock(), []
+
+    def cfd(job, allocation):
+        cores = set(allocation["cores"])
+        with lock:
+            if any(cores & other for other in held):
+                overlaps.append(job)
+            held.append(cores)
+        time.sleep(0.05)
+        with lock:
+            held.remove(cores)
+
+    scheduler = PipelineScheduler({"cores": list(range(6))}, logger=_Logger())
+    scheduler.add_stage("cfd", cfd, workers=4, needs=lambda job: {"cores": 2 + job % 2})
+    scheduler.run(range(8))
+    assert overlaps == []
+    assert sorted(scheduler.pool._free["cores"]) == list(range(6))
+
+
+def test_requests_are_clamped_to_the_pool():
+    pool = ResourcePool({"gpu": 1, "cores": [4, 5]})
+    with pool.acquire({"gpu": 3, "cores": 8}) as allocation:
+        assert allocation == {"gpu": 1, "cores": [4, 5]}
+    with pytest.raises(KeyError, match="Unknown resource"):
+        with pool.acquire({"blender": 1}):
+            pass
+
+
+def test_waiting_for_tokens_can_be_cancelled():
+    pool = ResourcePool({"gpu": 1})
+    cancel = threading.Event()
+    cancel.set()
+    with pool.acquire({"gpu": 1}):
+        with pytest.raises(PipelineCancelled):
+            with pool.acquire({"gpu": 1}, cancel):
+                pass
+
+
+def test_failed_job_is_dropped_and_reported():
+    errors, done = [], []
+
+    def segment(job, allocation):
+        if job == "bad":
+            raise RuntimeError("no airway found")
+
+    scheduler = PipelineScheduler({"gpu": 1}, logger=_Logger(), on_done=done.append,
+                                  on_error=lambda job, stage, error: errors.append((job, stage, str(error))))
+    scheduler.add_stage("segmentation", segment, needs={"gpu": 1})
+    scheduler.add_stage("report", lambda job, allocation: None)
+    scheduler.run(["good", "bad"])
+    assert done == ["good"]
+    assert errors == [("bad", "segmentation", "no airway found")]
+
+
+def test_cancelled_scheduler_starts_no_new_stage():
+    errors = []
+    scheduler = PipelineScheduler({}, logger=_Logger(), on_error=lambda job, stage, error: errors.append(stage))
+    scheduler.add_stage("segmentation", lambda job, allocation: scheduler.cancel())
+    scheduler.add_stage("cfd", lambda job, allocation: pytest.fail("cfd started after cancel"))
+    scheduler.run(["a"])
+    assert errors == ["cfd"]
+
+
+def test_run_needs_stages():
+    with pytest.raises(ValueError, match="No stages"):
+        PipelineScheduler({}).run([])
@@ -0,0 +1,75 @@
+# tests/test_roi.py
+"""Cropping a label map to the airway ROI and meshing the cropped file."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+nib = pytest.importorskip("nibabel")
+pytest.importorskip("vtk")
+
+from gui.utils.roi import extract_roi, padded_bbox, shifted_affine
+from gui.utils.surface_pipeline import SurfacePipeline
+
+
+def _affine():
+    affine = np.diag([0.5, 0.5, 0.5, 1.0])
+    affine[:3, 3] = [10.0, -20.0, 5.0]
+    return affine
+
+
+def _save_ball(path, qform_code=1, sform_code=1):
+    """A 60 x 50 x 40 label map with a ball of radius 8 voxels off-center."""
+    i, j, k = np.ogrid[:60, :50, :40]
+    data = ((i - 35) ** 2 + (j - 22) ** 2 + (k - 18) ** 2 <= 64).astype(np.uint8)
+    image = nib.Nifti1Image(data, _affine())
+    image.set_qform(_affine(), code=qform_code)
+    image.set_sform(_affine(), code=sform_code)
+    nib.save(image, str(path))
+    return path
+
+
+def test_padded_bbox_is_clamped_to_the_scan():
+    bbox = padded_bbox(((2, 10), (5, 20), (0, 40)), (60, 50, 40), (0.5, 0.5, 0.5), margin_mm=2.0)
+    assert bbox == ((0, 14), (1, 24), (0, 40))
+
+
+def test_shifted_affine_maps_roi_origin_to_offset_voxel():
+    affine = _affine()
+    shifted = shifted_affine(affine, (4, 6, 8))
+    assert np.allclose(shifted @ [0, 0, 0, 1], affine @ [4, 6, 8, 1])
+
+
+def test_cropped_label_map_keeps_qform_and_voxels(tmp_path):
+    label_path = _save_ball(tmp_path / "case_pred.nii.gz")
+    roi = extract_roi(label_path, margin_mm=2.0)
+
+    cropped = nib.load(roi["path"])
+    assert roi["path"].endswith("case_pred_roi.nii.gz")
+    assert int(cropped.header["qform_code"]) == 1
+    assert int(cropped.header["sform_code"]) == 1
+    (i0, i1), (j0, j1), (k0, k1) = roi["bbox"]
+    assert np.allclose(cropped.affine, shifted_affine(_affine(), (i0, j0, k0)))
+    full = np.asarray(nib.load(str(label_path)).dataobj)
+    assert np.array_equal(np.asarray(cropped.dataobj), full[i0:i1, j0:j1, k0:k1])
+    assert cropped.get_fdata().sum() == full.sum()
+
+
+def test_roi_surface_matches_full_scan_surface(tmp_path):
+    label_path = _save_ball(tmp_path / "case_pred.nii.gz")
+    roi = extract_roi(label_path, margin_mm=2.0)
+
+    full = SurfacePipeline(label_path, preset="standard").write_stl(tmp_path / "full.stl")
+    cropped = SurfacePipeline(roi["path"], preset="standard").write_stl(tmp_path / "roi.stl")
+
+    assert cropped.GetNumberOfCells() > 0
+    assert np.allclose(cropped.GetBounds(), full.GetBounds(), atol=1e-3)
+
+
+def test_surface_falls_back_to_sform_without_qform(tmp_path):
+    with_qform = _save_ball(tmp_path / "qform.nii.gz")
+    sform_only = _save_ball(tmp_path / "sform.nii.gz", qform_code=0)
+
+    expected = SurfacePipeline(with_qform, preset="standard").write_stl(tmp_path / "qform.stl")
+    surface = SurfacePipeline(sform_only, preset="standard").write_stl(tmp_path / "sform.stl")
+
+    assert np.allclose(surface.GetBounds(), expected.GetBounds(), atol=1e-3)
@@ -0,0 +1,99 @@
+# tests/test_segmentation_cache.py
+"""Keys, store/restore and eviction of the content-addressed segmentation cache."""
+
+import gzip
+import json
+import os
+
+import pytest
+
+from gui.config.settings import ANALYSIS_SETTINGS
+from gui.utils.segmentation_cache import SegmentationCache, scan_digest
+
+
+def _write_scan(path, payload=b"voxels" * 1000, mtime=0):
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=mtime) as f:
+        f.write(payload)
+    return path
+
+
+def _outputs(folder, text="surface"):
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "pred.nii.gz").write_bytes(b"labels")
+    (folder / "geo.stl").write_text(text)
+    (folder / "min_csa.txt").write_text("12.5")
+    return {
+        "pred": folder / "pred.nii.gz",
+        "stl": folder / "geo.stl",
+        "min_csa": folder / "min_csa.txt",
+        "preview": folder / "missing.png",
+    }
+
+
+def test_digest_ignores_the_gzip_header(tmp_path):
+    first = _write_scan(tmp_path / "a_0000.nii.gz", mtime=1)
+    second = _write_scan(tmp_path / "b_0000.nii.gz", mtime=2)
+    assert first.read_bytes() != second.read_bytes()
+    assert scan_digest(first) == scan_digest(second)
+    assert scan_digest(_write_scan(tmp_path / "c_0000.nii.gz", b"other")) != scan_digest(first)
+
+
+def test_key_depends_on_the_signature(tmp_path):
+    cache = SegmentationCache(tmp_path / "cache")
+    scan = _write_scan(tmp_path / "case_0000.nii.gz")
+    assert cache.compute_key(scan, "model-a") == cache.compute_key(scan, "model-a")
+    assert cache.compute_key(scan, "model-a") != cache.compute_key(scan, "model-b")
+
+
+def test_store_and_restore(tmp_path):
+    cache = SegmentationCache(tmp_path / "cache")
+    key = cache.compute_key(_write_scan(tmp_path / "case_0000.nii.gz"), "model")
+    assert cache.restore(key, {}) is None
+
+    assert cache.store(key, _outputs(tmp_path / "run1"), {"volume": 1.5, "min_csa": 12.5})
+    assert cache.has(key)
+    assert not [p for p in (tmp_path / "cache").iterdir() if p.name.startswith(".")]
+
+    restored = tmp_path / "run2"
+    meta = cache.restore(key, {"pred": restored / "p.nii.gz", "stl": restored / "stl" / "g.stl",
+                               "preview": restored / "g.png"})
+    assert meta["volume"] == 1.5 and meta["min_csa"] == 12.5
+    assert (restored / "stl" / "g.stl").read_text() == "surface"
+    assert not (restored / "g.png").exists()
+
+
+def test_incomplete_outputs_are_not_stored(tmp_path):
+    cache = SegmentationCache(tmp_path / "cache")
+    sources = _outputs(tmp_path / "run")
+    sources["stl"].unlink()
+    assert not cache.store("key", sources)
+    assert not cache.has("key")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SegmentationCache(tmp_path / "cache", max_bytes=0)
+    for key in ("old", "new"):
+        cache.store(key, _outputs(tmp_path / key, "x" * 1000))
+    meta_path = tmp_path / "cache" / "old" / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    meta["last_used"] -= 100
+    meta_path.write_text(json.dumps(meta))
+
+    entry_size = sum(p.stat().st_size for p in (tmp_path / "cache" / "new").iterdir())
+    cache.max_bytes = entry_size + 10
+    cache.evict()
+    assert sorted(os.listdir(tmp_path / "cache")) == ["new"]
+
+
+def test_output_signature_follows_the_settings(monkeypatch):
+    pytest.importorskip("nibabel")
+    pytest.importorskip("vtk")
+    from gui.utils.segmentation import AirwaySegmentator
+
+    segmentator = AirwaySegmentator.__new__(AirwaySegmentator)
+    signature = segmentator.output_signature()
+    monkeypatch.setitem(ANALYSIS_SETTINGS["SEGMENTATION"]["SURFACE"], "PRESET", "high")
+    assert segmentator.output_signature() != signature
+    monkeypatch.undo()
+    monkeypatch.setitem(ANALYSIS_SETTINGS["SEGMENTATION"]["CSA"], "STATIONS", 7)
+    assert segmentator.output_signature() != signature
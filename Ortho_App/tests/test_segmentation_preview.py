@@ -0,0 +1,79 @@
+# tests/test_segmentation_preview.py
+"""Quick preview segmentation before the full prediction, and its removal."""
+
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+nib = pytest.importorskip("nibabel")
+pytest.importorskip("vtk")
+
+from gui.utils.segmentation import NNUNET_SETTINGS, AirwaySegmentator
+
+PREVIEW_DIR = NNUNET_SETTINGS["PREVIEW"]["DIR_NAME"]
+
+
+class _Logger:
+    def __init__(self):
+        self.warnings = []
+
+    def log_info(self, message):
+        pass
+
+    def log_warning(self, message):
+        self.warnings.append(message)
+
+
+def _segmentator(tmp_path, labels):
+    """AirwaySegmentator whose prediction writes the given label map."""
+    segmentator = AirwaySegmentator.__new__(AirwaySegmentator)
+    segmentator.output_folder = tmp_path
+    segmentator.cancel_event = threading.Event()
+    segmentator.logger = _Logger()
+    segmentator.previews = []
+    segmentator.preview_callback = segmentator.previews.append
+    segmentator.update_progress = lambda *args: None
+    segmentator.generate_stl_preview = lambda stl_path: stl_path.replace(".stl", ".png")
+
+    def predict(folder, overrides, stage_name, base_progress):
+        assert overrides["disable_tta"] == NNUNET_SETTINGS["PREVIEW"]["DISABLE_TTA"]
+        nib.save(nib.Nifti1Image(labels, np.diag([0.5, 0.5, 0.5, 1.0])), str(folder / "case.nii.gz"))
+
+    segmentator._predict = predict
+    return segmentator
+
+
+def test_preview_surface_is_shown(tmp_path):
+    labels = np.zeros((30, 30, 30), dtype=np.uint8)
+    labels[8:20, 10:18, 5:25] = 1
+    segmentator = _segmentator(tmp_path, labels)
+
+    preview = segmentator.run_preview()
+    assert preview == str(tmp_path / PREVIEW_DIR / "case_geo_preview.png")
+    assert segmentator.previews == [preview]
+    assert (tmp_path / PREVIEW_DIR / "case_geo_preview.stl").stat().st_size > 84
+
+    segmentator.remove_preview()
+    assert not (tmp_path / PREVIEW_DIR).exists()
+
+
+def test_empty_preview_is_not_shown(tmp_path):
+    segmentator = _segmentator(tmp_path, np.zeros((10, 10, 10), dtype=np.uint8))
+    assert segmentator.run_preview() is None
+    assert segmentator.previews == []
+    assert segmentator.logger.warnings == ["Quick preview found no airway in this scan"]
+
+
+def test_cancelled_preview_is_not_shown(tmp_path):
+    labels = np.ones((10, 10, 10), dtype=np.uint8)
+    segmentator = _segmentator(tmp_path, labels)
+    predict = segmentator._predict
+
+    def predict_then_cancel(*args, **kwargs):
+        predict(*args, **kwargs)
+        segmentator.cancel_event.set()
+
+    segmentator._predict = predict_then_cancel
+    assert segmentator.run_preview() is None
+    assert segmentator.previews == []
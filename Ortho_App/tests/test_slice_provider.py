@@ -0,0 +1,121 @@
+# tests/test_slice_provider.py
+"""Middle slices of DICOM series and NIfTI volumes, and the preview cache."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+nib = pytest.importorskip("nibabel")
+pydicom = pytest.importorskip("pydicom")
+
+from pydicom.dataset import FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from gui.utils import dicom_index as index_module
+from gui.utils import slice_provider
+from gui.utils.slice_provider import NiftiSlices, PreviewCache, open_slices
+
+
+def _write_series(folder, volume):
+    """One file per volume[k], written in reverse name order, slope 2 and intercept -1000."""
+    folder.mkdir()
+    series_uid = generate_uid()
+    for k, pixels in enumerate(volume):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = CTImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds = pydicom.Dataset()
+        ds.file_meta = meta
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.SeriesInstanceUID = series_uid
+        ds.Modality = "CT"
+        ds.InstanceNumber = k + 1
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.ImagePositionPatient = [0.0, 0.0, 0.5 * k]
+        ds.RescaleSlope = 2
+        ds.RescaleIntercept = -1000
+        ds.Rows, ds.Columns = pixels.shape
+        ds.BitsAllocated = ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 1
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.PixelData = pixels.astype("<i2").tobytes()
+        ds.save_as(str(folder / f"slice_{len(volume) - k:03d}.dcm"), enforce_file_format=True)
+    return folder
+
+
+@pytest.fixture
+def volume():
+    return np.random.default_rng(0).integers(-500, 1500, size=(9, 24, 20)).astype(np.int16)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_index():
+    index_module._memory_cache.clear()
+    yield
+    index_module._memory_cache.clear()
+
+
+@pytest.mark.parametrize("mapped", [True, False])
+def test_dicom_middle_slices_match_the_stacked_volume(tmp_path, monkeypatch, volume, mapped):
+    folder = _write_series(tmp_path / "scan", volume)
+    if not mapped:
+        monkeypatch.setattr(slice_provider, "_pixel_map", lambda path: None)
+
+    slices = open_slices(folder).middle_slices()
+    expected = volume * 2.0 - 1000
+    assert np.array_equal(slices["axial"], expected[9 // 2])
+    assert np.array_equal(slices["coronal"], expected[:, 24 // 2, :])
+    assert np.array_equal(slices["sagittal"], expected[:, :, 20 // 2])
+
+
+def test_uncompressed_pixels_are_memory_mapped(tmp_path, volume):
+    folder = _write_series(tmp_path / "scan", volume)
+    mapped = slice_provider._pixel_map(folder / "slice_001.dcm")
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, volume[-1])
+
+
+@pytest.mark.parametrize("name", ["scan.nii", "scan.nii.gz"])
+def test_nifti_middle_slices_keep_the_values(tmp_path, volume, name):
+    nib.save(nib.Nifti1Image(volume, np.eye(4)), str(tmp_path / name))
+    slices = open_slices(tmp_path / name)
+    assert isinstance(slices, NiftiSlices)
+
+    middle = slices.middle_slices()
+    assert np.array_equal(middle["axial"], volume[:, :, 10])
+    assert np.array_equal(middle["coronal"], volume[:, 12, :])
+    assert np.array_equal(middle["sagittal"], volume[4, :, :])
+
+
+def test_open_slices_rejects_other_files(tmp_path):
+    (tmp_path / "scan.mha").write_bytes(b"")
+    with pytest.raises(ValueError, match="Not a DICOM folder or NIfTI file"):
+        open_slices(tmp_path / "scan.mha")
+
+
+class _Source:
+    def __init__(self, key):
+        self.key = key
+        self.reads = 0
+
+    def middle_slices(self):
+        self.reads += 1
+        return {"axial": np.zeros((2, 2))}
+
+
+def test_preview_cache_renders_each_scan_once():
+    cache = PreviewCache(max_scans=2)
+    first, second, third = _Source("a"), _Source("b"), _Source("c")
+    render = lambda slices: {"axial": object()}
+
+    images = cache.get(first, render)
+    assert cache.get(first, render) is images
+    cache.get(second, render)
+    cache.get(first, render)
+    cache.get(third, render)  # evicts "b", the least recently used
+    cache.get(first, render)
+    cache.get(second, render)
+    assert (first.reads, second.reads, third.reads) == (1, 2, 1)
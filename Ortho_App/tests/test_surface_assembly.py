@@ -0,0 +1,118 @@
+# tests/test_surface_assembly.py
+"""combined.stl from the inlet, outlet and wall surfaces, in ASCII and binary."""
+
+import os
+import re
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from gui.utils.surface_assembly import COMBINED_SETTINGS, assemble_surfaces, is_binary_stl
+
+
+def _triangles(count, offset=0.0):
+    """count triangles in the z = offset plane."""
+    corners = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    return np.array([corners + [i, 0.0, offset] for i in range(count)])
+
+
+def _write_ascii(path, triangles, solid="exported from blender"):
+    lines = [f"solid {solid}"]
+    for triangle in triangles:
+        lines += ["  facet normal 0 0 1", "    outer loop"]
+        lines += ["      vertex %g %g %g" % tuple(vertex) for vertex in triangle]
+        lines += ["    endloop", "  endfacet"]
+    lines.append(f"endsolid {solid}")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def _write_binary(path, triangles):
+    with open(path, "wb") as f:
+        f.write(b"binary part".ljust(80, b" "))
+        f.write(struct.pack("<I", len(triangles)))
+        for triangle in triangles:
+            f.write(struct.pack("<12fH", 0, 0, 1, *triangle.ravel(), 0))
+
+
+def _read_binary(path):
+    with open(path, "rb") as f:
+        f.seek(80)
+        (count,) = struct.unpack("<I", f.read(4))
+        records = [struct.unpack("<12fH", f.read(50)) for _ in range(count)]
+    return np.array([record[3:12] for record in records]).reshape(-1, 3, 3)
+
+
+@pytest.fixture
+def tri_dir(tmp_path):
+    """inlet (ASCII, 2 triangles), outlet (binary, 3) and wall (ASCII, 5)."""
+    _write_ascii(tmp_path / "inlet.stl", _triangles(2, 0.0))
+    _write_binary(tmp_path / "outlet.stl", _triangles(3, 1.0))
+    _write_ascii(tmp_path / "wall.stl", _triangles(5, 2.0), solid="Mesh")
+    (tmp_path / "stray.stl").write_text("solid stray\nendsolid stray\n")
+    return tmp_path
+
+
+def test_ascii_has_one_named_solid_per_patch(tri_dir):
+    result = assemble_surfaces(tri_dir, file_format="ascii")
+    assert result["triangles"] == {"inlet": 2, "outlet": 3, "wall": 5}
+    assert not result["skipped"]
+
+    text = (tri_dir / COMBINED_SETTINGS["FILE"]).read_text()
+    assert re.findall(r"^solid (\S+)$", text, re.M) == ["inlet", "outlet", "wall"]
+    assert re.findall(r"^endsolid (\S+)$", text, re.M) == ["inlet", "outlet", "wall"]
+    assert text.count("endfacet") == 10
+    # The binary outlet is converted with its own coordinates
+    outlet = text.split("solid outlet")[1].split("endsolid outlet")[0]
+    vertices = np.array(re.findall(r"vertex (\S+) (\S+) (\S+)", outlet), dtype=float)
+    assert np.allclose(vertices.reshape(-1, 3, 3), _triangles(3, 1.0))
+
+
+def test_binary_copies_and_converts_the_parts(tri_dir):
+    result = assemble_surfaces(tri_dir, file_format="binary")
+    output = tri_dir / COMBINED_SETTINGS["FILE"]
+    assert is_binary_stl(output)
+    expected = np.concatenate([_triangles(2, 0.0), _triangles(3, 1.0), _triangles(5, 2.0)])
+    assert np.allclose(_read_binary(output), expected)
+    assert sum(result["triangles"].values()) == 10
+
+
+def test_unchanged_parts_are_not_written_again(tri_dir):
+    assemble_surfaces(tri_dir, file_format="ascii")
+    output = tri_dir / COMBINED_SETTINGS["FILE"]
+    written = output.stat().st_mtime_ns
+
+    # Touched but identical parts are recognized by their hash
+    os.utime(tri_dir / "wall.stl", ns=(written + 10 ** 9, written + 10 ** 9))
+    result = assemble_surfaces(tri_dir, file_format="ascii")
+    assert result["skipped"] and result["triangles"]["wall"] == 5
+    assert output.stat().st_mtime_ns == written
+
+    assert not assemble_surfaces(tri_dir, file_format="binary")["skipped"]
+    _write_ascii(tri_dir / "inlet.stl", _triangles(4, 0.0))
+    assert assemble_surfaces(tri_dir, file_format="binary")["triangles"]["inlet"] == 4
+
+
+def test_missing_part(tri_dir):
+    (tri_dir / "outlet.stl").unlink()
+    with pytest.raises(FileNotFoundError, match="outlet.stl"):
+        assemble_surfaces(tri_dir)
+    assert not (tri_dir / COMBINED_SETTINGS["FILE"]).exists()
+
+
+@pytest.mark.parametrize("file_format", ["ascii", "binary"])
+@pytest.mark.parametrize("content", [
+    "solid empty\nendsolid empty\n",
+    "solid broken\nfacet normal 0 0 1\nouter loop\nvertex 0 0 0\nvertex 1 0 0\nendloop\nendfacet\nendsolid broken\n",
+])
+def test_bad_part_leaves_no_output(tri_dir, file_format, content):
+    (tri_dir / "wall.stl").write_text(content)
+    with pytest.raises(ValueError, match="wall.stl"):
+        assemble_surfaces(tri_dir, file_format=file_format)
+    assert sorted(os.listdir(tri_dir)) == ["inlet.stl", "outlet.stl", "stray.stl", "wall.stl"]
+
+
+def test_unknown_format(tri_dir):
+    with pytest.raises(ValueError, match="Unknown STL format"):
+        assemble_surfaces(tri_dir, file_format="obj")
@@ -0,0 +1,70 @@
+# tests/test_surface_pipeline.py
+"""Presets, bounding-box crop and timings of the label map -> surface pipeline."""
+
+import pytest
+
+vtk = pytest.importorskip("vtk")
+np = pytest.importorskip("numpy")
+nib = pytest.importorskip("nibabel")
+
+from gui.utils.label_stats import compute_label_stats
+from gui.utils.surface_pipeline import SURFACE_SETTINGS, SurfacePipeline, surface_preset
+
+
+def _save_labels(path, z_step=0.5):
+    """A ball (the airway) and a smaller separate cube in a 50^3 map."""
+    i, j, k = np.ogrid[:50, :50, :50]
+    data = ((i - 20) ** 2 + (j - 24) ** 2 + (k - 12) ** 2 <= 49).astype(np.uint8)
+    data[38:42, 38:42, 38:42] = 1
+    affine = np.diag([0.5, 0.5, z_step, 1.0])
+    affine[:3, 3] = [-5.0, 3.0, 12.0]
+    image = nib.Nifti1Image(data, affine)
+    image.set_qform(affine, code=1)
+    nib.save(image, str(path))
+    return path, data
+
+
+def _used_bounds(surface):
+    """Bounds of the points used by the triangles (filters may keep unused points)."""
+    cleaner = vtk.vtkCleanPolyData()
+    cleaner.SetInputData(surface)
+    cleaner.Update()
+    return np.array(cleaner.GetOutput().GetBounds())
+
+
+def test_presets():
+    assert surface_preset() is SURFACE_SETTINGS["PRESETS"][SURFACE_SETTINGS["PRESET"]]
+    assert surface_preset("Preview")["SAMPLE_RATE"] == 2
+    with pytest.raises(ValueError, match="Unknown surface preset"):
+        surface_preset("coarse")
+
+
+@pytest.mark.parametrize("z_step", [0.5, -0.5])
+def test_bbox_crop_keeps_the_surface_in_place(tmp_path, z_step):
+    path, data = _save_labels(tmp_path / "pred.nii.gz", z_step)
+    full = SurfacePipeline(path, "standard").update()
+    cropped = SurfacePipeline(path, "standard", bbox=compute_label_stats(data, (1, 1, 1), components=False)["bbox"]).update()
+
+    assert cropped.GetNumberOfPolys() == full.GetNumberOfPolys()
+    assert np.allclose(_used_bounds(cropped), _used_bounds(full), atol=1e-4)
+
+
+def test_only_the_largest_region_is_kept(tmp_path):
+    path, _data = _save_labels(tmp_path / "pred.nii.gz")
+    surface = SurfacePipeline(path, "preview").update()
+
+    # The ball is 7.5 mm across; with the cube the surface would span 14.5 mm
+    x_min, x_max, y_min, y_max, z_min, z_max = _used_bounds(surface)
+    assert max(x_max - x_min, y_max - y_min, z_max - z_min) < 8.0
+
+
+def test_write_stl_records_timings(tmp_path):
+    path, _data = _save_labels(tmp_path / "pred.nii.gz")
+    pipeline = SurfacePipeline(path, "preview")
+    surface = pipeline.write_stl(tmp_path / "airway.stl")
+
+    assert surface.GetNumberOfPolys() > 0
+    assert (tmp_path / "airway.stl").read_bytes()[:5] != b"solid"
+    assert {"read", "contour", "largest_region", "transform", "normals", "write"} <= set(pipeline.timings)
+    assert "crop" not in pipeline.timings and "laplacian" not in pipeline.timings
+    assert all(seconds >= 0 for seconds in pipeline.timings.values())